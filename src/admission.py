@@ -0,0 +1,142 @@
+"""Memory-budget admission control for analysis jobs.
+
+A fixed duration cap stops one huge file but happily starts any number of
+shorter ones at once: three 1.5h jobs still OOM the container. Instead, each
+job's peak memory is estimated from its probed duration and the analysis
+sample rate, and jobs are admitted only while the sum of the estimates of
+running jobs fits under a budget. The rest wait their turn, in the order
+of the fair-share scheduler (src/scheduler.py), rather than being rejected
+or crashing the server.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from src.scheduler import DEFAULT_CLIENT, FairScheduler
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Leave headroom under the 6G container limit for uvicorn, the imported
+# libraries and the recognition loop.
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("MEMORY_BUDGET_MB", "4096")) * MB)
+# Measured peak per analysed sample: float32 audio, decode/resample buffers
+# and the n_fft=1024 STFT. A 2h set at 22050 Hz peaks at ~2 GB.
+JOB_BYTES_PER_SAMPLE = float(os.environ.get("JOB_MEMORY_BYTES_PER_SAMPLE", "14"))
+JOB_BASE_BYTES = int(float(os.environ.get("JOB_MEMORY_BASE_MB", "200")) * MB)
+# Used when the duration can't be probed: assume a 128 kbps compressed file.
+# Overestimates uncompressed WAV/FLAC, which is the safe direction.
+_FALLBACK_BYTES_PER_SECOND = 128_000 / 8
+# Wall-clock seconds of analysis per second of audio until finished jobs
+# have been measured: decoding, detection and ~1 recognition per 3 min.
+JOB_SECONDS_PER_AUDIO_SECOND = float(os.environ.get("JOB_SECONDS_PER_AUDIO_SECOND", "0.05"))
+
+
+def expected_duration(duration: float, file_size: Optional[int] = None) -> float:
+    """`duration`, or a guess from the file size when it couldn't be probed."""
+    if not duration and file_size:
+        return file_size / _FALLBACK_BYTES_PER_SECOND
+    return duration
+
+
+def estimate_job_bytes(duration: float, target_sr: int,
+                       file_size: Optional[int] = None) -> int:
+    """Estimated peak memory of analysing `duration` seconds at `target_sr`."""
+    duration = expected_duration(duration, file_size)
+    return int(JOB_BASE_BYTES + duration * target_sr * JOB_BYTES_PER_SAMPLE)
+
+
+class AdmissionController:
+    def __init__(self, budget_bytes: int = MEMORY_BUDGET_BYTES,
+                 scheduler: Optional[FairScheduler] = None):
+        self.budget = budget_bytes
+        # Not `scheduler or ...`: an empty scheduler is falsy (it has a length).
+        if scheduler is None:
+            scheduler = FairScheduler(JOB_SECONDS_PER_AUDIO_SECOND)
+        self.scheduler = scheduler
+        self._running: Dict[str, int] = {}
+
+    @property
+    def in_use(self) -> int:
+        return sum(self._running.values())
+
+    def fits_ever(self, estimate: int) -> bool:
+        return estimate <= self.budget
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position in the wait queue, or None when not waiting."""
+        return self.scheduler.position(task_id)
+
+    def eta(self, task_id: str) -> Optional[float]:
+        """Rough seconds until a waiting job is admitted."""
+        return self.scheduler.eta(task_id, slots=max(1, len(self._running)))
+
+    def _fits(self, estimate: int) -> bool:
+        return self.in_use + estimate <= self.budget
+
+    def _wake(self) -> None:
+        while (head := self.scheduler.peek()) is not None:
+            # The scheduler's pick is not overtaken by smaller jobs that
+            # happen to fit, otherwise a steady stream of short files
+            # starves a big one that aging has moved to the front.
+            if not self._fits(head.payload):
+                break
+            self.scheduler.start(head.task_id)
+            self._running[head.task_id] = head.payload
+            head.fut.set_result(None)
+
+    async def acquire(self, task_id: str, estimate: int,
+                      on_queued: Optional[Callable[[int], None]] = None,
+                      client: str = DEFAULT_CLIENT, cost: float = 0.0) -> None:
+        """Wait until `estimate` bytes fit. `client` and `cost` (seconds of
+        audio) decide the order among waiting jobs."""
+        if not self.fits_ever(estimate):
+            raise ValueError("job estimate exceeds the whole memory budget")
+        if not len(self.scheduler) and self._fits(estimate):
+            self.scheduler.start(task_id, client, cost)
+            self._running[task_id] = estimate
+            return
+
+        fut = self.scheduler.add(task_id, client, cost, payload=estimate)
+        logger.info("Task %s queued for memory (%d MB, %d MB in use of %d MB)",
+                    task_id, estimate // MB, self.in_use // MB, self.budget // MB)
+        if on_queued is not None:
+            on_queued(self.position(task_id))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            self.scheduler.discard(task_id)
+            if fut.done() and not fut.cancelled():
+                self.release(task_id, observe=False)
+            self._wake()
+            raise
+
+    def release(self, task_id: str, observe: bool = True) -> None:
+        """Free a job's memory. `observe=False` keeps its run time out of the
+        ETA estimate, for jobs that stopped short of a full analysis."""
+        self._running.pop(task_id, None)
+        self.scheduler.finish(task_id, observe)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, task_id: str, estimate: int,
+                   on_queued: Optional[Callable[[int], None]] = None,
+                   client: str = DEFAULT_CLIENT, cost: float = 0.0) -> AsyncIterator[None]:
+        await self.acquire(task_id, estimate, on_queued, client, cost)
+        try:
+            yield
+        except BaseException:
+            self.release(task_id, observe=False)
+            raise
+        self.release(task_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "budget_bytes": self.budget,
+            "in_use_bytes": self.in_use,
+            "running": len(self._running),
+            "queued": len(self.scheduler),
+        }
@@ -0,0 +1,293 @@
+"""Batch mode: many sets analysed in parallel, tracks streamed as NDJSON.
+
+    python -m src.batch_analysis archive/ 'shows/2024-*.mp3' extra.flac --jobs 4
+
+Decoding, boundary detection, clustering and payload encoding are
+CPU-bound, so they run in a pool of `--jobs` spawned processes, one set per
+worker. Recognition runs here for all sets at once, through the
+process-wide gateway, so every file shares one Shazam rate limit and
+keep-alive session. Like the web app's admission control, the number of
+workers is capped so that many of the longest set's estimated peak memory
+fit in MEMORY_BUDGET_MB. If a worker dies anyway (OOM killer, a crashing
+decoder), the pool is replaced and the sets it was preparing are retried
+once. At most 2 x jobs prepared sets wait for recognition:
+enough to keep the workers busy while recognition is the bottleneck,
+without holding every set's payloads (~1 MB per segment) in memory.
+
+Each identified track is written to the NDJSON stream (stdout, or
+--ndjson FILE) the moment it is found, one object per line tagged with
+its file: `{"event": "track", "file": ..., "title": ..., ...}`. Files
+report "segmented", "done", "skipped" and "error" events. Tracklists go
+to <output-dir>/<stem>_tracklist.json/.txt as usual. A set whose
+tracklist is newer than the set itself is skipped unless --force; after
+changing --threshold or --min-song-duration, pass --force.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, IO, Iterable, List, Optional
+
+from src.admission import MEMORY_BUDGET_BYTES, estimate_job_bytes
+from src.parallel_features import available_cpus
+from src.probe import read_header_duration
+from src.recognizer_backends import (
+    RECOGNIZER_BACKEND, NullBackend, RecognizerBackend, create_backend,
+)
+from src.segment_clustering import CLUSTER_SIMILARITY
+from src.segment_encoder import EncodedSegment, encode_segment
+from src.shazamer import (
+    CASCADE_MIN_SECONDS, DJSetAnalyzer, deduplicate_tracks, save_tracklist,
+)
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".m4a", ".ogg", ".wma", ".aac"}
+# Prepared sets waiting for recognition, per worker.
+PREPARED_PER_WORKER = 2
+
+
+def find_inputs(patterns: Iterable[str]) -> List[Path]:
+    """Audio files named by paths, directories (recursively) or globs, in
+    order and without repeats."""
+    files, seen = [], set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(p for p in path.rglob("*")
+                             if p.suffix.lower() in AUDIO_EXTENSIONS and p.is_file())
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = sorted(Path(p) for p in glob.glob(pattern, recursive=True)
+                             if Path(p).is_file())
+        for match in matches:
+            if match.resolve() not in seen:
+                seen.add(match.resolve())
+                files.append(match)
+    return files
+
+
+def tracklist_path(input_file: Path, output_dir: Path) -> Path:
+    return output_dir / f"{input_file.stem}_tracklist.json"
+
+
+def up_to_date(input_file: Path, output: Path) -> bool:
+    try:
+        return output.stat().st_mtime >= input_file.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def memory_jobs(files: Iterable[Path], target_sr: int,
+                budget_bytes: int = MEMORY_BUDGET_BYTES) -> int:
+    """Workers that fit in `budget_bytes` if each prepares the longest set."""
+    largest = max((estimate_job_bytes(read_header_duration(str(f)) or 0.0, target_sr,
+                                      f.stat().st_size) for f in files), default=0)
+    return max(1, budget_bytes // largest) if largest else 1
+
+
+@dataclass
+class PreparedSet:
+    """Everything recognition needs from one set, built in a worker."""
+
+    duration: float
+    start_times: List[float]
+    labels: List[int]
+    segments: List[EncodedSegment]
+
+
+def prepare_set(input_file: str, settings: Dict) -> PreparedSet:
+    """Decode, segment, cluster and encode one set (runs in a worker)."""
+    analyzer = DJSetAnalyzer(input_file, recognizer=NullBackend(), **settings)
+    audio_data, sample_rate = analyzer.load_audio()
+    boundaries = analyzer.detect_song_boundaries(audio_data, sample_rate)
+    labels = analyzer.cluster_segments(audio_data, sample_rate, boundaries)
+    # The module-level encoder leaves the WAV bytes to be built on first use
+    # in the parent, so only the PCM crosses the process boundary.
+    segments = [encode_segment(audio_data, sample_rate, boundaries[i], boundaries[i + 1], i)
+                for i in range(len(boundaries) - 1)]
+    return PreparedSet(
+        duration=len(audio_data) / sample_rate,
+        start_times=[b / sample_rate for b in boundaries[:-1]],
+        labels=labels,
+        segments=segments,
+    )
+
+
+class NDJSONWriter:
+    """One JSON object per line, flushed as soon as it is written."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def write(self, event: str, input_file: Path, **fields) -> None:
+        self.stream.write(json.dumps({"event": event, "file": str(input_file), **fields}) + "\n")
+        self.stream.flush()
+
+
+class StreamingAnalyzer(DJSetAnalyzer):
+    """Writes each new track of its set to the NDJSON stream as it is found."""
+
+    def __init__(self, input_file, writer: NDJSONWriter, **kwargs):
+        super().__init__(input_file, **kwargs)
+        self.writer = writer
+        self._seen = set()
+
+    def _on_track(self, track: Dict) -> None:
+        # Same key as deduplicate_tracks, so the stream matches the tracklist.
+        key = f"{track['artist'].lower()}_{track['title'].lower()}"
+        if key not in self._seen:
+            self._seen.add(key)
+            self.writer.write("track", self.input_file, **track)
+
+
+async def run_batch(files: List[Path], output_dir: Path, writer: NDJSONWriter,
+                    jobs: int = 1, force: bool = False, settings: Optional[Dict] = None,
+                    recognizer: Optional[RecognizerBackend] = None) -> Dict[str, int]:
+    """Analyse `files`; returns how many were done, skipped and failed."""
+    settings = settings or {}
+    loop = asyncio.get_running_loop()
+    prepared_slots = asyncio.Semaphore(PREPARED_PER_WORKER * jobs)
+    counts = {"done": 0, "skipped": 0, "error": 0}
+
+    # Spawned like the feature workers: nothing of this process's threads
+    # or event loop is inherited.
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx)
+
+    async def prepare(input_file: Path) -> PreparedSet:
+        nonlocal pool
+        for attempt in range(2):
+            current = pool
+            try:
+                return await loop.run_in_executor(current, prepare_set, str(input_file), settings)
+            except BrokenProcessPool:
+                # Every set in the pool fails with the worker that died, not
+                # just the one that killed it: retry them on a fresh pool.
+                if attempt:
+                    raise
+                if pool is current:
+                    logger.warning("A batch worker died; restarting the pool")
+                    current.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx)
+
+    async def process(input_file: Path) -> None:
+        output = tracklist_path(input_file, output_dir)
+        if not force and up_to_date(input_file, output):
+            writer.write("skipped", input_file, output=str(output))
+            counts["skipped"] += 1
+            return
+        async with prepared_slots:
+            started = time.perf_counter()
+            try:
+                prepared = await prepare(input_file)
+                writer.write("segmented", input_file, duration=round(prepared.duration, 1),
+                             segments=len(prepared.segments))
+
+                analyzer = StreamingAnalyzer(input_file, writer, recognizer=recognizer)
+
+                async def encoded(i: int) -> EncodedSegment:
+                    return prepared.segments[i]
+
+                results = await analyzer.recognize_segments(
+                    prepared.start_times, prepared.labels, encoded)
+                tracks = deduplicate_tracks(results)
+                await loop.run_in_executor(None, save_tracklist, tracks, output)
+            except Exception as e:
+                logger.error(f"Analysis of {input_file} failed: {e!r}")
+                writer.write("error", input_file, error=str(e))
+                counts["error"] += 1
+                return
+            writer.write("done", input_file, output=str(output), tracks=len(tracks),
+                         failed_segments=len(analyzer.failed_segments),
+                         seconds=round(time.perf_counter() - started, 1))
+            counts["done"] += 1
+
+    try:
+        await asyncio.gather(*(process(f) for f in files))
+    finally:
+        pool.shutdown()
+    return counts
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Analyze many DJ sets in parallel, streaming tracks as NDJSON")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns")
+    parser.add_argument("--output-dir", default="outputs",
+                        help="Where tracklists are written (default: outputs)")
+    parser.add_argument("--ndjson", default="-",
+                        help="NDJSON stream of tracks and file events (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="Sets decoded and segmented at once (0 = all CPUs, default: 0); "
+                             "capped by MEMORY_BUDGET_MB")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-analyze sets whose tracklist is already up to date")
+    parser.add_argument("--min-song-duration", type=int,
+                        help="Minimum song duration in seconds (default: auto per set)")
+    parser.add_argument("--threshold", type=float,
+                        help="Peak detection threshold (0-1, default: auto per set)")
+    parser.add_argument("--cascade", choices=["auto", "always", "never"], default="auto",
+                        help="Coarse-to-fine boundary detection (default: auto)")
+    parser.add_argument("--no-cluster", action="store_true",
+                        help="Recognize every segment, even near-duplicates of an identified one")
+    parser.add_argument("--recognizer", default=RECOGNIZER_BACKEND,
+                        help="Recognizer backend: shazam, null, record:<file.jsonl> or "
+                             "replay:<file.jsonl> (default: shazam)")
+    parser.add_argument("--debug", action="store_true",
+                        help="Enable debug mode to see full Shazam responses")
+    args = parser.parse_args()
+
+    files = find_inputs(args.inputs)
+    if not files:
+        parser.error("No audio files found")
+    output_dir = Path(args.output_dir)
+    by_output: Dict[Path, Path] = {}
+    for f in files:
+        other = by_output.setdefault(tracklist_path(f, output_dir), f)
+        if other != f:
+            parser.error(f"{other} and {f} would share {tracklist_path(f, output_dir)}")
+
+    settings = {
+        "min_song_duration": args.min_song_duration,
+        "peak_threshold": args.threshold,
+        "cluster_threshold": None if args.no_cluster else CLUSTER_SIMILARITY,
+        "cascade_min_seconds": {"auto": CASCADE_MIN_SECONDS, "always": 0,
+                                "never": None}[args.cascade],
+    }
+    jobs = min(args.jobs or available_cpus(), len(files))
+    fitting = memory_jobs(files, target_sr=22050)  # DJSetAnalyzer's default rate
+    if fitting < jobs:
+        logger.warning(f"Only {fitting} of {jobs} workers fit in the memory budget "
+                       f"(MEMORY_BUDGET_MB) for the longest set")
+        jobs = fitting
+    logger.info(f"Analyzing {len(files)} sets with {jobs} workers")
+
+    recognizer = create_backend(args.recognizer, debug=args.debug)
+    stream = sys.stdout if args.ndjson == "-" else open(args.ndjson, "a")
+    try:
+        counts = await run_batch(
+            files, output_dir, NDJSONWriter(stream), jobs=jobs, force=args.force,
+            settings=settings, recognizer=recognizer,
+        )
+    finally:
+        await recognizer.close()
+        if stream is not sys.stdout:
+            stream.close()
+    logger.info(f"Batch finished: {counts['done']} analyzed, {counts['skipped']} up to date, "
+                f"{counts['error']} failed")
+    if counts["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
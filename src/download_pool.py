@@ -0,0 +1,106 @@
+"""Bounded pool of yt-dlp downloads.
+
+Every URL job, single or from a batch, downloads inside a slot of this
+pool. At most DOWNLOAD_CONCURRENCY downloads run at once (each also runs
+an ffmpeg extraction, so this bounds CPU as well as connections), and the
+rest wait, shared fairly between clients (src/scheduler.py); a set's
+length is unknown before it is downloaded, so each client's downloads
+start in submission order. DOWNLOAD_RATE_LIMIT_MB caps the total download
+bandwidth in MB/s, split evenly across the slots with yt-dlp's
+--limit-rate. Analysis keeps its own memory admission (src/admission.py),
+so a batch overlaps downloading the next entries with analysing the
+previous ones, though only BATCH_DOWNLOAD_AHEAD entries ahead of
+admission (src/web.py).
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from src.scheduler import DEFAULT_CLIENT, FairScheduler
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", "3"))
+DOWNLOAD_RATE_LIMIT_MB = float(os.environ.get("DOWNLOAD_RATE_LIMIT_MB") or 0)
+# Seconds per download until finished downloads have been measured.
+_INITIAL_DOWNLOAD_SECONDS = 60.0
+
+
+class DownloadPool:
+    def __init__(self, concurrency: int = DOWNLOAD_CONCURRENCY,
+                 rate_limit_mb: float = DOWNLOAD_RATE_LIMIT_MB):
+        self.concurrency = max(1, concurrency)
+        self.rate_limit_mb = rate_limit_mb
+        self.scheduler = FairScheduler(_INITIAL_DOWNLOAD_SECONDS)
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position in the wait queue, or None when not waiting."""
+        return self.scheduler.position(task_id)
+
+    def eta(self, task_id: str) -> Optional[float]:
+        """Rough seconds until a waiting download starts."""
+        return self.scheduler.eta(task_id, slots=self.concurrency)
+
+    def ytdlp_args(self) -> List[str]:
+        """Per-download yt-dlp options that keep the pool inside its bandwidth."""
+        if not self.rate_limit_mb:
+            return []
+        per_slot = self.rate_limit_mb * 1024 * 1024 / self.concurrency
+        return ["--limit-rate", str(int(per_slot))]
+
+    def _wake(self) -> None:
+        while self.scheduler.running < self.concurrency:
+            head = self.scheduler.peek()
+            if head is None:
+                break
+            self.scheduler.start(head.task_id)
+            head.fut.set_result(None)
+
+    async def acquire(self, task_id: str,
+                      on_queued: Optional[Callable[[int], None]] = None,
+                      client: str = DEFAULT_CLIENT) -> None:
+        # Every download costs one unit: the scheduler learns the average.
+        if not len(self.scheduler) and self.scheduler.running < self.concurrency:
+            self.scheduler.start(task_id, client, cost=1)
+            return
+
+        fut = self.scheduler.add(task_id, client, cost=1)
+        logger.info("Task %s waiting for a download slot (%d running)",
+                    task_id, self.scheduler.running)
+        if on_queued is not None:
+            on_queued(self.position(task_id))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            self.scheduler.discard(task_id)
+            if fut.done() and not fut.cancelled():
+                self.release(task_id, observe=False)
+            self._wake()
+            raise
+
+    def release(self, task_id: str, observe: bool = True) -> None:
+        """Free a download slot; `observe=False` keeps a failed or cancelled
+        download out of the ETA estimate."""
+        self.scheduler.finish(task_id, observe)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, task_id: str,
+                   on_queued: Optional[Callable[[int], None]] = None,
+                   client: str = DEFAULT_CLIENT) -> AsyncIterator[None]:
+        await self.acquire(task_id, on_queued, client)
+        try:
+            yield
+        except BaseException:
+            self.release(task_id, observe=False)
+            raise
+        self.release(task_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.scheduler.running,
+            "queued": len(self.scheduler),
+        }
@@ -0,0 +1,118 @@
+"""Local stand-in for Shazam's recognition endpoint, for load tests.
+
+Accepts the same `POST .../discovery/v5/.../tag/...` request shazamio
+sends and answers in the same shape. Point the app at it with
+`SHAZAM_BASE_URL=http://127.0.0.1:<port>`. Latency, 5xx error rate and a
+server-side rate limit (429 + Retry-After) are configurable, so the client's
+retries, hedging and throttling get exercised the way production does.
+Each signature maps to a stable fake track, so repeated audio keeps giving
+the same answer.
+
+    python -m src.fake_shazam --port 8765 --latency-ms 400 --rate-limit 5
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+from src.recognition_gateway import TokenBucket
+
+
+@dataclass
+class FakeShazamConfig:
+    latency_ms: float = 300.0
+    jitter_ms: float = 150.0  # uniform +/- around latency_ms
+    error_rate: float = 0.0  # fraction answered 503
+    rate_limit: float = 0.0  # sustained req/s before 429s; 0 = unlimited
+    burst: float = 5.0
+    retry_after: int = 1  # seconds advertised on 429
+    no_match_rate: float = 0.15
+    catalog_size: int = 500
+    seed: Optional[int] = None
+
+
+def fake_track(signature: str, config: FakeShazamConfig) -> Optional[dict]:
+    """Stable response for a signature: a catalog track, or None for 'no match'."""
+    digest = int.from_bytes(hashlib.sha1(signature.encode()).digest()[:8], "big")
+    if (digest % 10_000) / 10_000 < config.no_match_rate:
+        return None
+    track_id = digest % config.catalog_size
+    return {
+        "matches": [{"id": str(track_id), "offset": 42.0}],
+        "track": {
+            "key": str(track_id),
+            "title": f"Track {track_id:04d}",
+            "subtitle": f"Artist {track_id % 97:02d}",
+            "url": f"https://www.shazam.com/track/{track_id}",
+        },
+    }
+
+
+def create_app(config: FakeShazamConfig) -> web.Application:
+    rng = random.Random(config.seed)
+    bucket = TokenBucket(config.rate_limit, config.burst) if config.rate_limit > 0 else None
+    stats: Counter = Counter()
+
+    async def recognize(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        if bucket is not None and not bucket.take():
+            stats["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(config.retry_after)})
+        payload = await request.json()
+        latency = max(0.0, config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms))
+        await asyncio.sleep(latency / 1000)
+        if rng.random() < config.error_rate:
+            stats["503"] += 1
+            return web.Response(status=503, text="upstream unavailable")
+        track = fake_track(payload.get("signature", {}).get("uri", ""), config)
+        stats["matched" if track else "no_match"] += 1
+        return web.json_response(track or {"matches": [], "tagid": "none"})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response({"config": asdict(config), **stats})
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/discovery/v5/{tail:.*}", recognize)
+    app.router.add_get("/stats", get_stats)
+    app["stats"] = stats
+    return app
+
+
+async def start(config: FakeShazamConfig, host: str = "127.0.0.1",
+                port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Serve in the running loop. Returns the runner and the bound base URL."""
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Shazam stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=150.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests/s before answering 429 (0 = unlimited)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--no-match-rate", type=float, default=0.15)
+    args = parser.parse_args()
+    config = FakeShazamConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, retry_after=args.retry_after,
+        no_match_rate=args.no_match_rate,
+    )
+    web.run_app(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
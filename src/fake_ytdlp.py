@@ -0,0 +1,96 @@
+"""Stand-in for `python -m yt_dlp`, for load tests.
+
+Accepts the command line the web app builds, prints the progress lines the
+app parses (on stderr, one per line like `--newline`), and writes a
+synthetic DJ set to the `-o` template as MP3. Enable it with
+`YTDLP_COMMAND="python -m src.fake_ytdlp"`.
+
+Tunables (environment): FAKE_YTDLP_SECONDS (simulated download time),
+FAKE_YTDLP_AUDIO_MINUTES (length of the set), FAKE_YTDLP_FAIL_RATE
+(fraction of runs exiting 1 like a geo-blocked video),
+FAKE_YTDLP_PLAYLIST_SIZE (entries listed by `--flat-playlist -J` for URLs
+that look like playlists: `list=`, `/playlist`, `/sets/`).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from src.single_flight import canonical_url
+
+
+def _say(line: str) -> None:
+    print(line, file=sys.stderr, flush=True)
+
+
+def _video_id(url: str) -> str:
+    return hashlib.sha1(url.encode()).hexdigest()[:11]
+
+
+def flat_playlist(url: str) -> dict:
+    """What `yt-dlp --flat-playlist -J` prints for `url`."""
+    if not any(marker in url for marker in ("list=", "/playlist", "/sets/")):
+        return {"_type": "video", "id": _video_id(url), "title": f"Fake Mix {_video_id(url)}",
+                "webpage_url": url}
+    size = int(os.environ.get("FAKE_YTDLP_PLAYLIST_SIZE", "3"))
+    url = canonical_url(url)  # the same playlist however it was shared
+    entries = []
+    for i in range(size):
+        video_id = _video_id(f"{url}#{i}")
+        entries.append({"_type": "url", "id": video_id, "title": f"Fake Mix {video_id}",
+                        "url": f"https://www.youtube.com/watch?v={video_id}"})
+    return {"_type": "playlist", "id": _video_id(url), "title": "Fake Show", "entries": entries}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-o", "--output")
+    parser.add_argument("-J", "--dump-single-json", action="store_true")
+    args, rest = parser.parse_known_args()
+    args.url = rest[-1]  # the app always passes the URL last
+
+    if args.dump_single_json:
+        print(json.dumps(flat_playlist(args.url)))
+        return 0
+
+    download_seconds = float(os.environ.get("FAKE_YTDLP_SECONDS", "2"))
+    minutes = float(os.environ.get("FAKE_YTDLP_AUDIO_MINUTES", "6"))
+    fail_rate = float(os.environ.get("FAKE_YTDLP_FAIL_RATE", "0"))
+
+    video_id = _video_id(args.url)
+    seed = int(video_id, 16)
+    title = f"Fake Mix {video_id}"
+    _say(f"[youtube] Extracting URL: {args.url}")
+    _say(f"[youtube] {video_id}: Downloading webpage")
+    if random.random() < fail_rate:
+        _say(f"ERROR: [youtube] {video_id}: Video unavailable. This video is not available in your country")
+        return 1
+
+    stem = args.output.replace("%(title)s", title)
+    _say(f"[download] Destination: {stem.replace('%(ext)s', 'webm')}")
+    size_mib = minutes * 60 * 160 / 8 / 1024  # ~160 kbit/s opus
+    steps = 20
+    for step in range(1, steps + 1):
+        time.sleep(download_seconds / steps)
+        pct = 100.0 * step / steps
+        remaining = download_seconds * (1 - step / steps)
+        _say(f"[download] {pct:5.1f}% of {size_mib:8.2f}MiB at {size_mib / max(download_seconds, 0.1):6.2f}MiB/s "
+             f"ETA 00:{int(remaining):02d}")
+
+    destination = Path(stem.replace("%(ext)s", "mp3"))
+    _say(f"[ExtractAudio] Destination: {destination}")
+    # Heavy imports only once the "download" is done, like the real ffmpeg step.
+    import soundfile as sf
+    from src.loadtest import ANALYSIS_SR, synthetic_set
+
+    sf.write(str(destination), synthetic_set(minutes, seed=seed), ANALYSIS_SR, format="MP3")
+    _say(f"Deleting original file {stem.replace('%(ext)s', 'webm')} (pass -k to keep)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""Cached transition curves, and the segmentation that runs on them.
+
+Boundary detection has two halves. The expensive one decodes the set and
+computes the smoothed centroid/RMS transition curve. The cheap one picks
+peaks on that curve with a threshold and a minimum song duration. Only the
+cheap half depends on those two parameters, yet every re-run with new
+values used to repeat the decode and the whole spectral pass.
+
+The curve (float32, one value per 512-sample frame: ~2 MB for a 3 h set)
+is now stored under a key made of the file's content hash and every
+setting the curve depends on. Re-segmenting, or sweeping a grid of
+parameters, then takes milliseconds instead of minutes. The coarse-to-fine
+detector never builds the full curve; it stores its coarse curve instead
+(one value per COARSE_STRIDE frames), so re-segmenting a long set works
+from that, with boundaries to within a coarse frame (~0.7 s). A later
+full-resolution pass replaces it.
+
+FEATURE_CACHE_DIR (default tmp/feature_tracks, relative to the project
+root) sets where tracks live; empty disables the cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from src.parallel_features import CENTROID_N_FFT, HOP_LENGTH, RMS_FRAME_LENGTH
+from src.paths import FEATURE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = FEATURE_CACHE_DIR
+# Smoothing of the combined feature, in frames.
+SMOOTHING_SIGMA = 10
+# Bump when the curve's definition changes so old tracks stop matching.
+TRACK_VERSION = 1
+
+
+@dataclass
+class FeatureTrack:
+    """Smoothed transition curve of one decoded set."""
+
+    curve: np.ndarray  # float32, one value per `hop_length` samples
+    n_samples: int
+    sample_rate: int
+    # HOP_LENGTH for the full curve; a multiple of it for the cascade's coarse one.
+    hop_length: int = HOP_LENGTH
+
+    @property
+    def full_resolution(self) -> bool:
+        return self.hop_length == HOP_LENGTH
+
+    @property
+    def duration(self) -> float:
+        return self.n_samples / self.sample_rate
+
+
+def auto_min_song_duration(duration: float) -> int:
+    """Minimum song duration (s) for a set of this length."""
+    hours = duration / 3600
+    if hours < 1:
+        return 30
+    elif hours < 2:
+        return 45
+    elif hours < 3:
+        return 60
+    else:
+        return 90
+
+
+def auto_peak_threshold(duration: float) -> float:
+    """Peak detection threshold for a set of this length."""
+    hours = duration / 3600
+    if hours < 1:
+        return 0.30
+    elif hours < 2:
+        return 0.25
+    elif hours < 3:
+        return 0.20
+    else:
+        return 0.15
+
+
+def boundaries_from_peaks(peaks: Iterable[int], n_samples: int, sample_rate: int,
+                          min_song_duration: float, hop_length: int = HOP_LENGTH) -> List[int]:
+    """Segment boundaries (sample indices) from transition peaks (frame indices)."""
+    # Convert frame indices to sample indices
+    boundaries = [0]  # Start of audio
+    for peak in peaks:
+        boundaries.append(int(peak) * hop_length)
+    boundaries.append(n_samples)  # End of audio
+
+    # Filter out segments that are too short
+    filtered_boundaries = [boundaries[0]]
+    for i in range(1, len(boundaries)):
+        if (boundaries[i] - filtered_boundaries[-1]) / sample_rate >= min_song_duration:
+            filtered_boundaries.append(boundaries[i])
+
+    # Ensure last boundary is included
+    if filtered_boundaries[-1] != boundaries[-1]:
+        filtered_boundaries[-1] = boundaries[-1]
+
+    return filtered_boundaries
+
+
+def pick_boundaries(curve: np.ndarray, n_samples: int, sample_rate: int,
+                    peak_threshold: float, min_song_duration: float,
+                    hop_length: int = HOP_LENGTH) -> List[int]:
+    """Turn the transition curve into segment boundaries (sample indices)."""
+    # Convert threshold (0-1) to percentile (0-100)
+    percentile_threshold = (1 - peak_threshold) * 100
+    peaks, _ = find_peaks(curve,
+                          height=np.percentile(curve, percentile_threshold),
+                          distance=max(1, int(min_song_duration * sample_rate / hop_length)))
+    return boundaries_from_peaks(peaks, n_samples, sample_rate, min_song_duration, hop_length)
+
+
+def segment(track: FeatureTrack, peak_threshold: Optional[float] = None,
+            min_song_duration: Optional[float] = None) -> Dict:
+    """Boundaries of a track for one parameter pair (None: auto for its length)."""
+    threshold = peak_threshold or auto_peak_threshold(track.duration)
+    min_duration = min_song_duration or auto_min_song_duration(track.duration)
+    boundaries = pick_boundaries(track.curve, track.n_samples, track.sample_rate,
+                                 threshold, min_duration, track.hop_length)
+    return {
+        "threshold": threshold,
+        "min_song_duration": min_duration,
+        "segments": len(boundaries) - 1,
+        "boundaries": [round(b / track.sample_rate, 3) for b in boundaries],
+    }
+
+
+def sweep(track: FeatureTrack, thresholds: Sequence[Optional[float]] = (None,),
+          min_song_durations: Sequence[Optional[float]] = (None,)) -> List[Dict]:
+    """`segment` for every threshold x min duration combination, in that order."""
+    return [segment(track, threshold, min_duration)
+            for threshold in thresholds for min_duration in min_song_durations]
+
+
+def content_hash(path: Union[str, Path]) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def track_key(digest: str, target_sr: int) -> str:
+    """Cache key of the curve of content `digest` decoded at `target_sr`."""
+    settings = json.dumps({
+        "version": TRACK_VERSION, "sr": target_sr, "hop": HOP_LENGTH,
+        "centroid_n_fft": CENTROID_N_FFT, "rms_frame": RMS_FRAME_LENGTH,
+        "sigma": SMOOTHING_SIGMA,
+    }, sort_keys=True)
+    return f"{digest}-{hashlib.sha256(settings.encode()).hexdigest()[:12]}"
+
+
+class FeatureTrackCache:
+    """One `<key>.npz` per track in a directory."""
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[FeatureTrack]:
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                track = FeatureTrack(curve=data["curve"], n_samples=int(data["n_samples"]),
+                                     sample_rate=int(data["sample_rate"]),
+                                     hop_length=int(data.get("hop_length", HOP_LENGTH)))
+            # Mark as read (atime only) for the storage manager's LRU.
+            os.utime(path, (time.time(), path.stat().st_mtime))
+            return track
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable feature track {key}: {e!r}")
+            return None
+
+    def put(self, key: str, track: FeatureTrack) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, curve=track.curve.astype(np.float32, copy=False),
+                 n_samples=track.n_samples, sample_rate=track.sample_rate,
+                 hop_length=track.hop_length)
+        os.replace(tmp, path)
+
+
+_cache: Optional[FeatureTrackCache] = None
+
+
+def get_feature_cache() -> Optional[FeatureTrackCache]:
+    """Process-wide cache; None when FEATURE_CACHE_DIR is set empty."""
+    global _cache
+    if not CACHE_DIR:
+        return None
+    if _cache is None:
+        _cache = FeatureTrackCache(CACHE_DIR)
+    return _cache
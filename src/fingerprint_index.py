@@ -0,0 +1,225 @@
+"""Local landmark-fingerprint index of tracks Shazam has already identified.
+
+The same few thousand tracks come back set after set, and every occurrence
+used to cost a rate-limited Shazam call. When Shazam identifies a segment
+with high confidence, the segment's recognition excerpt is fingerprinted
+and stored here; later segments are looked up locally first and only go to
+the network on a miss.
+
+Fingerprints are constellation landmarks (Wang, "An Industrial-Strength
+Audio Search Algorithm"): spectrogram peaks are paired with a few later
+peaks, and each pair hashes (f1, f2, dt) into 24 bits, stored with the
+anchor's frame offset in an SQLite inverted index. A query counts, per
+track, how many of its hashes agree on a single time offset; enough aligned
+hashes is a match. Landmarks don't survive large tempo changes, so
+pitched/stretched plays simply miss and fall back to Shazam (which then
+adds that excerpt too).
+"""
+import logging
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import maximum_filter
+from scipy.signal import resample_poly
+
+from src.paths import FINGERPRINT_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+# Relative to the project root; not swept by the storage manager.
+INDEX_PATH = FINGERPRINT_INDEX_PATH
+
+FP_SR = 8000
+N_FFT = 512
+HOP = 256  # 32 ms frames
+PEAK_NEIGHBORHOOD = (15, 9)  # (freq bins, frames) a peak must dominate
+PEAKS_PER_SECOND = 30
+FAN_OUT = 5
+MAX_DT = 63  # frames (~2 s); fits the 6-bit dt field
+# Aligned hashes needed to accept a match. Against a few hundred indexed
+# tracks unrelated audio lines up ~10 at most; 25 s of the same recording
+# lines up several hundred.
+MIN_ALIGNED_HASHES = 50
+MAX_EXCERPTS_PER_TRACK = 8
+_SQL_BATCH = 500
+
+Landmark = Tuple[int, int]  # (hash, anchor frame)
+
+
+def _peaks(pcm: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+    """(frame, bin) of the strongest local maxima of the log spectrogram."""
+    audio = pcm.astype(np.float32) / 32768.0
+    if sample_rate != FP_SR:
+        audio = resample_poly(audio, FP_SR, sample_rate)
+    if len(audio) < N_FFT:
+        return []
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP]
+    spec = np.abs(np.fft.rfft(frames * np.hanning(N_FFT), axis=1)).T
+    log_spec = np.log(spec + 1e-6)
+    is_peak = (log_spec == maximum_filter(log_spec, size=PEAK_NEIGHBORHOOD)) & (
+        log_spec > np.median(log_spec) + 1.0
+    )
+    bins, times = np.nonzero(is_peak)
+    budget = int(PEAKS_PER_SECOND * len(audio) / FP_SR) + 1
+    if len(times) > budget:
+        strongest = np.argsort(log_spec[bins, times])[-budget:]
+        bins, times = bins[strongest], times[strongest]
+    order = np.lexsort((bins, times))
+    return list(zip(times[order].tolist(), bins[order].tolist()))
+
+
+def fingerprint(pcm: np.ndarray, sample_rate: int) -> List[Landmark]:
+    """Landmark hashes of int16 mono PCM, with their anchor frame."""
+    peaks = _peaks(pcm, sample_rate)
+    landmarks = []
+    for i, (t1, f1) in enumerate(peaks):
+        paired = 0
+        for t2, f2 in peaks[i + 1:]:
+            dt = t2 - t1
+            if dt > MAX_DT:
+                break
+            if dt == 0:
+                continue
+            landmarks.append(((f1 << 15) | (f2 << 6) | dt, t1))
+            paired += 1
+            if paired == FAN_OUT:
+                break
+    return landmarks
+
+
+def track_key(track: Dict) -> str:
+    """Same identity the tracklist dedup uses."""
+    return f"{track['artist'].lower()}_{track['title'].lower()}"
+
+
+class FingerprintIndex:
+    """On-disk inverted index: landmark hash -> (track, offset)."""
+
+    def __init__(self, path: str = INDEX_PATH, min_aligned: int = MIN_ALIGNED_HASHES,
+                 max_excerpts: int = MAX_EXCERPTS_PER_TRACK):
+        self.path = Path(path)
+        self.min_aligned = min_aligned
+        self.max_excerpts = max_excerpts
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self, create: bool) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            if not create and not self.path.exists():
+                return None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    id INTEGER PRIMARY KEY,
+                    track_key TEXT UNIQUE NOT NULL,
+                    title TEXT, artist TEXT, shazam_url TEXT,
+                    match_count INTEGER, excerpts INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS hashes (
+                    hash INTEGER NOT NULL, track_id INTEGER NOT NULL, offset INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS hashes_by_hash ON hashes (hash);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def add(self, pcm: np.ndarray, sample_rate: int, track: Dict) -> bool:
+        """Index an excerpt of an identified track. False if skipped."""
+        landmarks = fingerprint(pcm, sample_rate)
+        if len(landmarks) < self.min_aligned:
+            return False
+        key = track_key(track)
+        with self._lock:
+            conn = self._connect(create=True)
+            with conn:
+                row = conn.execute(
+                    "SELECT id, excerpts FROM tracks WHERE track_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    track_id = conn.execute(
+                        "INSERT INTO tracks (track_key, title, artist, shazam_url, match_count)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (key, track["title"], track["artist"], track.get("shazam_url", ""),
+                         track.get("match_count")),
+                    ).lastrowid
+                elif row[1] >= self.max_excerpts:
+                    return False
+                else:
+                    track_id = row[0]
+                conn.executemany(
+                    "INSERT INTO hashes (hash, track_id, offset) VALUES (?, ?, ?)",
+                    ((h, track_id, t) for h, t in landmarks),
+                )
+                conn.execute("UPDATE tracks SET excerpts = excerpts + 1 WHERE id = ?", (track_id,))
+        logger.info(f"Indexed {len(landmarks)} landmarks for {track['artist']} - {track['title']}")
+        return True
+
+    def query(self, pcm: np.ndarray, sample_rate: int) -> Optional[Dict]:
+        """Best local match with at least `min_aligned` aligned hashes, else None."""
+        landmarks = fingerprint(pcm, sample_rate)
+        if len(landmarks) < self.min_aligned:
+            return None
+        query_offsets: Dict[int, List[int]] = defaultdict(list)
+        for h, t in landmarks:
+            query_offsets[h].append(t)
+        hashes = list(query_offsets)
+
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            votes: Counter = Counter()
+            for i in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT hash, track_id, offset FROM hashes WHERE hash IN"
+                    f" ({','.join('?' * len(batch))})", batch,
+                )
+                for h, track_id, offset in rows:
+                    for t in query_offsets[h]:
+                        votes[(track_id, offset - t)] += 1
+            if not votes:
+                return None
+            (track_id, _), aligned = votes.most_common(1)[0]
+            if aligned < self.min_aligned:
+                return None
+            title, artist, url, match_count = conn.execute(
+                "SELECT title, artist, shazam_url, match_count FROM tracks WHERE id = ?",
+                (track_id,),
+            ).fetchone()
+        return {"title": title, "artist": artist, "shazam_url": url,
+                "match_count": match_count, "aligned_hashes": aligned}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return {"tracks": 0, "hashes": 0}
+            tracks = conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            hashes = conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        return {"tracks": tracks, "hashes": hashes}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_index: Optional[FingerprintIndex] = None
+
+
+def get_fingerprint_index() -> Optional[FingerprintIndex]:
+    """Process-wide index; None when FINGERPRINT_INDEX_PATH is set empty."""
+    global _index
+    if not INDEX_PATH:
+        return None
+    if _index is None:
+        _index = FingerprintIndex(INDEX_PATH)
+    return _index
@@ -0,0 +1,207 @@
+"""HTTP caching helpers: strong ETags, 304s, memoized views, precompression.
+
+Tracklist files never change after a job writes them, and `index.html` only
+changes on deploy, yet every hit re-sent the full body and `/api/view`
+re-parsed the TXT + JSON to rebuild its HTML. ETags are derived from file
+size + mtime (strong: a rewrite always changes one of them), rendered views
+are memoized under the same fingerprint, and gzip (plus brotli when the
+`brotli` package is installed) copies of large files are built once, in
+the background, and served to clients that accept them; until a copy is
+ready the file goes out as is. Each encoding of a file is a different
+body, so it gets its own ETag (`"<tag>-gzip"`).
+"""
+import asyncio
+import glob
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+
+from src import metrics
+from src.paths import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSED_DIR = BASE_DIR / "tmp" / "http_cache"
+# Below this, compression overhead beats the bandwidth saved.
+MIN_COMPRESS_BYTES = 1024
+# Validate on every use, but let clients keep the body.
+CACHE_CONTROL = "no-cache"
+
+# Copies being built, and versions that compression didn't make smaller.
+_building: Dict[Path, "asyncio.Future"] = {}
+_incompressible: Set[Path] = set()
+
+
+def fingerprint(paths: Iterable[Path]) -> Tuple:
+    """(name, size, mtime_ns) of every existing path; changes on any rewrite."""
+    parts = []
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        parts.append((path.name, st.st_size, st.st_mtime_ns))
+    return tuple(parts)
+
+
+def make_etag(fp: Tuple) -> str:
+    if len(fp) == 1:
+        _, size, mtime_ns = fp[0]
+        return f'"{size:x}-{mtime_ns:x}"'
+    digest = hashlib.sha1(repr(fp).encode()).hexdigest()[:16]
+    return f'"{digest}-{len(fp)}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: ignore W/ prefixes.
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def _not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def _accepted_encodings(request: Request) -> List[str]:
+    accept = request.headers.get("accept-encoding", "")
+    offered = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+    encodings = []
+    if brotli is not None and "br" in offered:
+        encodings.append("br")
+    if "gzip" in offered:
+        encodings.append("gzip")
+    return encodings
+
+
+def _copy_path(path: Path, encoding: str, etag: str) -> Path:
+    suffix = {"gzip": ".gz", "br": ".br"}[encoding]
+    version = etag.strip('"')
+    return COMPRESSED_DIR / f"{path.name}.{version}{suffix}"
+
+
+def compressed_copy(path: Path, encoding: str, etag: str) -> Optional[Path]:
+    """Precompressed sibling of `path` in COMPRESSED_DIR, built if missing.
+
+    Blocks for as long as compression takes: call it from a worker thread.
+    """
+    target = _copy_path(path, encoding, etag)
+    if target.exists():
+        return target
+    try:
+        data = path.read_bytes()
+        if encoding == "gzip":
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            packed = brotli.compress(data)
+        if len(packed) >= len(data):
+            _incompressible.add(target)
+            return None
+        COMPRESSED_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_bytes(packed)
+        os.replace(tmp, target)
+        # Drop copies of previous versions of the same file.
+        for stale in COMPRESSED_DIR.glob(f"{glob.escape(path.name)}.*{target.suffix}"):
+            if stale != target:
+                stale.unlink(missing_ok=True)
+        return target
+    except OSError as exc:
+        logger.warning("Could not precompress %s: %s", path, exc)
+        return None
+
+
+def ready_copy(path: Path, encoding: str, etag: str) -> Optional[Path]:
+    """The precompressed copy if it's built, else None. A missing copy is
+    built in the default executor, never on the event loop."""
+    target = _copy_path(path, encoding, etag)
+    if target.exists():
+        return target
+    if target not in _building and target not in _incompressible:
+        future = asyncio.get_running_loop().run_in_executor(
+            None, compressed_copy, path, encoding, etag)
+        _building[target] = future
+        future.add_done_callback(lambda _: _building.pop(target, None))
+    return None
+
+
+def file_response(request: Request, path: Path, filename: Optional[str] = None,
+                  media_type: Optional[str] = None) -> Response:
+    """FileResponse with a strong ETag, 304 support and precompressed bodies."""
+    fp = fingerprint([path])
+    etag = make_etag(fp)
+    body, encoding = path, None
+    if fp and fp[0][1] >= MIN_COMPRESS_BYTES:
+        for accepted in _accepted_encodings(request):
+            copy = ready_copy(path, accepted, etag)
+            if copy is not None:
+                body, encoding = copy, accepted
+                break
+    if encoding is not None:
+        etag = f'{etag[:-1]}-{encoding}"'
+    if not_modified(request, etag):
+        return _not_modified_response(etag)
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if media_type is None:
+        media_type = mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    return FileResponse(body, filename=filename, media_type=media_type, headers=headers)
+
+
+class MemoCache:
+    """Small LRU of computed values, each valid for one fingerprint."""
+
+    def __init__(self, name: str, max_entries: int = 256):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple, Any]]" = OrderedDict()
+
+    def get_or_compute(self, key: Hashable, fp: Tuple, compute: Callable[[], Any]) -> Any:
+        entry = self._entries.get(key)
+        hit = entry is not None and entry[0] == fp
+        metrics.cache_lookup(self.name, hit)
+        if hit:
+            self._entries.move_to_end(key)
+            return entry[1]
+        value = compute()
+        self._entries[key] = (fp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def cached_json(request: Request, cache: MemoCache, key: Hashable, fp: Tuple,
+                compute: Callable[[], Any]) -> Response:
+    """JSON built from files, validated by an ETag over their fingerprint.
+
+    The 304 check runs before `compute`, and the computed body is memoized
+    until one of the files changes.
+    """
+    etag = make_etag(fp) if fp else '"empty"'
+    if not_modified(request, etag):
+        return _not_modified_response(etag)
+    content = cache.get_or_compute(key, fp, compute)
+    return JSONResponse(content, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
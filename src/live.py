@@ -0,0 +1,592 @@
+"""Live analysis of a growing file or an HTTP/Icecast stream.
+
+`DJSetAnalyzer` needs the complete file: boundaries are peaks of a curve
+normalized over the whole set. `LiveAnalyzer` decodes the source as it
+arrives and decides boundaries incrementally:
+
+- Audio is decoded in one-second blocks (libsndfile through a file-like
+  object that waits for more data) and resampled with a streaming soxr
+  resampler. libsndfile stops a WAV at the frame count its header had
+  when it was opened, so WAV sources are read as raw PCM after the
+  header instead, up to wherever the file or stream has got to. Only the last AUDIO_KEEP_SECONDS stay in memory.
+- Features are the offline ones, computed for each frame as soon as its
+  whole window has arrived (`frame_range_features` on the buffer).
+- `LiveSegmenter` keeps WINDOW_SECONDS of features. Its transition curve
+  is normalized and thresholded over that window instead of the whole
+  set. A peak becomes a boundary once CONFIRM_SECONDS have passed without
+  a higher one. The offline detector would drop it for a higher peak up to
+  `min_song_duration` later; live, that higher peak becomes a boundary as
+  well. The excerpt after a false boundary just re-identifies the playing
+  track, which is not emitted twice.
+- The excerpt EXCERPT_OFFSET_SECONDS after each boundary (past the mix
+  overlap) is recognized as soon as it has arrived. The current track is
+  also re-checked every RECHECK_SECONDS, which catches missed transitions.
+  Tracks are emitted in stream order as they are identified, typically
+  15-20 s after the transition.
+
+Memory is bounded by the audio buffer (~5 MB at 22050 Hz), the feature
+window and a small rewind buffer for HTTP sources, whatever the stream's
+length. A growing file ends after `idle_timeout` seconds without growth,
+and an HTTP stream ends when the server closes it. Either can be stopped
+with `stop()`, which still recognizes what is pending.
+
+CLI: python -m src.live <file-or-url> [--threshold T] [--min-song-duration S]
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import signal
+import struct
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+
+from src.feature_tracks import SMOOTHING_SIGMA, auto_min_song_duration, auto_peak_threshold
+from src.parallel_features import HALO, HOP_LENGTH, frame_range_features
+from src.recognizer_backends import RECOGNIZER_BACKEND, create_backend
+from src.segment_encoder import EncodedSegment, encode_segment
+from src.shazamer import DJSetAnalyzer, format_timestamp
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SECONDS = 1.0
+AUDIO_KEEP_SECONDS = 90.0
+WINDOW_SECONDS = 600.0
+CONFIRM_SECONDS = 8.0
+EXCERPT_OFFSET_SECONDS = 4.0
+EXCERPT_SECONDS = 12.0
+# Shorter excerpts (at the very end of a stream) aren't worth a request.
+MIN_EXCERPT_SECONDS = 4.0
+RECHECK_SECONDS = 240.0
+IDLE_TIMEOUT = 30.0
+POLL_SECONDS = 0.2
+# How far back libsndfile may seek in a non-seekable HTTP stream.
+REWIND_BYTES = 256 * 1024
+# Decoded blocks waiting for the analysis; the reader blocks beyond this.
+QUEUE_BLOCKS = 8
+
+
+class GrowingFile(io.RawIOBase):
+    """A file that is still being written. Reads wait for more data and
+    return EOF after `idle_timeout` seconds without growth, or on `stop`."""
+
+    def __init__(self, path, stop: threading.Event, idle_timeout: float = IDLE_TIMEOUT):
+        self._file = open(path, "rb")
+        self._stop = stop
+        self.idle_timeout = idle_timeout
+        self.name = str(path)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def readinto(self, buffer) -> int:
+        idle_since = time.monotonic()
+        while not self._stop.is_set():
+            n = self._file.readinto(buffer)
+            if n:
+                return n
+            if time.monotonic() - idle_since >= self.idle_timeout:
+                return 0
+            self._stop.wait(POLL_SECONDS)
+        return 0
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class HTTPStream(io.RawIOBase):
+    """An HTTP (Icecast/Shoutcast) audio stream. Only the last
+    `rewind_bytes` are kept, for the short seeks back libsndfile makes."""
+
+    def __init__(self, url: str, stop: threading.Event, timeout: float = IDLE_TIMEOUT,
+                 rewind_bytes: int = REWIND_BYTES):
+        request = urllib.request.Request(url, headers={
+            "Icy-MetaData": "0",  # no title metadata interleaved with the audio
+            "User-Agent": "shazamer-live",
+        })
+        self._response = urllib.request.urlopen(request, timeout=timeout)
+        self._stop = stop
+        self.rewind_bytes = rewind_bytes
+        self._buffer = bytearray()
+        self._buffer_start = 0  # stream offset of _buffer[0]
+        self._pos = 0
+        self.name = url
+
+    @property
+    def _end(self) -> int:
+        return self._buffer_start + len(self._buffer)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # The end of a live stream is wherever it has got to.
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._end}[whence]
+        if base + offset < self._buffer_start:
+            raise OSError(f"Cannot seek back past the last {self.rewind_bytes} bytes of a stream")
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        while self._pos >= self._end:
+            if self._stop.is_set():
+                return 0
+            try:
+                chunk = self._response.read1(64 * 1024)
+            except TimeoutError:
+                return 0
+            if not chunk:
+                return 0
+            self._buffer += chunk
+            drop = min(len(self._buffer) - self.rewind_bytes, self._pos - self._buffer_start)
+            if drop > 0:
+                del self._buffer[:drop]
+                self._buffer_start += drop
+        i = self._pos - self._buffer_start
+        n = min(len(buffer), len(self._buffer) - i)
+        buffer[:n] = self._buffer[i:i + n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        self._response.close()
+        super().close()
+
+
+def open_source(source: str, stop: threading.Event,
+                idle_timeout: float = IDLE_TIMEOUT) -> io.RawIOBase:
+    if source.startswith(("http://", "https://")):
+        return HTTPStream(source, stop, timeout=idle_timeout)
+    return GrowingFile(source, stop, idle_timeout)
+
+
+# Chunks that may follow the audio of a finished WAV file.
+_TRAILING_WAV_CHUNKS = {b"LIST", b"id3 ", b"ID3 ", b"cue ", b"bext", b"smpl", b"JUNK", b"PAD "}
+_WAVE_FORMAT_PCM, _WAVE_FORMAT_FLOAT, _WAVE_FORMAT_EXTENSIBLE = 1, 3, 0xFFFE
+
+
+def _read_exact(raw: io.RawIOBase, n: int) -> bytes:
+    """Up to `n` bytes, fewer only at the end of the source."""
+    data = bytearray()
+    while len(data) < n:
+        chunk = raw.read(n - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def _pcm_to_float(data: bytes, channels: int, bits: int, is_float: bool) -> np.ndarray:
+    """Interleaved PCM bytes to mono float32."""
+    if is_float:
+        samples = np.frombuffer(data, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    elif bits == 8:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif bits == 24:
+        b = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((b[:, 0] << 8 | b[:, 1] << 16 | b[:, 2] << 24) >> 8).astype(np.float32) / 2 ** 23
+    else:
+        samples = np.frombuffer(data, dtype="<i2" if bits == 16 else "<i4").astype(np.float32)
+        samples /= 2 ** (bits - 1)
+    return samples.reshape(-1, channels).mean(axis=1)
+
+
+def _wav_blocks(raw: io.RawIOBase, block_seconds: float) -> Tuple[int, Iterator[np.ndarray]]:
+    """Sample rate and mono blocks of a WAV source that may still be growing.
+
+    The RIFF and data sizes are ignored (a recorder may not have updated
+    them yet, or streams 0xFFFFFFFF): the audio runs to the end of the
+    source, or to a known trailing chunk after the declared data size.
+    """
+    if _read_exact(raw, 12)[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file")
+    fmt = None
+    while True:
+        header = _read_exact(raw, 8)
+        if len(header) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"data":
+            break
+        body = _read_exact(raw, size + (size & 1))
+        if chunk_id == b"fmt ":
+            fmt = body
+    if fmt is None:
+        raise ValueError("WAV file has no fmt chunk")
+    tag, channels, sample_rate = struct.unpack("<HHI", fmt[:8])
+    bits = struct.unpack("<H", fmt[14:16])[0]
+    if tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    if tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_FLOAT) or bits not in (8, 16, 24, 32, 64):
+        raise ValueError(f"Unsupported WAV encoding (format {tag}, {bits} bit)")
+    frame_bytes = channels * bits // 8
+    declared = size if size not in (0, 0xFFFFFFFF) else None
+    is_float = tag == _WAVE_FORMAT_FLOAT
+
+    def read_audio(limit: Optional[int], pending: bytes = b"") -> Iterator[np.ndarray]:
+        """Blocks of the next `limit` bytes (None: to the end of the source)."""
+        block_bytes = int(sample_rate * block_seconds) * frame_bytes
+        while limit is None or limit > 0:
+            want = block_bytes if limit is None else min(block_bytes, limit)
+            data = pending + _read_exact(raw, want - len(pending))
+            if limit is not None:
+                limit -= len(data) - len(pending)
+            usable = len(data) // frame_bytes * frame_bytes
+            if usable:
+                yield _pcm_to_float(data[:usable], channels, bits, is_float)
+            pending = data[usable:]
+            if len(data) < want:
+                return
+
+    def blocks() -> Iterator[np.ndarray]:
+        if declared is None:
+            yield from read_audio(None)
+            return
+        yield from read_audio(declared)
+        # Past the declared size: the file's trailing chunks, or more audio
+        # the recorder hasn't put in the header yet.
+        following = _read_exact(raw, 4)
+        if following and following not in _TRAILING_WAV_CHUNKS:
+            yield from read_audio(None, following)
+
+    return sample_rate, blocks()
+
+
+def _sndfile_blocks(raw: io.RawIOBase, block_seconds: float) -> Tuple[int, Iterator[np.ndarray]]:
+    import soundfile as sf
+
+    f = sf.SoundFile(raw)
+
+    def blocks() -> Iterator[np.ndarray]:
+        with f:
+            for block in f.blocks(blocksize=int(f.samplerate * block_seconds),
+                                  dtype="float32", always_2d=True):
+                yield block.mean(axis=1)
+
+    return f.samplerate, blocks()
+
+
+def decode_blocks(raw: io.RawIOBase, target_sr: int,
+                  block_seconds: float = BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    """Mono float32 blocks at `target_sr` as the source delivers them. Blocking."""
+    import soxr
+
+    magic = _read_exact(raw, 12)
+    raw.seek(0)
+    if magic[:4] in (b"RIFF", b"RF64") and magic[8:12] == b"WAVE":
+        sample_rate, blocks = _wav_blocks(raw, block_seconds)
+    else:
+        sample_rate, blocks = _sndfile_blocks(raw, block_seconds)
+
+    resampler = None
+    if sample_rate != target_sr:
+        resampler = soxr.ResampleStream(sample_rate, target_sr, 1, dtype="float32")
+    for mono in blocks:
+        out = resampler.resample_chunk(mono) if resampler else mono
+        if len(out):
+            yield out
+    if resampler:
+        tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+
+
+class LiveSegmenter:
+    """Boundary decisions on feature frames pushed in stream order."""
+
+    def __init__(self, sample_rate: int, peak_threshold: float, min_song_duration: float,
+                 window_seconds: float = WINDOW_SECONDS, confirm_seconds: float = CONFIRM_SECONDS):
+        fps = sample_rate / HOP_LENGTH
+        self.peak_threshold = peak_threshold
+        self.distance = max(1, int(min_song_duration * fps))
+        self.confirm = int(confirm_seconds * fps)
+        self.window = max(int(window_seconds * fps), self.distance + self.confirm)
+        # Smoothed values within this many frames of the newest one can
+        # still change (gaussian_filter1d truncates at 4 sigma).
+        self.margin = 4 * SMOOTHING_SIGMA + 1
+        self._centroid = np.zeros(0, dtype=np.float32)
+        self._rms = np.zeros(0, dtype=np.float32)
+        self._first = 0  # global index of the oldest frame kept
+        self._decided = 1  # frames before this are decided
+
+    @property
+    def frames(self) -> int:
+        return self._first + len(self._centroid)
+
+    def push(self, centroid: np.ndarray, rms: np.ndarray, final: bool = False) -> List[int]:
+        """Add frames; returns the frame index of each newly decided boundary.
+        `final` decides everything left (end of stream)."""
+        self._centroid = np.concatenate([self._centroid, centroid])
+        self._rms = np.concatenate([self._rms, rms])
+        excess = len(self._centroid) - self.window
+        if excess > 0:
+            self._centroid = self._centroid[excess:]
+            self._rms = self._rms[excess:]
+            self._first += excess
+        if len(self._centroid) < 3:
+            return []
+
+        # The offline curve, over the window: normalization only scales the
+        # gradient, so the means don't matter.
+        c_std = float(np.std(self._centroid)) or 1.0
+        r_std = float(np.std(self._rms)) or 1.0
+        combined = np.abs(np.gradient(self._centroid)) / c_std + np.abs(np.gradient(self._rms)) / r_std
+        curve = gaussian_filter1d(combined, sigma=SMOOTHING_SIGMA)
+        height = np.percentile(curve, (1 - self.peak_threshold) * 100)
+
+        settled = len(curve) if final else len(curve) - self.margin
+        upto = settled if final else settled - self.confirm
+        boundaries = []
+        # Like the offline minimum duration, nothing this close to the start.
+        for p in range(max(self._decided - self._first, self.distance - self._first, 1), upto):
+            if curve[p] < height:
+                continue
+            lo = max(0, p - self.distance)
+            # Highest within min_song_duration before it and CONFIRM_SECONDS
+            # after it; the earliest of equal peaks wins.
+            if lo + int(np.argmax(curve[lo:min(settled, p + self.confirm + 1)])) == p:
+                boundaries.append(self._first + p)
+        self._decided = max(self._decided, self._first + upto)
+        return boundaries
+
+
+Excerpt = Tuple[EncodedSegment, float]  # payload, start time of its segment
+
+
+class LiveAnalyzer(DJSetAnalyzer):
+    """Identifies tracks of a live source as they play (see module docstring).
+
+    Subclasses can override `_on_track` and `_on_progress` (no-ops here),
+    called on the event loop as tracks are identified and audio arrives.
+    """
+
+    def __init__(self, source: str, idle_timeout: float = IDLE_TIMEOUT,
+                 recheck_seconds: Optional[float] = RECHECK_SECONDS, **kwargs):
+        kwargs.setdefault("client_id", source)
+        kwargs.setdefault("cluster_threshold", None)
+        super().__init__(source, **kwargs)
+        self.source = source
+        self.idle_timeout = idle_timeout
+        self.recheck_seconds = recheck_seconds
+        self.tracks: List[Dict] = []
+        self.analyzed_seconds = 0.0
+        self._stop = threading.Event()
+        # Audio buffer: samples [_audio_start, _audio_start + len(_audio)).
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._audio_start = 0
+        self._next_frame = 0
+        # (segment start, excerpt start, excerpt end) in samples, not yet recognized
+        self._scheduled: List[Tuple[int, int, int]] = []
+        self._next_recheck: Optional[int] = None
+        self._excerpts = 0
+
+    def stop(self) -> None:
+        """End the stream here: what's pending is still recognized. Thread-safe."""
+        self._stop.set()
+
+    def cancel(self) -> None:
+        self._stop.set()
+        super().cancel()
+
+    def _on_track(self, track: Dict) -> None:
+        """Hook: a newly identified track (no-op here)."""
+
+    def _on_progress(self, analyzed_seconds: float) -> None:
+        """Hook: audio analyzed so far (no-op here)."""
+
+    @property
+    def _audio_end(self) -> int:
+        return self._audio_start + len(self._audio)
+
+    def _schedule(self, segment_start: int, excerpt_start: int) -> None:
+        sr = self.target_sr
+        self._scheduled.append((segment_start, excerpt_start, excerpt_start + int(EXCERPT_SECONDS * sr)))
+        if self.recheck_seconds is not None:
+            self._next_recheck = segment_start + int(self.recheck_seconds * sr)
+
+    def _advance(self, block: Optional[np.ndarray], segmenter: LiveSegmenter) -> List[Excerpt]:
+        """Take in a decoded block (None: end of stream); returns excerpts ready
+        for recognition. CPU-bound, runs in an executor."""
+        sr = self.target_sr
+        final = block is None
+        if not final:
+            self._audio = np.concatenate([self._audio, block])
+        if self._audio_end == 0:
+            return []
+
+        # Features of every frame whose window has fully arrived (all of
+        # them at the end, zero-padded like the offline pass).
+        n_frames = 1 + self._audio_end // HOP_LENGTH if final else (self._audio_end - HALO) // HOP_LENGTH + 1
+        if n_frames > self._next_frame:
+            first_local = self._audio_start // HOP_LENGTH
+            centroid, rms = frame_range_features(
+                self._audio, sr, self._next_frame - first_local, n_frames - first_local
+            )
+            self._next_frame = n_frames
+            for frame in segmenter.push(centroid.astype(np.float32), rms.astype(np.float32), final):
+                boundary = frame * HOP_LENGTH
+                logger.info(f"Live: transition at {format_timestamp(boundary / sr)}")
+                self._schedule(boundary, boundary + int(EXCERPT_OFFSET_SECONDS * sr))
+
+        if self._next_recheck is not None and self._audio_end >= self._next_recheck:
+            start = self._audio_end - int(EXCERPT_SECONDS * sr)
+            self._schedule(start, start)
+
+        ready, waiting = [], []
+        for segment_start, start, end in self._scheduled:
+            if end > self._audio_end and not final:
+                waiting.append((segment_start, start, end))
+                continue
+            start, end = max(start, self._audio_start), min(end, self._audio_end)
+            if end - start < MIN_EXCERPT_SECONDS * sr:
+                continue
+            encoded = encode_segment(self._audio, sr, start - self._audio_start,
+                                     end - self._audio_start, self._excerpts, window_seconds=None)
+            encoded.wav  # serialize here, off the event loop
+            self._excerpts += 1
+            ready.append((encoded, segment_start / sr))
+        self._scheduled = waiting
+
+        # Keep what pending excerpts and the next feature frames still need,
+        # from a frame-aligned start.
+        keep_from = min([self._audio_end - int(AUDIO_KEEP_SECONDS * sr)]
+                        + [start for _, start, _ in self._scheduled])
+        keep_from = max(0, keep_from) // HOP_LENGTH * HOP_LENGTH
+        if keep_from > self._audio_start:
+            self._audio = self._audio[keep_from - self._audio_start:].copy()
+            self._audio_start = keep_from
+        self.analyzed_seconds = self._audio_end / sr
+        return ready
+
+    async def _identify(self, excerpts: "asyncio.Queue[Optional[Excerpt]]") -> None:
+        """Recognize excerpts in stream order and emit each new track."""
+        while True:
+            item = await excerpts.get()
+            if item is None:
+                return
+            encoded, start_time = item
+            track = await self.recognize_segment(encoded, start_time)
+            if track is None:
+                continue
+            previous = self.tracks[-1] if self.tracks else None
+            if previous and (previous['artist'].lower(), previous['title'].lower()) == \
+                    (track['artist'].lower(), track['title'].lower()):
+                continue  # still the same track (a re-check, or a false transition)
+            self.tracks.append(track)
+            logger.info(f"Live: [{track['start_time']}] {track['artist']} - {track['title']}")
+            self._on_track(track)
+
+    def _read(self, loop: asyncio.AbstractEventLoop,
+              blocks: "asyncio.Queue[object]") -> None:
+        """Reader thread: decode the source into `blocks`, then None (or the error)."""
+        def put(item) -> None:
+            asyncio.run_coroutine_threadsafe(blocks.put(item), loop).result()
+
+        try:
+            raw = open_source(self.source, self._stop, self.idle_timeout)
+            try:
+                for block in decode_blocks(raw, self.target_sr):
+                    put(block)
+                    if self._stop.is_set():
+                        break
+            finally:
+                raw.close()
+        except Exception as e:
+            put(e)
+        put(None)
+
+    async def analyze(self) -> List[Dict]:
+        self.check_cancelled()
+        self.peak_threshold = self._peak_threshold_manual or auto_peak_threshold(0)
+        self.min_song_duration = self._min_song_duration_manual or auto_min_song_duration(0)
+        logger.info(f"Live analysis of {self.source}: threshold={self.peak_threshold}, "
+                    f"min_song_duration={self.min_song_duration}s")
+        segmenter = LiveSegmenter(self.target_sr, self.peak_threshold, self.min_song_duration)
+        self._schedule(0, int(EXCERPT_OFFSET_SECONDS * self.target_sr))
+
+        loop = asyncio.get_running_loop()
+        blocks: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_BLOCKS)
+        excerpts: asyncio.Queue = asyncio.Queue()
+        # Its own thread, not the shared executor: it lives as long as the stream.
+        threading.Thread(target=self._read, args=(loop, blocks),
+                         name=f"live-reader-{self.client_id}", daemon=True).start()
+        identifier = asyncio.create_task(self._identify(excerpts))
+        try:
+            while True:
+                block = await blocks.get()
+                if isinstance(block, Exception):
+                    raise block
+                self.check_cancelled()
+                for excerpt in await self._run_in_executor(self._advance, block, segmenter):
+                    excerpts.put_nowait(excerpt)
+                self._on_progress(self.analyzed_seconds)
+                if block is None:
+                    break
+            excerpts.put_nowait(None)
+            await identifier
+        finally:
+            self._stop.set()
+            identifier.cancel()
+            # Unblock the reader if it is waiting on a full queue.
+            while not blocks.empty():
+                blocks.get_nowait()
+        logger.info(f"Live analysis ended after {format_timestamp(self.analyzed_seconds)}: "
+                    f"{len(self.tracks)} tracks")
+        return self.tracks
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description='Identify tracks of a live stream or a file still being written, as they play')
+    parser.add_argument('source', help='Growing audio file, or http(s) stream URL (Icecast/Shoutcast)')
+    parser.add_argument('-o', '--output', help='Also write the tracklist as JSON here when the stream ends')
+    parser.add_argument('--min-song-duration', type=int, help='Minimum song duration in seconds (default: 30)')
+    parser.add_argument('--threshold', type=float, help='Peak detection threshold (0-1, default: 0.3)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help=f'End after this many seconds without new data (default: {IDLE_TIMEOUT:.0f})')
+    parser.add_argument('--recognizer', default=RECOGNIZER_BACKEND,
+                        help='Recognizer backend: shazam, null, record:<file.jsonl> or replay:<file.jsonl>')
+    args = parser.parse_args()
+
+    class PrintingAnalyzer(LiveAnalyzer):
+        def _on_track(self, track: Dict) -> None:
+            print(f"[{track['start_time']}] {track['artist']} - {track['title']}", flush=True)
+
+    analyzer = PrintingAnalyzer(
+        args.source, idle_timeout=args.idle_timeout, min_song_duration=args.min_song_duration,
+        peak_threshold=args.threshold, recognizer=create_backend(args.recognizer),
+    )
+    # Ctrl-C ends the stream; pending excerpts are still recognized.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGINT, analyzer.stop)
+    tracks = await analyzer.analyze()
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(tracks, indent=2))
+    print(f"\n{len(tracks)} tracks identified in {format_timestamp(analyzer.analyzed_seconds)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,354 @@
+"""End-to-end load test of the web app against local fakes.
+
+Starts the Shazam stand-in (src/fake_shazam.py) in this process, runs the
+real app under uvicorn in a subprocess with yt-dlp swapped for
+src/fake_ytdlp.py, then submits N uploads and M URL jobs at once and
+polls them to completion. While they run, it keeps probing cheap endpoints
+to measure API latency under load, and samples the server's RSS (including
+yt-dlp and feature-worker children). It prints p50/p95/p99 and writes a
+JSON report.
+
+    python -m src.loadtest --uploads 4 --urls 4 --shazam-latency-ms 400 --shazam-rate-limit 3
+
+Everything except the upstream services is real: decoding, detection,
+admission, the recognition gateway and its retry policy. Tracklists the
+jobs write to outputs/ are deleted afterwards unless --keep-outputs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shlex
+import signal
+import socket
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.paths import BASE_DIR
+from src.task_store import NON_TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+WORK_DIR = BASE_DIR / "tmp" / "loadtest"
+ANALYSIS_SR = 22050
+POLL_INTERVAL = 0.25
+PROBE_INTERVAL = 0.1
+
+
+def synthetic_set(minutes: float, track_seconds: float = 150, sr: int = ANALYSIS_SR,
+                  seed: int = 0) -> np.ndarray:
+    """A mono 'DJ set': back-to-back tracks that each have their own chord,
+    tempo and brightness, so boundary detection finds real segments."""
+    rng = np.random.default_rng(seed)
+    n_tracks = max(1, int(np.ceil(minutes * 60 / track_seconds)))
+    track_len = int(track_seconds * sr)
+    t = np.arange(track_len) / sr
+    tracks = []
+    for _ in range(n_tracks):
+        root = 110 * 2 ** (rng.integers(0, 24) / 12)
+        chord = sum(np.sin(2 * np.pi * root * 2 ** (step / 12) * t) for step in (0, 4, 7, 12))
+        bpm = rng.uniform(118, 132)
+        kick = np.exp(-30 * ((t * bpm / 60) % 1)) * np.sin(2 * np.pi * 55 * t)
+        hats = rng.standard_normal(track_len) * rng.uniform(0.02, 0.15)
+        tracks.append((0.15 * chord + 0.5 * kick + hats).astype(np.float32))
+    audio = np.concatenate(tracks)[: int(minutes * 60 * sr)]
+    return 0.8 * audio / np.max(np.abs(audio))
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4), "max": round(float(max(values)), 4)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid: int, field: str) -> int:
+    """A kB field of /proc/<pid>/status, in bytes (0 if gone)."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        try:
+            for task in Path(f"/proc/{current}/task").iterdir():
+                stack.extend(int(c) for c in (task / "children").read_text().split())
+        except OSError:
+            continue
+    return pids
+
+
+class RSSSampler:
+    """Peak summed RSS of a process and its descendants (Linux /proc)."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_tree = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            tree = sum(_proc_status(p, "VmRSS") for p in _process_tree(self.pid))
+            self.peak_tree = max(self.peak_tree, tree)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> Dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+        return {"server_peak_mb": round(_proc_status(self.pid, "VmHWM") / 2**20, 1),
+                "process_tree_peak_mb": round(self.peak_tree / 2**20, 1)}
+
+
+async def _wait_ready(client, server, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.returncode is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/api/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+
+async def _probe(client, path: str, latencies: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.get(path)
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            pass
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def _run_job(client, kind: str, payload, job: Dict, timeout: float) -> None:
+    started = time.perf_counter()
+    if kind == "upload":
+        with open(payload, "rb") as f:
+            response = await client.post("/api/upload", files={"file": (payload.name, f, "audio/mpeg")})
+    else:
+        response = await client.post("/api/download-url", json={"url": payload})
+    job["submit_s"] = time.perf_counter() - started
+    if response.status_code != 200:
+        job.update(status="rejected", error=response.text, latency_s=job["submit_s"])
+        return
+    job["task_id"] = response.json()["task_id"]
+
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        status = (await client.get(f"/api/status/{job['task_id']}")).json()
+        if status["status"] not in NON_TERMINAL_STATUSES:
+            job.update(status=status["status"], latency_s=time.perf_counter() - started,
+                       error=status.get("error"), unique_tracks=status.get("unique_tracks"),
+                       outputs=[status.get("json_output"), status.get("txt_output")])
+            return
+    job.update(status="timeout", latency_s=timeout)
+
+
+def prepare_uploads(count: int, minutes: float) -> List[Path]:
+    """Distinct synthetic sets (distinct bytes, so they don't coalesce), cached across runs."""
+    import soundfile as sf
+
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = WORK_DIR / f"upload_{minutes:g}min_{i:03d}.mp3"
+        if not path.exists():
+            logger.info(f"Generating {path.name}")
+            sf.write(str(path), synthetic_set(minutes, seed=1000 + i), ANALYSIS_SR, format="MP3")
+        paths.append(path)
+    return paths
+
+
+async def run(args) -> Dict:
+    import httpx
+    from src.fake_shazam import FakeShazamConfig, start
+
+    uploads = prepare_uploads(args.uploads, args.audio_minutes)
+    run_id = uuid.uuid4().hex[:8]
+    urls = [f"https://www.youtube.com/watch?v=lt{run_id}{0 if args.same_url else i:03d}"
+            for i in range(args.urls)]
+
+    shazam_config = FakeShazamConfig(
+        latency_ms=args.shazam_latency_ms, jitter_ms=args.shazam_jitter_ms,
+        error_rate=args.shazam_error_rate, rate_limit=args.shazam_rate_limit,
+    )
+    shazam, shazam_url = await start(shazam_config)
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(BASE_DIR),
+        "SENTRY_DSN": "",
+        "SHAZAM_BASE_URL": shazam_url,
+        "SHAZAM_RATE_LIMIT": str(args.client_rate),
+        "SHAZAM_RATE_BURST": str(max(1, args.client_rate)),
+        "YTDLP_COMMAND": f"{shlex.quote(sys.executable)} -m src.fake_ytdlp",
+        "FAKE_YTDLP_SECONDS": str(args.download_seconds),
+        "FAKE_YTDLP_AUDIO_MINUTES": str(args.audio_minutes),
+        "FAKE_YTDLP_FAIL_RATE": str(args.ytdlp_fail_rate),
+    }
+    # A fresh index, so every run exercises Shazam the same way.
+    index = WORK_DIR / f"fingerprints-{run_id}.sqlite"
+    env["FINGERPRINT_INDEX_PATH"] = str(index)
+    if args.memory_budget_mb:
+        env["MEMORY_BUDGET_MB"] = str(args.memory_budget_mb)
+    if args.feature_workers:
+        env["FEATURE_WORKERS"] = str(args.feature_workers)
+    server = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "src.web:app", "--host", "127.0.0.1",
+        "--port", str(port), "--log-level", "warning", cwd=str(BASE_DIR), env=env,
+    )
+    sampler = RSSSampler(server.pid)
+    sampler.start()
+    jobs: List[Dict] = []
+    api_latency: Dict[str, List[float]] = {"health": [], "status": [], "recent": []}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            await _wait_ready(client, server, timeout=180)
+            stop = asyncio.Event()
+            probes = [
+                asyncio.create_task(_probe(client, "/api/health", api_latency["health"], stop)),
+                asyncio.create_task(_probe(client, "/api/status/loadtest-missing", api_latency["status"], stop)),
+                asyncio.create_task(_probe(client, "/api/recent", api_latency["recent"], stop)),
+            ]
+            started = time.perf_counter()
+            work = [("upload", path) for path in uploads] + [("url", url) for url in urls]
+            jobs = [{"kind": kind, "source": str(payload)} for kind, payload in work]
+            await asyncio.gather(*(
+                _run_job(client, kind, payload, job, args.timeout)
+                for (kind, payload), job in zip(work, jobs)
+            ))
+            wall = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*probes)
+            shazam_stats = dict(shazam.app["stats"])
+    finally:
+        memory = sampler.stop()
+        if server.returncode is None:
+            server.send_signal(signal.SIGTERM)  # graceful: flushes the task store
+            try:
+                await asyncio.wait_for(server.wait(), 30)
+            except asyncio.TimeoutError:
+                server.kill()
+        await shazam.cleanup()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{index}{suffix}").unlink(missing_ok=True)
+
+    if not args.keep_outputs:
+        for job in jobs:
+            for output in job.pop("outputs", None) or []:
+                if output:
+                    Path(output).unlink(missing_ok=True)
+
+    statuses: Dict[str, int] = {}
+    for job in jobs:
+        statuses[job.get("status", "unknown")] = statuses.get(job.get("status", "unknown"), 0) + 1
+    completed = [job["latency_s"] for job in jobs if job.get("status") == "completed"]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "report"},
+        "wall_s": round(wall, 2),
+        "jobs": {
+            "statuses": statuses,
+            "latency_s": summarize(completed),
+            "latency_s_by_kind": {
+                kind: summarize([j["latency_s"] for j in jobs
+                                 if j["kind"] == kind and j.get("status") == "completed"])
+                for kind in ("upload", "url")
+            },
+            "submit_s": summarize([j["submit_s"] for j in jobs if "submit_s" in j]),
+            "throughput_jobs_per_min": round(60 * len(completed) / wall, 2) if wall else None,
+        },
+        "api_latency_s": {path: summarize(values) for path, values in api_latency.items()},
+        "memory": memory,
+        "shazam": shazam_stats,
+        "job_details": jobs,
+    }
+
+
+def _print_report(report: Dict) -> None:
+    def row(name, stats, scale=1.0, unit="s"):
+        if not stats["count"]:
+            print(f"  {name:<22} (no samples)")
+            return
+        cells = "  ".join(f"{k}={stats[k] * scale:8.3f}{unit}" for k in ("p50", "p95", "p99", "max"))
+        print(f"  {name:<22} n={stats['count']:<5} {cells}")
+
+    jobs = report["jobs"]
+    print(f"\nLoad test: {sum(jobs['statuses'].values())} jobs in {report['wall_s']} s {jobs['statuses']}")
+    print("Job latency (submit -> terminal):")
+    row("all completed", jobs["latency_s"])
+    for kind, stats in jobs["latency_s_by_kind"].items():
+        row(kind, stats)
+    row("submit request", jobs["submit_s"], 1000, "ms")
+    print("API latency under load:")
+    for path, stats in report["api_latency_s"].items():
+        row(path, stats, 1000, "ms")
+    print(f"Peak RSS: server {report['memory']['server_peak_mb']} MB, "
+          f"with children {report['memory']['process_tree_peak_mb']} MB")
+    print(f"Fake Shazam: {report['shazam']}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per poll otherwise
+    parser = argparse.ArgumentParser(description="Load-test the web app against local Shazam/yt-dlp fakes")
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent file uploads")
+    parser.add_argument("--urls", type=int, default=4, help="Concurrent URL jobs")
+    parser.add_argument("--same-url", action="store_true",
+                        help="Submit one URL for every URL job (exercises coalescing)")
+    parser.add_argument("--audio-minutes", type=float, default=6, help="Length of each synthetic set")
+    parser.add_argument("--download-seconds", type=float, default=2, help="Simulated yt-dlp download time")
+    parser.add_argument("--ytdlp-fail-rate", type=float, default=0.0)
+    parser.add_argument("--shazam-latency-ms", type=float, default=300)
+    parser.add_argument("--shazam-jitter-ms", type=float, default=150)
+    parser.add_argument("--shazam-error-rate", type=float, default=0.0, help="Fraction of 503s")
+    parser.add_argument("--shazam-rate-limit", type=float, default=0.0,
+                        help="Upstream req/s before 429s (0 = unlimited)")
+    parser.add_argument("--client-rate", type=float, default=5.0,
+                        help="App-side SHAZAM_RATE_LIMIT for the run")
+    parser.add_argument("--memory-budget-mb", type=int, help="MEMORY_BUDGET_MB for the server")
+    parser.add_argument("--feature-workers", type=int, help="FEATURE_WORKERS for the server")
+    parser.add_argument("--timeout", type=float, default=1800, help="Per-job timeout in seconds")
+    parser.add_argument("--keep-outputs", action="store_true", help="Keep the jobs' tracklists in outputs/")
+    parser.add_argument("--report", help="JSON report path (default: tmp/loadtest/report-<time>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    _print_report(report)
+    path = Path(args.report) if args.report else WORK_DIR / f"report-{time.strftime('%Y%m%d_%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    print(f"\nReport: {path}")
+
+
+if __name__ == "__main__":
+    main()
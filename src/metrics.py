@@ -0,0 +1,248 @@
+"""Minimal Prometheus-style metrics for the analysis pipeline and web app.
+
+Dependency-free on purpose: counters, gauges and histograms rendered in the
+Prometheus text exposition format (v0.0.4) on `GET /metrics`. Good enough
+for scraping and for eyeballing capacity against the 6G / 2-CPU limits.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Pipeline stages range from ~100 ms (one recognition) to 10+ min (decoding
+# a multi-hour set), so the buckets span four orders of magnitude.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(6, 14))  # 64MB .. 8GB
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        counts = self._counts.get(self._key(labels))
+        return counts[-1] if counts else 0
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "shazamer_stage_seconds",
+    "Wall time of analysis pipeline stages.",
+    ["stage"],
+))
+RECOGNITIONS = REGISTRY.register(Counter(
+    "shazamer_recognitions_total",
+    "Recognition outcomes per segment (match, local_match, reused, no_match, error).",
+    ["result"],
+))
+TASKS = REGISTRY.register(Gauge(
+    "shazamer_tasks",
+    "Analysis tasks currently tracked by the web app, by state.",
+    ["state"],
+))
+JOB_PEAK_RSS = REGISTRY.register(Histogram(
+    "shazamer_job_peak_rss_bytes",
+    "Peak resident set size of the process observed during each analysis job.",
+    buckets=BYTES_BUCKETS,
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "shazamer_cache_requests_total",
+    "Cache lookups by cache name and result (hit, miss).",
+    ["cache", "result"],
+))
+TRANSFER_BYTES = REGISTRY.register(Counter(
+    "shazamer_transfer_bytes_total",
+    "Audio bytes received, by direction (upload, download).",
+    ["direction"],
+))
+
+STORAGE_BYTES = REGISTRY.register(Gauge(
+    "shazamer_storage_bytes",
+    "Bytes used by each storage area at the last sweep.",
+    ["area"],
+))
+STORAGE_EVICTED_BYTES = REGISTRY.register(Counter(
+    "shazamer_storage_evicted_bytes_total",
+    "Bytes deleted by the storage manager, by area and reason (age, budget, disk_full).",
+    ["area", "reason"],
+))
+DISK_FREE_BYTES = REGISTRY.register(Gauge(
+    "shazamer_disk_free_bytes",
+    "Free bytes on the filesystem of each storage area at the last sweep.",
+    ["area"],
+))
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size of this process (0 if it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is a high-water mark (KB on Linux, bytes on macOS); the
+        # best we can do where /proc isn't available.
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname().sysname == "Darwin" else rss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class PeakRSSSampler:
+    """Samples process RSS in the background while a job runs.
+
+    RSS is process-wide, so with concurrent jobs this is the peak the process
+    hit *while* the job ran — exactly what matters against the container limit.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, current_rss_bytes())
+            await asyncio.sleep(self.interval)
+
+    async def __aenter__(self) -> "PeakRSSSampler":
+        self.peak = current_rss_bytes()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._task.cancel()
+        self.peak = max(self.peak, current_rss_bytes())
+        JOB_PEAK_RSS.observe(self.peak)
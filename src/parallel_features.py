@@ -0,0 +1,137 @@
+"""Chunked, multi-process extraction of the detection features.
+
+Spectral centroid and RMS are per-frame quantities: frame `t` only reads
+samples `[t*hop - n_fft/2, t*hop + n_fft/2)` (librosa centers frames and
+zero-pads the ends). So the signal can be cut into chunks of whole frames,
+each extended by a halo of `max(n_fft)/2` real samples on both sides,
+computed independently, and the halo frames dropped. Every kept frame sees
+exactly the samples it would see in the serial pass, and frames at the true
+start/end still get librosa's zero padding, so the stitched arrays match
+the serial ones.
+
+Workers are spawned (not forked: the web app calls this from an executor
+thread next to the event loop) and only import librosa when they start.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HOP_LENGTH = 512
+CENTROID_N_FFT = 1024
+RMS_FRAME_LENGTH = 2048
+# Samples of context each chunk needs on either side. A multiple of the hop,
+# so chunk-local frame indices stay aligned with global ones.
+HALO = max(CENTROID_N_FFT, RMS_FRAME_LENGTH) // 2
+# 5 min at 22050 Hz: ~300 MB STFT per worker, and enough chunks to keep
+# several cores busy on an hour-long set.
+CHUNK_SECONDS = 300
+# How often a running pool polls for cancellation.
+_CHECK_INTERVAL = 0.5
+
+ChunkPlan = Tuple[int, int, int, int]
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def frame_features(y: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Spectral centroid and RMS per frame, exactly as the serial path computes them."""
+    import librosa
+
+    centroid = librosa.feature.spectral_centroid(
+        y=y, sr=sr, n_fft=CENTROID_N_FFT, hop_length=HOP_LENGTH
+    )[0]
+    rms = librosa.feature.rms(y=y, frame_length=RMS_FRAME_LENGTH, hop_length=HOP_LENGTH)[0]
+    return centroid, rms
+
+
+def plan_chunks(n_samples: int, chunk_frames: int) -> List[ChunkPlan]:
+    """(start, end, skip, count) per chunk: compute on y[start:end], keep frames [skip, skip+count)."""
+    total_frames = 1 + n_samples // HOP_LENGTH
+    plan = []
+    for f0 in range(0, total_frames, chunk_frames):
+        f1 = min(f0 + chunk_frames, total_frames)
+        start = max(0, f0 * HOP_LENGTH - HALO)
+        end = min(n_samples, f1 * HOP_LENGTH + HALO)
+        plan.append((start, end, f0 - start // HOP_LENGTH, f1 - f0))
+    return plan
+
+
+def frame_range_features(y: np.ndarray, sr: int, f0: int, f1: int) -> Tuple[np.ndarray, np.ndarray]:
+    """`frame_features` for global frames [f0, f1) only, computed on just the samples they need."""
+    start = max(0, f0 * HOP_LENGTH - HALO)
+    end = min(len(y), f1 * HOP_LENGTH + HALO)
+    return _chunk_features(y[start:end], sr, f0 - start // HOP_LENGTH, f1 - f0)
+
+
+def _chunk_features(y: np.ndarray, sr: int, skip: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    centroid, rms = frame_features(y, sr)
+    return centroid[skip:skip + count], rms[skip:skip + count]
+
+
+def _start_worker(pids, cancelled) -> None:
+    """Worker initializer: tell the parent which process to kill on cancel,
+    and exit at once if that already happened while this one was starting."""
+    pids.put(os.getpid())
+    if cancelled.is_set():
+        os._exit(1)
+
+
+def _terminate(pool: ProcessPoolExecutor, pids, cancelled) -> None:
+    """Kill the workers now instead of letting them finish their chunks."""
+    # ProcessPoolExecutor has no public way to do this before Python 3.14
+    # (terminate_workers), so the workers report their PIDs as they start.
+    cancelled.set()
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parallel_frame_features(y: np.ndarray, sr: int, workers: int,
+                            chunk_seconds: float = CHUNK_SECONDS,
+                            check: Optional[Callable[[], None]] = None,
+                            ) -> Tuple[np.ndarray, np.ndarray]:
+    """`frame_features` over overlapping chunks in a pool of `workers` processes.
+
+    `check` is polled while waiting; if it raises, the workers are killed
+    and the exception propagates.
+    """
+    chunk_frames = max(1, int(chunk_seconds * sr) // HOP_LENGTH)
+    plan = plan_chunks(len(y), chunk_frames)
+    logger.info(f"Extracting features in {len(plan)} chunks on {workers} processes")
+    ctx = multiprocessing.get_context("spawn")
+    pids, cancelled = ctx.SimpleQueue(), ctx.Event()
+    with ProcessPoolExecutor(max_workers=min(workers, len(plan)), mp_context=ctx,
+                             initializer=_start_worker, initargs=(pids, cancelled)) as pool:
+        try:
+            # Arguments are views; each is only copied when handed to a worker.
+            futures = [
+                pool.submit(_chunk_features, y[start:end], sr, skip, count)
+                for start, end, skip, count in plan
+            ]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=_CHECK_INTERVAL)
+                if check is not None:
+                    check()
+            parts = [future.result() for future in futures]
+        except BaseException:
+            _terminate(pool, pids, cancelled)
+            raise
+    centroid = np.concatenate([c for c, _ in parts])
+    rms = np.concatenate([r for _, r in parts])
+    return centroid, rms
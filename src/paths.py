@@ -0,0 +1,24 @@
+"""Where the app keeps its files, whatever the working directory.
+
+BASE_DIR is the project root. Configured paths (FEATURE_CACHE_DIR,
+FINGERPRINT_INDEX_PATH) are resolved against it when relative. Defined
+here, not in the modules that use them, so that the web app and the disk
+budgets (src/storage_manager.py) can refer to them without importing numpy.
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def app_path(value: str) -> Optional[Path]:
+    """`value` resolved against BASE_DIR; None when empty (disabled)."""
+    return BASE_DIR / value if value else None
+
+
+# Transition curves (src/feature_tracks.py) and the local fingerprint index
+# (src/fingerprint_index.py).
+FEATURE_CACHE_DIR = app_path(os.environ.get("FEATURE_CACHE_DIR", "tmp/feature_tracks"))
+FINGERPRINT_INDEX_PATH = app_path(os.environ.get("FINGERPRINT_INDEX_PATH",
+                                                 "tmp/fingerprints.sqlite"))
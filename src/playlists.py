@@ -0,0 +1,96 @@
+"""Expand playlist, channel and batch submissions into single-set URLs.
+
+yt-dlp's flat playlist mode (`--flat-playlist -J`) lists a playlist's
+entries from its metadata alone, without resolving or downloading any of
+them, so even a season of a radio show expands in a few seconds. A URL
+that is already a single video comes back as itself. Entries are
+de-duplicated by canonical URL (src/single_flight.py) and capped at
+MAX_BATCH_ENTRIES.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Sequence, Tuple
+
+from src.single_flight import canonical_url
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ENTRIES = int(os.environ.get("MAX_BATCH_ENTRIES", "200"))
+EXPAND_TIMEOUT_SECONDS = 120.0
+# Metadata requests run at once while expanding a batch.
+EXPAND_CONCURRENCY = 4
+
+
+def entries_from_info(info: Dict, source_url: str) -> List[Dict[str, str]]:
+    """{url, title} of every video in yt-dlp's -J output, nested playlists
+    (a channel's tabs) included."""
+    if info.get("_type") not in ("playlist", "multi_video"):
+        return [{"url": info.get("webpage_url") or source_url,
+                 "title": info.get("title") or source_url}]
+    entries = []
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue  # unavailable / private entries are listed as null
+        if entry.get("_type") in ("playlist", "multi_video"):
+            entries.extend(entries_from_info(entry, source_url))
+            continue
+        url = entry.get("webpage_url") or entry.get("url")
+        if not url:
+            continue
+        entries.append({"url": url, "title": entry.get("title") or url})
+    return entries
+
+
+async def expand_url(ytdlp_command: Sequence[str], url: str,
+                     timeout: float = EXPAND_TIMEOUT_SECONDS) -> List[Dict[str, str]]:
+    """Entries of one submitted URL. Raises on yt-dlp errors and timeouts."""
+    process = await asyncio.create_subprocess_exec(
+        *ytdlp_command, "--flat-playlist", "-J", "--no-warnings", url,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        lines = stderr.decode(errors="replace").strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"yt-dlp exited with {process.returncode}")
+    return entries_from_info(json.loads(stdout), url)
+
+
+async def expand_urls(ytdlp_command: Sequence[str], urls: Sequence[str],
+                      limit: int = MAX_BATCH_ENTRIES
+                      ) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """(entries, {url: error}) of a batch, in submission order.
+
+    A URL whose metadata can't be read is kept as a single entry: its
+    download then fails (or succeeds) with its own error, like a single
+    submission would.
+    """
+    semaphore = asyncio.Semaphore(EXPAND_CONCURRENCY)
+
+    async def expand(url: str):
+        async with semaphore:
+            try:
+                return await expand_url(ytdlp_command, url), None
+            except Exception as exc:
+                logger.warning("Could not expand %s: %s", url, exc)
+                return [{"url": url, "title": url}], str(exc)
+
+    results = await asyncio.gather(*(expand(url) for url in urls))
+
+    entries, errors, seen = [], {}, set()
+    for url, (expanded, error) in zip(urls, results):
+        if error:
+            errors[url] = error
+        for entry in expanded:
+            key = canonical_url(entry["url"])
+            if key not in seen and len(entries) < limit:
+                seen.add(key)
+                entries.append(entry)
+    return entries, errors
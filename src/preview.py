@@ -0,0 +1,48 @@
+"""Segmentation previews: where the detector puts boundaries, before any
+recognition.
+
+A preview decodes the set and runs boundary detection only, and keeps a
+min/max waveform overview (WAVEFORM_BUCKETS buckets, ~30 KB of JSON)
+computed from the decoded samples while they are in memory. The web app
+stores it with the task, so the frontend can draw the set and its
+boundaries at once. Recognition, the slow and rate-limited part, starts
+only once the user confirms. The preview always runs full-resolution
+detection, never the coarse-to-fine cascade, and stores the transition
+curve in the feature cache (src/feature_tracks.py), so after confirming,
+or when re-segmenting the preview, the curve is not computed again.
+"""
+from typing import Dict
+
+import numpy as np
+
+WAVEFORM_BUCKETS = 2000
+
+
+def waveform_overview(audio: np.ndarray, sample_rate: int,
+                      buckets: int = WAVEFORM_BUCKETS) -> Dict:
+    """Min and max sample of each of `buckets` equal slices of `audio`."""
+    n = min(buckets, len(audio))
+    if n == 0:
+        return {"buckets": 0, "seconds_per_bucket": 0.0, "min": [], "max": []}
+    starts = np.linspace(0, len(audio), n + 1).astype(np.int64)[:-1]
+    return {
+        "buckets": n,
+        "seconds_per_bucket": len(audio) / sample_rate / n,
+        "min": np.round(np.minimum.reduceat(audio, starts).astype(np.float64), 3).tolist(),
+        "max": np.round(np.maximum.reduceat(audio, starts).astype(np.float64), 3).tolist(),
+    }
+
+
+def build_preview(analyzer, buckets: int = WAVEFORM_BUCKETS) -> Dict:
+    """Decode and segment `analyzer`'s set (a DJSetAnalyzer). Blocking."""
+    audio_data, sample_rate = analyzer.load_audio()
+    waveform = waveform_overview(audio_data, sample_rate, buckets)
+    boundaries = analyzer.detect_song_boundaries(audio_data, sample_rate)
+    return {
+        "duration": len(audio_data) / sample_rate,
+        "threshold": analyzer.peak_threshold,
+        "min_song_duration": analyzer.min_song_duration,
+        "segments": len(boundaries) - 1,
+        "boundaries": [round(b / sample_rate, 3) for b in boundaries],
+        "waveform": waveform,
+    }
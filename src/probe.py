@@ -0,0 +1,295 @@
+"""Fast, non-blocking audio duration probing.
+
+`pydub.utils.mediainfo` spawns ffprobe and parses its whole output, and the
+web app called it synchronously from inside `analyze_file`, stalling the
+event loop (status polls, uploads) for every user. Most uploads carry their
+duration in the container header, so we read that first (WAV, FLAC, MP3
+Xing/Info/VBRI or CBR, MP4/M4A `mvhd`) and only fall back to ffprobe when
+the header doesn't say. `probe_async` reads the header in the default
+executor and runs ffprobe as an async subprocess. Results are cached by file
+identity (path, inode, size, mtime).
+"""
+import asyncio
+import logging
+import os
+import struct
+import subprocess
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+FileKey = Tuple[str, int, int, int]
+
+_FFPROBE_ARGS = ["-v", "error", "-show_entries", "format=duration",
+                 "-of", "default=noprint_wrappers=1:nokey=1"]
+
+
+# ---------------------------------------------------------------------------
+# Header parsers. Each takes an open binary file and returns seconds or None.
+# ---------------------------------------------------------------------------
+
+def _wav_duration(f: BinaryIO, file_size: int) -> Optional[float]:
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(size)
+            if len(fmt) < 16:
+                return None
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # Streamed WAVs leave the size at 0 or 0xFFFFFFFF.
+            available = file_size - f.tell()
+            if size == 0 or size > available:
+                size = available
+            return size / byte_rate
+        else:
+            f.seek(size + (size % 2), os.SEEK_CUR)
+
+
+def _flac_duration(f: BinaryIO, file_size: int) -> Optional[float]:
+    header = f.read(4 + 4 + 34)
+    if len(header) < 42 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return None  # first metadata block must be STREAMINFO
+    info = int.from_bytes(header[8 + 10:8 + 18], "big")
+    sample_rate = info >> 44
+    total_samples = info & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+_MP3_BITRATES = {
+    # (version_is_mpeg1, layer) -> kbps table indexed by bitrate index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_duration(f: BinaryIO, file_size: int) -> Optional[float]:
+    start = 0
+    head = f.read(10)
+    if head[:3] == b"ID3" and len(head) == 10:
+        size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + size + (10 if head[5] & 0x10 else 0)
+    f.seek(start)
+    buf = f.read(64 * 1024)
+    for i in range(len(buf) - 4):
+        if buf[i] != 0xFF or buf[i + 1] & 0xE0 != 0xE0:
+            continue
+        version_bits = (buf[i + 1] >> 3) & 0x3
+        layer = 4 - ((buf[i + 1] >> 1) & 0x3)
+        bitrate_idx = buf[i + 2] >> 4
+        rate_idx = (buf[i + 2] >> 2) & 0x3
+        if version_bits == 1 or layer == 4 or bitrate_idx in (0, 15) or rate_idx == 3:
+            continue
+        mpeg1 = version_bits == 3
+        sample_rate = _MP3_SAMPLE_RATES[version_bits][rate_idx]
+        bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_idx] * 1000
+        mono = (buf[i + 3] >> 6) == 3
+        if layer == 1:
+            samples_per_frame = 384
+        elif layer == 2 or mpeg1:
+            samples_per_frame = 1152
+        else:
+            samples_per_frame = 576
+
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        xing = i + 4 + side_info
+        if buf[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", buf[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frames = struct.unpack(">I", buf[xing + 8:xing + 12])[0]
+                return frames * samples_per_frame / sample_rate
+        vbri = i + 4 + 32
+        if buf[vbri:vbri + 4] == b"VBRI":
+            frames = struct.unpack(">I", buf[vbri + 14:vbri + 18])[0]
+            return frames * samples_per_frame / sample_rate
+        # No VBR header: assume constant bitrate over the rest of the file.
+        audio_bytes = file_size - (start + i)
+        return audio_bytes * 8 / bitrate
+    return None
+
+
+def _mp4_duration(f: BinaryIO, file_size: int) -> Optional[float]:
+    def boxes(end: int):
+        while f.tell() + 8 <= end:
+            offset = f.tell()
+            size, kind = struct.unpack(">I4s", f.read(8))
+            header = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header = 16
+            elif size == 0:
+                size = end - offset
+            if size < header:
+                return
+            yield kind, offset + header, offset + size
+            f.seek(offset + size)
+
+    first = f.read(8)
+    if len(first) < 8 or first[4:8] != b"ftyp":
+        return None
+    f.seek(0)
+    for kind, body, end in boxes(file_size):
+        if kind != b"moov":
+            continue
+        f.seek(body)
+        for inner, inner_body, _ in boxes(end):
+            if inner != b"mvhd":
+                continue
+            f.seek(inner_body)
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+        return None
+    return None
+
+
+_PARSERS = {
+    ".wav": _wav_duration,
+    ".flac": _flac_duration,
+    ".mp3": _mp3_duration,
+    ".m4a": _mp4_duration,
+    ".mp4": _mp4_duration,
+}
+
+
+def read_header_duration(path: str) -> Optional[float]:
+    """Duration from the container header, or None if it can't be read cheaply."""
+    ext = Path(path).suffix.lower()
+    parsers = [_PARSERS[ext]] if ext in _PARSERS else []
+    # Extensions lie (renamed uploads): also try the parsers that check a
+    # magic number. The MP3 one only scans for a frame sync, so it is tried
+    # on other extensions only when the file starts like an MP3.
+    parsers += [p for p in (_wav_duration, _flac_duration, _mp4_duration) if p not in parsers]
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            magic = f.read(3)
+            if _mp3_duration not in parsers and (
+                magic == b"ID3" or (len(magic) > 1 and magic[0] == 0xFF and magic[1] & 0xE0 == 0xE0)
+            ):
+                parsers.append(_mp3_duration)
+            for parser in parsers:
+                f.seek(0)
+                try:
+                    duration = parser(f, file_size)
+                except (struct.error, IndexError, KeyError, OverflowError):
+                    duration = None
+                if duration and duration > 0:
+                    return duration
+    except OSError as exc:
+        logger.warning("Could not read header of %s: %s", path, exc)
+    return None
+
+
+def _parse_ffprobe(output: bytes) -> float:
+    try:
+        return float(output.decode().strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+class DurationProbe:
+    """Header-first duration probe with an LRU cache keyed by file identity."""
+
+    def __init__(self, max_entries: int = 1024, ffprobe: str = "ffprobe"):
+        self.max_entries = max_entries
+        self.ffprobe = ffprobe
+        self._cache: "OrderedDict[FileKey, float]" = OrderedDict()
+
+    @staticmethod
+    def _key(path: str) -> Optional[FileKey]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.realpath(path), st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _lookup(self, key: Optional[FileKey]) -> Optional[float]:
+        if key is None:
+            return None
+        duration = self._cache.get(key)
+        metrics.cache_lookup("probe", duration is not None)
+        if duration is not None:
+            self._cache.move_to_end(key)
+        return duration
+
+    def _store(self, key: Optional[FileKey], duration: float) -> float:
+        if key is not None and duration:
+            self._cache[key] = duration
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return duration
+
+    def probe(self, path: str) -> float:
+        """Blocking probe, for CLI / executor callers. 0.0 when unknown."""
+        key = self._key(path)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        duration = read_header_duration(path)
+        if duration is None:
+            try:
+                result = subprocess.run([self.ffprobe, *_FFPROBE_ARGS, path],
+                                        capture_output=True, timeout=60)
+                duration = _parse_ffprobe(result.stdout)
+            except (OSError, subprocess.TimeoutExpired) as exc:
+                logger.warning("Could not probe duration for %s: %s", path, exc)
+                duration = 0.0
+        return self._store(key, duration)
+
+    async def probe_async(self, path: str) -> float:
+        """Event-loop friendly probe: header read in an executor thread, else
+        async ffprobe subprocess."""
+        key = self._key(path)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        # Seeks and reads that a slow or network disk can make take a while.
+        duration = await asyncio.get_running_loop().run_in_executor(
+            None, read_header_duration, path)
+        if duration is None:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    self.ffprobe, *_FFPROBE_ARGS, path,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+                )
+                try:
+                    stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=60)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    raise
+                duration = _parse_ffprobe(stdout)
+            except (OSError, asyncio.TimeoutError) as exc:
+                logger.warning("Could not probe duration for %s: %s", path, exc)
+                duration = 0.0
+        return self._store(key, duration)
+
+
+duration_probe = DurationProbe()
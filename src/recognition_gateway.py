@@ -0,0 +1,242 @@
+"""Process-wide gateway for Shazam recognition requests.
+
+Every analyzer used to own its own `Throttler` and `Shazam()` client, so N
+concurrent jobs sent N times the intended request rate upstream and every
+recognition opened a fresh HTTP session. The gateway owns one token bucket
+shared by all callers, hands tokens out round-robin between clients (one
+client per task) so a long job can't starve a short one, and reuses a single
+keep-alive aiohttp session for every request.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from src.recognition_policy import RateLimitedError, RecognitionPolicy, TransientError
+
+logger = logging.getLogger(__name__)
+
+# Requests per second across the whole process. The old per-analyzer
+# `Throttler(rate_limit=0.5)` let one request through per 1s window, so 1.0
+# keeps the upstream rate of a single job and shares it between all jobs.
+DEFAULT_RATE = float(os.environ.get("SHAZAM_RATE_LIMIT", "1.0"))
+DEFAULT_BURST = float(os.environ.get("SHAZAM_RATE_BURST", "1"))
+# Send Shazam requests to another host instead, e.g. the load-test stand-in
+# (src/fake_shazam.py). Empty means the real API.
+SHAZAM_BASE_URL = os.environ.get("SHAZAM_BASE_URL", "")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = rate / 16
+        self.capacity = max(capacity, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 when one is available now)."""
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self) -> bool:
+        """Consume a token if one is available. Returns whether it did."""
+        if self.delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for `seconds` (a server-requested cool-down)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def throttle(self, factor: float = 0.5) -> None:
+        """Multiplicative decrease after upstream pushed back (429)."""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def recover(self, step_fraction: float = 0.05) -> None:
+        """Additive increase back towards the configured rate on success."""
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * step_fraction)
+
+
+class PooledHTTPClient:
+    """shazamio HTTP client reusing one keep-alive session.
+
+    shazamio's stock `HTTPClient` opens (and closes) a new `RetryClient` per
+    request, paying TCP + TLS setup on every recognition, and silently retries
+    429s up to 20 times behind our rate limiter's back. This keeps one session
+    per event loop (recreated if the loop changes: tests, CLI runs in a fresh
+    `asyncio.run`) and surfaces 429/5xx to the recognition policy instead.
+    """
+
+    def __init__(self, limit: int = 8, keepalive_timeout: float = 60.0,
+                 base_url: str = SHAZAM_BASE_URL):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.base_url = base_url
+        self._session = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self):
+        from aiohttp import ClientSession, TCPConnector
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self.limit, keepalive_timeout=self.keepalive_timeout
+                )
+            )
+            self._loop = loop
+        return self._session
+
+    async def request(self, method: str, url: str, *args, **kwargs):
+        from shazamio.exceptions import BadMethod
+        from shazamio.utils import validate_json
+
+        if method.upper() not in ("GET", "POST"):
+            raise BadMethod("Accept only GET/POST")
+        if self.base_url:
+            base = urlsplit(self.base_url)
+            url = urlunsplit(urlsplit(url)._replace(scheme=base.scheme, netloc=base.netloc))
+        session = self._get_session()
+        async with session.request(method.upper(), url, **kwargs) as resp:
+            if resp.status == 429:
+                retry_after = resp.headers.get("Retry-After", "")
+                raise RateLimitedError(float(retry_after) if retry_after.isdigit() else None)
+            if resp.status >= 500:
+                raise TransientError(f"Shazam returned HTTP {resp.status}")
+            return await validate_json(resp, *args)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class RecognitionGateway:
+    """Shared rate limiter + client for all Shazam traffic in the process.
+
+    Callers identify themselves with a `client_id` (the task id in the web
+    app). Waiting clients are served round-robin, one token each, so every
+    active job progresses at `rate / active_jobs` and a single job gets the
+    full rate when it runs alone. Each request runs under a
+    `RecognitionPolicy` (timeout, retries, hedging); 429s slow the shared
+    bucket down for everyone and successes let it recover.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST,
+                 http_client: Any = None, policy: Optional[RecognitionPolicy] = None):
+        self.bucket = TokenBucket(rate, burst)
+        self.policy = policy if policy is not None else RecognitionPolicy.from_env()
+        self.http_client = http_client if http_client is not None else PooledHTTPClient()
+        self._shazam = None
+        self._queues: Dict[str, Deque[asyncio.Future]] = {}
+        self._order: Deque[str] = deque()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def shazam(self):
+        if self._shazam is None:
+            from shazamio import Shazam
+            self._shazam = Shazam(http_client=self.http_client)
+        return self._shazam
+
+    async def acquire(self, client_id: str = "default") -> None:
+        """Wait for this client's fair share of the global rate."""
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is not None and self._dispatcher.get_loop() is not loop:
+            # Previous event loop is gone (CLI rerun, tests): its waiters are dead.
+            self._queues.clear()
+            self._order.clear()
+            self._dispatcher = None
+        fut = loop.create_future()
+        if client_id not in self._queues:
+            self._queues[client_id] = deque()
+            self._order.append(client_id)
+        self._queues[client_id].append(fut)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        await fut
+
+    async def _dispatch(self) -> None:
+        while self._order:
+            client_id = self._order[0]
+            queue = self._queues[client_id]
+            while queue and queue[0].done():
+                queue.popleft()  # waiter was cancelled
+            if not queue:
+                self._order.popleft()
+                del self._queues[client_id]
+                continue
+
+            wait = self.bucket.delay()
+            if wait > 0:
+                # Re-check the queues after sleeping: waiters may have
+                # cancelled or a new client may have joined.
+                await asyncio.sleep(wait)
+                continue
+
+            self.bucket.take()
+            queue.popleft().set_result(None)
+            self._order.rotate(-1)
+
+    async def _attempt(self, data) -> Dict[str, Any]:
+        try:
+            result = await self.shazam.recognize(data)
+        except RateLimitedError as exc:
+            self.bucket.throttle()
+            self.bucket.pause(exc.retry_after or 1 / self.bucket.rate)
+            logger.warning("Shazam rate limit hit, slowing down to %.2f req/s", self.bucket.rate)
+            raise
+        self.bucket.recover()
+        return result
+
+    async def recognize(self, data, client_id: str = "default") -> Dict[str, Any]:
+        """Rate-limited `Shazam.recognize` on a path or audio bytes, under the policy."""
+        return await self.policy.execute(
+            lambda: self._attempt(data), acquire=lambda: self.acquire(client_id)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.bucket.rate,
+            "waiting": {cid: len(q) for cid, q in self._queues.items() if q},
+        }
+
+    async def close(self) -> None:
+        close = getattr(self.http_client, "close", None)
+        if close is not None:
+            await close()
+
+
+_gateway: Optional[RecognitionGateway] = None
+
+
+def get_gateway() -> RecognitionGateway:
+    """Return the process-wide gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        _gateway = RecognitionGateway()
+    return _gateway
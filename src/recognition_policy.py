@@ -0,0 +1,165 @@
+"""Timeout / retry / hedging policy for Shazam recognition requests.
+
+`recognize_segment` used to swallow every exception, so a single transient
+timeout or 429 permanently dropped a track, and one slow response stalled the
+serial recognition loop for its full duration. The policy bounds each attempt
+with a timeout, retries transient failures with full-jitter exponential
+backoff, and optionally fires a hedged duplicate request once an attempt runs
+longer than a latency percentile observed on recent requests.
+"""
+import asyncio
+import logging
+import os
+import random
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RateLimitedError(Exception):
+    """Upstream answered 429. `retry_after` is in seconds when the server said so."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"rate limited (retry after {retry_after}s)" if retry_after else "rate limited")
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """Upstream failure worth retrying (5xx, undecodable body)."""
+
+
+def _retryable_errors() -> tuple:
+    errors = [asyncio.TimeoutError, RateLimitedError, TransientError, ConnectionError]
+    try:
+        import aiohttp
+        errors.append(aiohttp.ClientError)
+    except ImportError:
+        pass
+    try:
+        from shazamio.exceptions import FailedDecodeJson
+        errors.append(FailedDecodeJson)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class LatencyTracker:
+    """Sliding window of recent successful request latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class RecognitionPolicy:
+    def __init__(self, timeout: float = 20.0, max_attempts: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 hedge_percentile: Optional[float] = None,
+                 hedge_min_samples: int = 20):
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self._retryable = _retryable_errors()
+
+    @classmethod
+    def from_env(cls) -> "RecognitionPolicy":
+        hedge = os.environ.get("SHAZAM_HEDGE_PERCENTILE", "").strip()
+        return cls(
+            timeout=float(os.environ.get("SHAZAM_TIMEOUT_SECONDS", "20")),
+            max_attempts=int(os.environ.get("SHAZAM_MAX_ATTEMPTS", "4")),
+            hedge_percentile=float(hedge) if hedge else None,
+        )
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Full-jitter exponential backoff; honours a server Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(error, RateLimitedError) and error.retry_after:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency after which a duplicate request is fired, or None (no hedging)."""
+        if self.hedge_percentile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        return isinstance(error, self._retryable)
+
+    async def _timed(self, attempt: Callable[[], Awaitable[T]], acquire=None) -> T:
+        # Waiting for a rate-limit token is not upstream latency: keep it out
+        # of both the timeout and the latency samples.
+        if acquire is not None:
+            await acquire()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await asyncio.wait_for(attempt(), timeout=self.timeout)
+        self.latency.observe(loop.time() - start)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]], acquire=None) -> T:
+        if acquire is not None:
+            await acquire()
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._timed(attempt))
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            logger.info("Recognition slower than p%g (%.1fs), sending hedged request",
+                        self.hedge_percentile, delay)
+            pending.add(asyncio.ensure_future(self._timed(attempt, acquire)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    if fut.exception() is None:
+                        return fut.result()
+                    error = fut.exception()
+            raise error
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+    async def execute(self, attempt: Callable[[], Awaitable[T]],
+                      acquire: Optional[Callable[[], Awaitable[None]]] = None) -> T:
+        """Run `attempt` (a fresh coroutine per call) under the policy.
+
+        `acquire` is awaited before every attempt, hedges included, so each
+        request upstream is paid for by the rate limiter.
+        """
+        for n in range(self.max_attempts):
+            try:
+                return await self._hedged(attempt, acquire)
+            except Exception as exc:
+                if not self.is_retryable(exc) or n == self.max_attempts - 1:
+                    raise
+                delay = self.backoff(n, exc)
+                logger.warning("Recognition attempt %d/%d failed (%s), retrying in %.1fs",
+                               n + 1, self.max_attempts, exc or type(exc).__name__, delay)
+                await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
@@ -0,0 +1,206 @@
+"""Recognizer backends: what turns a segment's payload into a track.
+
+`DJSetAnalyzer` used to call `shazamio.Shazam.recognize` directly and pick
+fields out of its response dict. It now talks to a backend that returns a
+`Recognition` (or None for "no match"), singly or in batches:
+
+- `ShazamioBackend`: the real thing, through the shared recognition gateway
+  (rate limit, retries, hedging). The default.
+- `RecordingBackend`: wraps another backend and appends every answer to a
+  JSONL file, keyed by a hash of the payload.
+- `ReplayBackend`: answers from such a file, instantly and identically on
+  every run, for offline benchmarks and profiles of full `analyze()` runs.
+- `NullBackend`: never matches (after an optional simulated delay). With the
+  fingerprint index enabled this is "local only" mode.
+
+Specs for `create_backend` / `RECOGNIZER_BACKEND` / `--recognizer`:
+`shazam`, `null`, `record:<path>`, `replay:<path>`.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from src.segment_encoder import EncodedSegment
+
+logger = logging.getLogger(__name__)
+
+RECOGNIZER_BACKEND = os.environ.get("RECOGNIZER_BACKEND", "shazam")
+
+Payload = Union[str, bytes, EncodedSegment]
+
+
+@dataclass
+class Recognition:
+    """One identified track, independent of the service that found it."""
+
+    title: str
+    artist: str
+    url: str = ""
+    # Distinct catalogue candidates the service returned; fewer is more certain.
+    match_count: int = 1
+
+
+def payload_key(audio: Payload) -> str:
+    """Stable key of what a backend was asked to recognize."""
+    if isinstance(audio, EncodedSegment):
+        data = audio.pcm.tobytes()
+    elif isinstance(audio, (bytes, bytearray)):
+        data = bytes(audio)
+    else:
+        data = Path(audio).read_bytes()
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_shazam_response(result: Optional[Dict[str, Any]]) -> Optional[Recognition]:
+    """Recognition from a Shazam discovery response; None when it has no track."""
+    if not result or 'track' not in result:
+        return None
+    # Count unique match IDs: Shazam repeats some candidates.
+    matches = result.get('matches', [])
+    unique_match_ids = set(match.get('id') for match in matches if match.get('id'))
+    return Recognition(
+        title=result['track'].get('title', 'Unknown'),
+        artist=result['track'].get('subtitle', 'Unknown'),
+        url=result['track'].get('url', ''),
+        match_count=len(unique_match_ids),
+    )
+
+
+class RecognizerBackend:
+    """Base class. Subclasses implement `recognize`; errors propagate to the caller."""
+
+    name = "base"
+
+    async def recognize(self, audio: Payload, client_id: str = "default") -> Optional[Recognition]:
+        raise NotImplementedError
+
+    async def recognize_batch(self, payloads: Sequence[Payload],
+                              client_id: str = "default") -> List[Union[Recognition, None, Exception]]:
+        """One result per payload, in order; a failed call yields its exception."""
+        return list(await asyncio.gather(
+            *(self.recognize(audio, client_id) for audio in payloads), return_exceptions=True
+        ))
+
+    async def close(self) -> None:
+        pass
+
+
+class ShazamioBackend(RecognizerBackend):
+    name = "shazam"
+
+    def __init__(self, gateway=None, debug: bool = False):
+        if gateway is None:
+            from src.recognition_gateway import get_gateway
+            gateway = get_gateway()
+        self.gateway = gateway
+        self.debug = debug
+
+    async def recognize(self, audio: Payload, client_id: str = "default") -> Optional[Recognition]:
+        if isinstance(audio, EncodedSegment):
+            audio = audio.wav
+        result = await self.gateway.recognize(audio, client_id=client_id)
+        if self.debug and result:
+            logger.debug(f"Full Shazam response: {json.dumps(result, indent=2)}")
+            match_ids = [m.get('id') for m in result.get('matches', []) if m.get('id')]
+            logger.debug(f"Match analysis: {len(match_ids)} total matches, "
+                         f"{len(set(match_ids))} unique IDs")
+        return parse_shazam_response(result)
+
+
+class NullBackend(RecognizerBackend):
+    name = "null"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def recognize(self, audio: Payload, client_id: str = "default") -> Optional[Recognition]:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return None
+
+
+class RecordingBackend(RecognizerBackend):
+    """Pass-through that appends `{"key", "recognition"}` lines to `path`."""
+
+    name = "record"
+
+    def __init__(self, inner: RecognizerBackend, path: Union[str, Path]):
+        self.inner = inner
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.recorded = 0
+
+    async def recognize(self, audio: Payload, client_id: str = "default") -> Optional[Recognition]:
+        recognition = await self.inner.recognize(audio, client_id)
+        # Failures raise before this point and are not recorded: replaying
+        # them would freeze a transient error into every future run.
+        line = json.dumps({
+            "key": payload_key(audio),
+            "recognition": asdict(recognition) if recognition else None,
+        })
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+        self.recorded += 1
+        return recognition
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+
+class ReplayMiss(LookupError):
+    """A replayed run asked for a payload the recording doesn't have."""
+
+
+class ReplayBackend(RecognizerBackend):
+    """Answers from a recording. Payloads that weren't recorded are misses:
+    no match, or `ReplayMiss` when `strict` (e.g. segmentation changed)."""
+
+    name = "replay"
+
+    def __init__(self, path: Union[str, Path], strict: bool = False):
+        self.path = Path(path)
+        self.strict = strict
+        self.misses = 0
+        self._answers: Dict[str, Optional[Recognition]] = {}
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    answer = entry["recognition"]
+                    self._answers[entry["key"]] = Recognition(**answer) if answer else None
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    async def recognize(self, audio: Payload, client_id: str = "default") -> Optional[Recognition]:
+        key = payload_key(audio)
+        if key in self._answers:
+            return self._answers[key]
+        self.misses += 1
+        if self.strict:
+            raise ReplayMiss(f"No recorded answer for payload {key[:12]}")
+        return None
+
+
+def create_backend(spec: str = RECOGNIZER_BACKEND, gateway=None,
+                   debug: bool = False) -> RecognizerBackend:
+    """Backend from a spec string: shazam, null, record:<path>, replay:<path>."""
+    kind, _, path = spec.partition(":")
+    if kind == "shazam":
+        return ShazamioBackend(gateway, debug=debug)
+    if kind == "null":
+        return NullBackend()
+    if kind in ("record", "replay") and not path:
+        raise ValueError(f"Recognizer backend '{kind}' needs a path: {kind}:<file.jsonl>")
+    if kind == "record":
+        return RecordingBackend(ShazamioBackend(gateway, debug=debug), path)
+    if kind == "replay":
+        return ReplayBackend(path)
+    raise ValueError(f"Unknown recognizer backend: {spec!r}")
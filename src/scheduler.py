@@ -0,0 +1,154 @@
+"""Wait-queue order for jobs: fair share between clients, short jobs first.
+
+Admission (src/admission.py) and the download pool (src/download_pool.py)
+used to start waiting jobs in FIFO order, so one user's 2h URL job, or a
+batch of fifty, held up everyone else's 20-minute upload. Their wait
+queues now ask a FairScheduler which job goes next:
+
+- Fair share: the next job belongs to the waiting client (API key or IP)
+  with the fewest jobs running, then alternates between clients, so a
+  client's batch doesn't monopolise the slots.
+- Shortest expected job first, within a client and to break ties between
+  clients: the expected run time comes from the probed duration.
+- Aging: every second a job waits takes SCHEDULER_AGING seconds off its
+  expected run time for ordering, so a long job still gets its turn while
+  short ones keep arriving.
+
+The scheduler also learns how long a unit of cost (a second of audio, a
+download) takes from the jobs that finish, which gives waiting jobs a
+rough ETA.
+"""
+import asyncio
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds of expected run time forgiven per second waited.
+SCHEDULER_AGING = float(os.environ.get("SCHEDULER_AGING", "4"))
+# Weight of the latest finished job in the seconds-per-unit average.
+_EWMA_WEIGHT = 0.2
+
+DEFAULT_CLIENT = "anonymous"
+
+
+@dataclass
+class Waiter:
+    task_id: str
+    client: str
+    cost: float
+    fut: asyncio.Future
+    enqueued: float
+    seq: int
+    payload: Any = None
+
+
+@dataclass
+class _Running:
+    client: str
+    cost: float
+    started: float = 0.0
+
+
+class FairScheduler:
+    def __init__(self, seconds_per_unit: float, aging: float = SCHEDULER_AGING,
+                 clock: Callable[[], float] = time.monotonic):
+        # Expected seconds per unit of cost, refined as jobs finish.
+        self.seconds_per_unit = seconds_per_unit
+        self.aging = aging
+        self._clock = clock
+        self._seq = itertools.count()
+        self._waiting: Dict[str, Waiter] = {}
+        self._running: Dict[str, _Running] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def add(self, task_id: str, client: str, cost: float, payload: Any = None) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting[task_id] = Waiter(task_id, client, cost, fut, self._clock(),
+                                        next(self._seq), payload)
+        return fut
+
+    def discard(self, task_id: str) -> None:
+        self._waiting.pop(task_id, None)
+
+    def expected_seconds(self, cost: float) -> float:
+        return cost * self.seconds_per_unit
+
+    def _priority(self, waiter: Waiter, now: float):
+        waited = now - waiter.enqueued
+        return (self.expected_seconds(waiter.cost) - self.aging * waited, waiter.seq)
+
+    def order(self) -> List[Waiter]:
+        """Waiting jobs in the order they would start if nothing else arrived."""
+        now = self._clock()
+        per_client: Dict[str, List[Waiter]] = {}
+        for waiter in self._waiting.values():
+            if not waiter.fut.done():
+                per_client.setdefault(waiter.client, []).append(waiter)
+        for waiters in per_client.values():
+            waiters.sort(key=lambda w: self._priority(w, now))
+        share = {client: 0 for client in per_client}
+        for job in self._running.values():
+            if job.client in share:
+                share[job.client] += 1
+
+        ordered = []
+        while per_client:
+            client = min(per_client, key=lambda c: (share[c], self._priority(per_client[c][0], now)))
+            ordered.append(per_client[client].pop(0))
+            share[client] += 1
+            if not per_client[client]:
+                del per_client[client]
+        return ordered
+
+    def peek(self) -> Optional[Waiter]:
+        """The job that should start next, dropping cancelled waiters."""
+        for task_id in [t for t, w in self._waiting.items() if w.fut.done()]:
+            del self._waiting[task_id]
+        ordered = self.order()
+        return ordered[0] if ordered else None
+
+    def start(self, task_id: str, client: str = DEFAULT_CLIENT, cost: float = 0.0) -> None:
+        waiter = self._waiting.pop(task_id, None)
+        if waiter is not None:
+            client, cost = waiter.client, waiter.cost
+        self._running[task_id] = _Running(client, cost, self._clock())
+
+    def finish(self, task_id: str, observe: bool = True) -> None:
+        """Mark a running job done; `observe` feeds its run time into the
+        seconds-per-unit estimate."""
+        job = self._running.pop(task_id, None)
+        if job is None or job.cost <= 0 or not observe:
+            return
+        observed = (self._clock() - job.started) / job.cost
+        self.seconds_per_unit += _EWMA_WEIGHT * (observed - self.seconds_per_unit)
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position in the wait queue, or None when not waiting."""
+        if task_id not in self._waiting:
+            return None
+        for i, waiter in enumerate(self.order(), start=1):
+            if waiter.task_id == task_id:
+                return i
+        return None
+
+    def eta(self, task_id: str, slots: int) -> Optional[float]:
+        """Rough seconds until `task_id` starts: the work left on the running
+        jobs and the jobs ahead of it, spread over `slots` parallel slots."""
+        if task_id not in self._waiting:
+            return None
+        now = self._clock()
+        work = sum(max(0.0, self.expected_seconds(job.cost) - (now - job.started))
+                   for job in self._running.values())
+        for waiter in self.order():
+            if waiter.task_id == task_id:
+                return work / max(1, slots)
+            work += self.expected_seconds(waiter.cost)
+        return None
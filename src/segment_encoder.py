@@ -0,0 +1,78 @@
+"""Compact recognition payloads: 16 kHz int16 mono WAV, encoded once per segment.
+
+Segments used to be written as float WAVs at the 22050 Hz analysis rate,
+~2.75x the bytes of what the recognizer consumes, and shazamio then decoded
+and resampled every file again before fingerprinting. Here each segment is
+resampled straight from the decoded float stream to 16 kHz int16 PCM in
+memory, and the same buffer is handed to every retry/hedge of the request.
+
+shazamio's recognizer only fingerprints a centered window of the audio it is
+given (10 s by default), so only a centered window around that is encoded;
+the fingerprinted samples are the same as for the whole segment.
+"""
+import io
+from dataclasses import dataclass, field
+from math import gcd
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+RECOGNITION_SR = 16000
+# Comfortably larger than the recognizer's centered window, so what it
+# fingerprints doesn't depend on its exact length or rounding.
+RECOGNITION_WINDOW_SECONDS = 30
+
+
+def centered_window(start_sample: int, end_sample: int, sample_rate: int,
+                    window_seconds: Optional[float] = RECOGNITION_WINDOW_SECONDS):
+    """(start, end) of the centered `window_seconds` of a segment; whole if shorter."""
+    if window_seconds is None:
+        return start_sample, end_sample
+    window = int(window_seconds * sample_rate)
+    if end_sample - start_sample <= window:
+        return start_sample, end_sample
+    start = start_sample + (end_sample - start_sample - window) // 2
+    return start, start + window
+
+
+def to_pcm16(audio: np.ndarray, sample_rate: int,
+             target_sr: int = RECOGNITION_SR) -> np.ndarray:
+    """Band-limited resample of float audio to `target_sr`, as int16."""
+    if sample_rate != target_sr:
+        g = gcd(sample_rate, target_sr)
+        audio = resample_poly(audio, target_sr // g, sample_rate // g)
+    pcm = np.clip(audio, -1.0, 1.0) * 32767.0
+    return np.rint(pcm).astype(np.int16)
+
+
+@dataclass
+class EncodedSegment:
+    """One segment's recognition payload. `wav` is built once and reused."""
+
+    index: int
+    start_time: float
+    pcm: np.ndarray
+    sample_rate: int = RECOGNITION_SR
+    _wav: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / self.sample_rate
+
+    @property
+    def wav(self) -> bytes:
+        if self._wav is None:
+            buf = io.BytesIO()
+            sf.write(buf, self.pcm, self.sample_rate, format="WAV", subtype="PCM_16")
+            self._wav = buf.getvalue()
+        return self._wav
+
+
+def encode_segment(audio: np.ndarray, sample_rate: int, start_sample: int,
+                   end_sample: int, index: int = 0,
+                   window_seconds: Optional[float] = RECOGNITION_WINDOW_SECONDS) -> EncodedSegment:
+    start, end = centered_window(start_sample, end_sample, sample_rate, window_seconds)
+    pcm = to_pcm16(audio[start:end], sample_rate)
+    return EncodedSegment(index=index, start_time=start_sample / sample_rate, pcm=pcm)
@@ -2,30 +2,115 @@
 import asyncio
 import argparse
 import json
+import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Any, Awaitable, Callable, List, Dict, Tuple, Optional, Union
+import contextvars
+import functools
+import threading
 import numpy as np
 import librosa
-import soundfile as sf
-from scipy.signal import find_peaks
+from scipy.ndimage import gaussian_filter1d
 from pydub import AudioSegment
-from shazamio import Shazam
-from asyncio_throttle import Throttler
 import logging
 
+from src import metrics, tracing
+from src.recognition_gateway import RecognitionGateway, get_gateway
+from src.boundary_cascade import COARSE_STRIDE, cascade_peaks
+from src.feature_tracks import (
+    SMOOTHING_SIGMA, FeatureTrack, FeatureTrackCache, auto_min_song_duration,
+    auto_peak_threshold, boundaries_from_peaks, content_hash, get_feature_cache,
+    pick_boundaries, sweep, track_key,
+)
+from src.fingerprint_index import FingerprintIndex, get_fingerprint_index
+from src.recognizer_backends import (
+    RECOGNIZER_BACKEND, RecognizerBackend, ShazamioBackend, create_backend,
+)
+from src.parallel_features import (
+    CENTROID_N_FFT, CHUNK_SECONDS, HOP_LENGTH, RMS_FRAME_LENGTH, available_cpus,
+    parallel_frame_features,
+)
+from src.segment_clustering import CLUSTER_SIMILARITY, cluster_embeddings, embed_segments
+from src.segment_encoder import EncodedSegment, encode_segment
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class AnalysisCancelled(Exception):
+    """Raised at a stage boundary after `DJSetAnalyzer.cancel()`."""
+
+
+# Sets at least this long detect boundaries coarse-to-fine (src/boundary_cascade.py).
+CASCADE_MIN_SECONDS = float(os.environ.get("CASCADE_MIN_SECONDS", "3600"))
+
+# Shazam responses with at most this many distinct matches are "high
+# confidence" and get added to the local fingerprint index.
+CONFIDENT_MATCH_COUNT = 5
+
+
+def format_timestamp(seconds: float) -> str:
+    """hh:mm:ss for tracklists."""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+# Default `fingerprint_index` of DJSetAnalyzer: the process-wide index.
+PROCESS_INDEX: Any = object()
+
+
 class DJSetAnalyzer:
     def __init__(self, input_file: str, min_song_duration: int = None,
-                 peak_threshold: float = None, throttle_rate: float = 0.5,
-                 debug: bool = False, target_sr: int = 22050):
+                 peak_threshold: float = None, throttle_rate: Optional[float] = None,
+                 debug: bool = False, target_sr: int = 22050,
+                 gateway: Optional[RecognitionGateway] = None,
+                 client_id: Optional[str] = None, feature_workers: int = 1,
+                 fingerprint_index: Optional[FingerprintIndex] = PROCESS_INDEX,
+                 cluster_threshold: Optional[float] = CLUSTER_SIMILARITY,
+                 recognizer: Optional[RecognizerBackend] = None,
+                 cascade_min_seconds: Optional[float] = CASCADE_MIN_SECONDS,
+                 feature_cache: Optional[FeatureTrackCache] = None):
         self.input_file = Path(input_file)
-        self.throttler = Throttler(rate_limit=throttle_rate)
-        self.shazam = Shazam()
+        # All analyzers share the process-wide gateway (one rate limit, one
+        # keep-alive session). An explicit throttle_rate (requests/s) opts
+        # into a private gateway instead.
+        if gateway is None:
+            gateway = RecognitionGateway(rate=throttle_rate) if throttle_rate else get_gateway()
+        self.gateway = gateway
+        # What identifies segments (src/recognizer_backends.py): Shazam via
+        # the gateway unless a recording, replay or null backend is given.
+        if recognizer is None:
+            recognizer = ShazamioBackend(gateway, debug=debug)
+        self.recognizer = recognizer
+        self.client_id = client_id or str(self.input_file)
+        # Local index of previously identified tracks, checked before Shazam.
+        # None disables it.
+        if fingerprint_index is PROCESS_INDEX:
+            fingerprint_index = get_fingerprint_index()
+        self.fingerprint_index = fingerprint_index
+        # Start times of segments whose recognition still failed after the
+        # gateway's retries, so callers can report them instead of dropping
+        # them silently.
+        self.failed_segments: List[float] = []
+        self._cancelled = threading.Event()
         self.debug = debug
         self.target_sr = target_sr
+        # >1 extracts detection features in that many processes (long files only)
+        self.feature_workers = feature_workers
+        # Near-duplicate segments share one recognition (None disables)
+        self.cluster_threshold = cluster_threshold
+        # Sets at least this long use the coarse-to-fine detector (None: never)
+        self.cascade_min_seconds = cascade_min_seconds
+        # Transition curves by file content, for instant re-segmentation
+        # (src/feature_tracks.py). None when FEATURE_CACHE_DIR is empty.
+        self.feature_cache = feature_cache if feature_cache is not None else get_feature_cache()
+        self._feature_key: Optional[str] = None
+        # Key of this file's curve once it is in the cache
+        self.feature_track_key: Optional[str] = None
+        # Executor work still running, possibly after its caller was cancelled
+        self._executor_work: set = set()
 
         # Store parameters for later auto-adjustment
         self._min_song_duration_manual = min_song_duration
@@ -33,33 +118,20 @@ class DJSetAnalyzer:
         
     def _auto_adjust_min_duration(self, duration: float) -> int:
         """Auto-adjust minimum song duration based on audio length"""
-        hours = duration / 3600
-        if hours < 1:
-            return 30
-        elif hours < 2:
-            return 45
-        elif hours < 3:
-            return 60
-        else:
-            return 90
+        return auto_min_song_duration(duration)
     
     def _auto_adjust_threshold(self, duration: float) -> float:
         """Auto-adjust peak detection threshold based on audio length"""
-        hours = duration / 3600
-        if hours < 1:
-            return 0.30
-        elif hours < 2:
-            return 0.25
-        elif hours < 3:
-            return 0.20
-        else:
-            return 0.15
+        return auto_peak_threshold(duration)
         
     def load_audio(self) -> Tuple[np.ndarray, int]:
+        self.check_cancelled()
         logger.info(f"Loading audio file: {self.input_file} (target sr={self.target_sr}Hz)")
-        audio_data, sample_rate = librosa.load(
-            str(self.input_file), sr=self.target_sr, mono=True, res_type="soxr_hq"
-        )
+        with tracing.span("audio.decode", str(self.input_file.name)):
+            audio_data, sample_rate = librosa.load(
+                str(self.input_file), sr=self.target_sr, mono=True, res_type="soxr_hq"
+            )
+        self.check_cancelled()
         duration = len(audio_data) / sample_rate
         logger.info(f"Audio loaded. Duration: {duration:.1f} seconds, Sample rate: {sample_rate}Hz")
         
@@ -71,19 +143,66 @@ class DJSetAnalyzer:
         
         return audio_data, sample_rate
     
-    def detect_song_boundaries(self, audio_data: np.ndarray, sample_rate: int) -> List[int]:
-        logger.info("Detecting song boundaries using spectral analysis...")
+    def cancel(self) -> None:
+        """Ask a running analysis to stop at its next stage boundary.
+
+        Safe to call from any thread: work already running in an executor
+        thread can't be interrupted, but it raises AnalysisCancelled as soon
+        as it reaches the next check.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise AnalysisCancelled(f"Analysis of {self.input_file.name} was cancelled")
+
+    def _enter_stage(self, stage: str) -> None:
+        self.check_cancelled()
+        self._on_stage(stage)
 
-        # n_fft=1024 (default 2048) halves the STFT memory footprint. With sr=22050
-        # the upper freq bin is still ~10 kHz which is plenty for centroid-based
-        # transition detection. Saves ~750 MB peak on a 1h+ audio.
-        spectral_centroid = librosa.feature.spectral_centroid(
-            y=audio_data, sr=sample_rate, n_fft=1024, hop_length=512
-        )[0]
+    def _on_stage(self, stage: str) -> None:
+        """Hook called as detection moves through its stages (no-op here).
+
+        Stages: "centroid", "rms", "transitions", "peaks". The web app maps
+        them onto task progress.
+        """
+
+    def extract_features(self, audio_data: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-frame spectral centroid and RMS energy at HOP_LENGTH."""
+        chunk_samples = int(CHUNK_SECONDS * sample_rate)
+        if self.feature_workers > 1 and len(audio_data) > 2 * chunk_samples:
+            self._enter_stage("centroid")
+            with tracing.span("audio.features", "centroid + rms (parallel)",
+                              workers=self.feature_workers):
+                features = parallel_frame_features(audio_data, sample_rate, self.feature_workers,
+                                                   check=self.check_cancelled)
+            self._enter_stage("rms")
+            return features
+
+        self._enter_stage("centroid")
+        with tracing.span("audio.features", "spectral centroid"):
+            # n_fft=1024 (default 2048) halves the STFT memory footprint. With sr=22050
+            # the upper freq bin is still ~10 kHz which is plenty for centroid-based
+            # transition detection. Saves ~750 MB peak on a 1h+ audio.
+            spectral_centroid = librosa.feature.spectral_centroid(
+                y=audio_data, sr=sample_rate, n_fft=CENTROID_N_FFT, hop_length=HOP_LENGTH
+            )[0]
 
         # Calculate RMS energy
-        rms_energy = librosa.feature.rms(y=audio_data, hop_length=512)[0]
-        
+        self._enter_stage("rms")
+        with tracing.span("audio.features", "rms energy"):
+            rms_energy = librosa.feature.rms(
+                y=audio_data, frame_length=RMS_FRAME_LENGTH, hop_length=HOP_LENGTH
+            )[0]
+
+        return spectral_centroid, rms_energy
+
+    def combine_features(self, spectral_centroid: np.ndarray, rms_energy: np.ndarray) -> np.ndarray:
+        """Smoothed transition-strength curve, one value per frame."""
         # Combine features with normalization
         spectral_centroid_norm = (spectral_centroid - np.mean(spectral_centroid)) / np.std(spectral_centroid)
         rms_energy_norm = (rms_energy - np.mean(rms_energy)) / np.std(rms_energy)
@@ -91,151 +210,377 @@ class DJSetAnalyzer:
         # Calculate derivative to find rapid changes
         combined_feature = np.abs(np.gradient(spectral_centroid_norm)) + np.abs(np.gradient(rms_energy_norm))
         
-        # Smooth the signal
-        from scipy.ndimage import gaussian_filter1d
-        combined_feature_smooth = gaussian_filter1d(combined_feature, sigma=10)
-        
-        # Find peaks (potential song boundaries)
-        # Convert threshold (0-1) to percentile (0-100)
-        percentile_threshold = (1 - self.peak_threshold) * 100
-        peaks, properties = find_peaks(combined_feature_smooth, 
-                                     height=np.percentile(combined_feature_smooth, percentile_threshold),
-                                     distance=int(self.min_song_duration * sample_rate / 512))  # 512 is hop_length default
-        
-        # Convert frame indices to sample indices
-        hop_length = 512
-        boundaries = [0]  # Start of audio
-        for peak in peaks:
-            sample_idx = peak * hop_length
-            boundaries.append(sample_idx)
-        boundaries.append(len(audio_data))  # End of audio
-        
-        # Filter out segments that are too short
-        filtered_boundaries = [boundaries[0]]
-        for i in range(1, len(boundaries)):
-            if (boundaries[i] - filtered_boundaries[-1]) / sample_rate >= self.min_song_duration:
-                filtered_boundaries.append(boundaries[i])
-        
-        # Ensure last boundary is included
-        if filtered_boundaries[-1] != boundaries[-1]:
-            filtered_boundaries[-1] = boundaries[-1]
+        # Smooth the signal. Stored as float32 in the feature cache, so peaks
+        # are always picked on the float32 curve: a re-segmentation with the
+        # same parameters reproduces the original boundaries exactly.
+        return gaussian_filter1d(combined_feature, sigma=SMOOTHING_SIGMA).astype(np.float32)
+
+    def pick_boundaries(self, combined_feature_smooth: np.ndarray, n_samples: int,
+                        sample_rate: int) -> List[int]:
+        """Turn the transition curve into segment boundaries (sample indices)."""
+        return pick_boundaries(combined_feature_smooth, n_samples, sample_rate,
+                               self.peak_threshold, self.min_song_duration)
+
+    def boundaries_from_peaks(self, peaks, n_samples: int, sample_rate: int) -> List[int]:
+        """Segment boundaries (sample indices) from transition peaks (frame indices)."""
+        return boundaries_from_peaks(peaks, n_samples, sample_rate, self.min_song_duration)
+
+    def feature_key(self) -> Optional[str]:
+        """Cache key of this file's transition curve (None: no cache or unreadable file)."""
+        if self.feature_cache is None:
+            return None
+        if self._feature_key is None:
+            try:
+                digest = content_hash(self.input_file)
+            except OSError:
+                return None
+            self._feature_key = track_key(digest, self.target_sr)
+        return self._feature_key
+
+    def cached_track(self) -> Optional[FeatureTrack]:
+        key = self.feature_key()
+        if key is None:
+            return None
+        track = self.feature_cache.get(key)
+        metrics.cache_lookup("feature_track", track is not None)
+        if track is not None:
+            self.feature_track_key = key
+        return track
+
+    def store_track(self, track: FeatureTrack) -> None:
+        key = self.feature_key()
+        if key is None:
+            return
+        try:
+            self.feature_cache.put(key, track)
+        except OSError as e:
+            logger.warning(f"Could not cache the transition curve of {self.input_file.name}: {e!r}")
+            return
+        self.feature_track_key = key
+
+    def compute_track(self, audio_data: np.ndarray, sample_rate: int) -> FeatureTrack:
+        """Full-resolution transition curve, stored in the feature cache."""
+        spectral_centroid, rms_energy = self.extract_features(audio_data, sample_rate)
+        self._enter_stage("transitions")
+        track = FeatureTrack(self.combine_features(spectral_centroid, rms_energy),
+                             len(audio_data), sample_rate)
+        self.store_track(track)
+        return track
+
+    def feature_track(self) -> FeatureTrack:
+        """This file's transition curve: cached, else decoded and computed once."""
+        track = self.cached_track()
+        if track is None:
+            audio_data, sample_rate = self.load_audio()
+            track = self.compute_track(audio_data, sample_rate)
+        return track
+
+    def resegment(self, thresholds: Optional[List[float]] = None,
+                  min_song_durations: Optional[List[float]] = None) -> List[Dict]:
+        """Boundaries for every threshold x min duration combination, without
+        recognition. Unset parameters use the analyzer's (or auto) values."""
+        track = self.feature_track()
+        return sweep(track, thresholds or [self._peak_threshold_manual],
+                     min_song_durations or [self._min_song_duration_manual])
+
+    def use_cascade(self, duration: float) -> bool:
+        return self.cascade_min_seconds is not None and duration >= self.cascade_min_seconds
+
+    def detect_boundaries_cascade(self, audio_data: np.ndarray, sample_rate: int) -> List[int]:
+        """Coarse pass over the whole set, full resolution only near transitions.
+
+        The coarse curve is cached, so the set can be re-segmented without
+        decoding it again.
+        """
+        self._enter_stage("centroid")
+        with tracing.span("audio.features", "coarse-to-fine cascade"):
+            peaks, frames, coarse_curve = cascade_peaks(
+                audio_data, sample_rate, self.peak_threshold, self.min_song_duration,
+                check=self.check_cancelled,
+            )
+        self.store_track(FeatureTrack(coarse_curve, len(audio_data), sample_rate,
+                                      hop_length=HOP_LENGTH * COARSE_STRIDE))
+        full_frames = 1 + len(audio_data) // HOP_LENGTH
+        logger.info(f"Cascade computed {frames} feature frames instead of {full_frames} "
+                    f"({full_frames / max(frames, 1):.1f}x fewer)")
+        self._enter_stage("peaks")
+        return self.boundaries_from_peaks(peaks, len(audio_data), sample_rate)
+
+    def detect_song_boundaries(self, audio_data: np.ndarray, sample_rate: int) -> List[int]:
+        logger.info("Detecting song boundaries using spectral analysis...")
+        track = self.cached_track()
+        # A cached coarse curve (from the cascade) is only for re-segmenting:
+        # analysis runs the cascade again for its refined positions.
+        if track is not None and track.full_resolution and \
+                (track.n_samples, track.sample_rate) == (len(audio_data), sample_rate):
+            # Same content and settings seen before: skip the spectral pass.
+            logger.info("Reusing the cached transition curve")
+            self._enter_stage("transitions")
+        elif self.use_cascade(len(audio_data) / sample_rate):
+            filtered_boundaries = self.detect_boundaries_cascade(audio_data, sample_rate)
+            logger.info(f"Detected {len(filtered_boundaries) - 1} potential songs")
+            return filtered_boundaries
+        else:
+            track = self.compute_track(audio_data, sample_rate)
+
+        self._enter_stage("peaks")
+        with tracing.span("audio.peaks", "peak detection"):
+            filtered_boundaries = self.pick_boundaries(
+                track.curve, len(audio_data), sample_rate
+            )
         
         logger.info(f"Detected {len(filtered_boundaries) - 1} potential songs")
         return filtered_boundaries
     
-    def save_audio_segment(self, audio_data: np.ndarray, sample_rate: int, 
-                          start_sample: int, end_sample: int, index: int) -> str:
-        # Create tmp directory if it doesn't exist
-        Path("tmp").mkdir(exist_ok=True)
-        
-        segment = audio_data[start_sample:end_sample]
-        output_path = f"tmp/temp_segment_{index}.wav"
-        sf.write(output_path, segment, sample_rate)
-        return output_path
+    def encode_segment(self, audio_data: np.ndarray, sample_rate: int,
+                       start_sample: int, end_sample: int, index: int) -> EncodedSegment:
+        """16 kHz int16 recognition payload for one segment, built in memory."""
+        self.check_cancelled()
+        with tracing.span("audio.encode", f"segment {index}", samples=end_sample - start_sample):
+            encoded = encode_segment(audio_data, sample_rate, start_sample, end_sample, index)
+            encoded.wav  # serialize once here, off the event loop
+        return encoded
     
-    async def recognize_segment(self, audio_path: str, start_time: float) -> Optional[Dict]:
+    async def _lookup_local(self, encoded: EncodedSegment, start_time: float) -> Optional[Dict]:
+        """Match against the local fingerprint index; None on miss or when disabled."""
+        if self.fingerprint_index is None:
+            return None
         try:
-            async with self.throttler:
-                logger.info(f"Recognizing segment at {start_time:.1f}s...")
-                result = await self.shazam.recognize(audio_path)
-                
-                # Debug mode: log full response
-                if self.debug and result:
-                    logger.debug(f"Full Shazam response: {json.dumps(result, indent=2)}")
-                    if 'matches' in result:
-                        match_ids = [m.get('id') for m in result.get('matches', []) if m.get('id')]
-                        unique_ids = set(match_ids)
-                        logger.debug(f"Match analysis: {len(match_ids)} total matches, {len(unique_ids)} unique IDs")
-                        if len(match_ids) > len(unique_ids):
-                            logger.debug(f"Found {len(match_ids) - len(unique_ids)} duplicate match IDs")
-                
-                if result and 'track' in result:
-                    # Convert start_time to hh:mm:ss format
-                    hours = int(start_time // 3600)
-                    minutes = int((start_time % 3600) // 60)
-                    seconds = int(start_time % 60)
-                    time_formatted = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                    
-                    # Check matches array for confidence info
-                    # Count unique match IDs to avoid counting duplicates
-                    matches = result.get('matches', [])
-                    unique_match_ids = set(match.get('id') for match in matches if match.get('id'))
-                    match_count = len(unique_match_ids)
-                    
-                    track_info = {
-                        'title': result['track'].get('title', 'Unknown'),
-                        'artist': result['track'].get('subtitle', 'Unknown'),
-                        'start_time': time_formatted,
-                        'start_time_seconds': start_time,
-                        'shazam_url': result['track'].get('url', ''),
-                        'match_count': match_count
-                    }
-                    
-                    # Log with confidence indicator based on match count
-                    if match_count <= 5:
-                        confidence = "high confidence"
-                    elif match_count <= 15:
-                        confidence = "medium confidence"
-                    else:
-                        confidence = "low confidence"
-                    
-                    logger.info(f"Found: {track_info['artist']} - {track_info['title']} ({match_count} matches, {confidence})")
-                    
-                    return track_info
-                else:
-                    logger.warning(f"No match found for segment at {start_time:.1f}s")
-                    return None
+            with tracing.span("fingerprint.lookup", f"segment at {start_time:.1f}s"):
+                match = await self._run_in_executor(
+                    self.fingerprint_index.query, encoded.pcm, encoded.sample_rate
+                )
         except Exception as e:
-            logger.error(f"Error recognizing segment at {start_time:.1f}s: {e}")
+            logger.warning(f"Local fingerprint lookup failed at {start_time:.1f}s: {e!r}")
             return None
-    
-    async def analyze(self) -> List[Dict]:
+        metrics.cache_lookup("fingerprint", match is not None)
+        if match is None:
+            return None
+        logger.info(f"Found locally: {match['artist']} - {match['title']} "
+                    f"({match['aligned_hashes']} aligned landmarks)")
+        metrics.RECOGNITIONS.inc(result="local_match")
+        return {
+            'title': match['title'],
+            'artist': match['artist'],
+            'start_time': format_timestamp(start_time),
+            'start_time_seconds': start_time,
+            'shazam_url': match['shazam_url'],
+            'match_count': match['match_count'],
+            'source': 'local',
+        }
+
+    async def _remember(self, encoded: EncodedSegment, track_info: Dict) -> None:
+        """Add a confidently identified excerpt to the local fingerprint index."""
+        if self.fingerprint_index is None:
+            return
+        try:
+            await self._run_in_executor(
+                self.fingerprint_index.add, encoded.pcm, encoded.sample_rate, track_info
+            )
+        except Exception as e:
+            logger.warning(f"Could not index {track_info['artist']} - {track_info['title']}: {e!r}")
+
+    async def recognize_segment(self, audio: Union[str, bytes, EncodedSegment],
+                                start_time: float) -> Optional[Dict]:
+        encoded = audio if isinstance(audio, EncodedSegment) else None
+        if encoded is not None:
+            # Repeat catalogue: resolve from the local index, no Shazam call.
+            track_info = await self._lookup_local(encoded, start_time)
+            if track_info:
+                return track_info
+        try:
+            logger.info(f"Recognizing segment at {start_time:.1f}s...")
+            with metrics.STAGE_SECONDS.time(stage="recognize_segment"), \
+                    tracing.span("shazam.recognize", f"segment at {start_time:.1f}s",
+                                 backend=self.recognizer.name):
+                recognition = await self.recognizer.recognize(audio, client_id=self.client_id)
+        except Exception as e:
+            logger.error(f"Error recognizing segment at {start_time:.1f}s: {e!r}")
+            metrics.RECOGNITIONS.inc(result="error")
+            self.failed_segments.append(start_time)
+            return None
+
+        if recognition is None:
+            logger.warning(f"No match found for segment at {start_time:.1f}s")
+            metrics.RECOGNITIONS.inc(result="no_match")
+            return None
+
+        match_count = recognition.match_count
+        track_info = {
+            'title': recognition.title,
+            'artist': recognition.artist,
+            'start_time': format_timestamp(start_time),
+            'start_time_seconds': start_time,
+            'shazam_url': recognition.url,
+            'match_count': match_count
+        }
+
+        # Log with confidence indicator based on match count
+        if match_count <= CONFIDENT_MATCH_COUNT:
+            confidence = "high confidence"
+        elif match_count <= 15:
+            confidence = "medium confidence"
+        else:
+            confidence = "low confidence"
+
+        logger.info(f"Found: {track_info['artist']} - {track_info['title']} ({match_count} matches, {confidence})")
+        metrics.RECOGNITIONS.inc(result="match")
+        if encoded is not None and match_count <= CONFIDENT_MATCH_COUNT:
+            await self._remember(encoded, track_info)
+        return track_info
+
+    def cluster_segments(self, audio_data: np.ndarray, sample_rate: int,
+                         boundaries: List[int]) -> List[int]:
+        """Cluster label per segment; each segment is its own cluster when disabled."""
+        self.check_cancelled()
+        n_segments = len(boundaries) - 1
+        if self.cluster_threshold is None or n_segments < 2:
+            return list(range(n_segments))
+        with tracing.span("audio.cluster", f"{n_segments} segments"):
+            embeddings = embed_segments(audio_data, sample_rate, boundaries)
+            labels = cluster_embeddings(embeddings, self.cluster_threshold)
+        logger.info(f"Clustered {n_segments} segments into {len(set(labels))} groups")
+        return labels
+
+    async def _run_in_executor(self, func, *args):
+        """run_in_executor that keeps contextvars (the current tracing span).
+
+        The work is tracked until its thread returns, even if the caller is
+        cancelled first: see `idle()`.
+        """
         loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        fut = loop.run_in_executor(None, functools.partial(ctx.run, func, *args))
+        self._executor_work.add(fut)
+        fut.add_done_callback(self._executor_work_done)
+        # Shielded: cancelling the caller must not mark the work done while
+        # its thread still holds the decoded audio.
+        return await asyncio.shield(fut)
+
+    def _executor_work_done(self, fut: asyncio.Future) -> None:
+        self._executor_work.discard(fut)
+        if not fut.cancelled():
+            fut.exception()  # retrieved: a cancelled caller never will
 
+    async def idle(self) -> None:
+        """Wait until executor work started by this analyzer has returned.
+
+        After `cancel()`, a thread in the middle of a decode or STFT keeps
+        its memory until it reaches the next check.
+        """
+        if self._executor_work:
+            await asyncio.wait(set(self._executor_work))
+
+    def _on_track(self, track: Dict) -> None:
+        """Hook called with each track as soon as it is identified (no-op here)."""
+
+    def _on_segment(self, index: int, total: int) -> None:
+        """Hook called as each segment's turn comes, whether it is recognized
+        or reuses its cluster's match (no-op here)."""
+
+    async def analyze(self) -> List[Dict]:
         # Load audio (CPU-bound, offload to thread so we don't block FastAPI)
-        audio_data, sample_rate = await loop.run_in_executor(None, self.load_audio)
+        with metrics.STAGE_SECONDS.time(stage="load_audio"):
+            audio_data, sample_rate = await self._run_in_executor(self.load_audio)
 
         # Detect song boundaries (CPU-bound: STFT + peak detection)
-        boundaries = await loop.run_in_executor(
-            None, self.detect_song_boundaries, audio_data, sample_rate
-        )
+        with metrics.STAGE_SECONDS.time(stage="detect_song_boundaries"):
+            boundaries = await self._run_in_executor(
+                self.detect_song_boundaries, audio_data, sample_rate
+            )
 
-        # Process each segment
-        results = []
-        temp_files = []
+        # Group repeated sections (loops, re-drops) so each is recognized once
+        with metrics.STAGE_SECONDS.time(stage="cluster_segments"):
+            labels = await self._run_in_executor(
+                self.cluster_segments, audio_data, sample_rate, boundaries
+            )
 
-        try:
-            logger.info(f"Processing {len(boundaries) - 1} segments...")
+        async def encode(i: int) -> EncodedSegment:
+            # Resample + encode the recognition payload (CPU-bound, offload)
+            return await self._run_in_executor(
+                self.encode_segment,
+                audio_data, sample_rate, boundaries[i], boundaries[i + 1], i,
+            )
 
-            for i in range(len(boundaries) - 1):
-                start_sample = boundaries[i]
-                end_sample = boundaries[i + 1]
-                start_time = start_sample / sample_rate
+        start_times = [b / sample_rate for b in boundaries[:-1]]
+        return await self.recognize_segments(start_times, labels, encode)
 
-                # Save segment to temporary file (disk I/O, offload)
-                temp_file = await loop.run_in_executor(
-                    None, self.save_audio_segment,
-                    audio_data, sample_rate, start_sample, end_sample, i,
-                )
-                temp_files.append(temp_file)
+    async def recognize_segments(self, start_times: List[float], labels: List[int],
+                                 encode: Callable[[int], Awaitable[EncodedSegment]]) -> List[Dict]:
+        """Identify segments in order; `encode(i)` gives segment i's payload.
+
+        Only called for segments whose cluster isn't resolved yet.
+
+        One segment at a time, not through `RecognizerBackend.recognize_batch`:
+        whether a segment needs a call at all depends on the answers for
+        earlier members of its cluster, cancellation stops between calls,
+        and only one payload is encoded at a time. Concurrency comes from
+        the gateway, which overlaps the calls of all running jobs.
+        """
+        results = []
+        resolved: Dict[int, Dict] = {}  # cluster label -> representative's match
+        logger.info(f"Processing {len(start_times)} segments...")
+
+        for i, start_time in enumerate(start_times):
+            self.check_cancelled()
+            self._on_segment(i, len(start_times))
 
-                # Recognize the segment
-                track_info = await self.recognize_segment(temp_file, start_time)
-                if track_info:
-                    results.append(track_info)
+            # Same record as an already identified segment: reuse its match.
+            # Clusters whose representative found nothing keep trying members.
+            if labels[i] in resolved:
+                results.append({
+                    **resolved[labels[i]],
+                    'start_time': format_timestamp(start_time),
+                    'start_time_seconds': start_time,
+                    'source': 'cluster',
+                })
+                metrics.RECOGNITIONS.inc(result="reused")
+                self._on_track(results[-1])
+                continue
 
-                # Progress update
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Progress: {i + 1}/{len(boundaries) - 1} segments processed")
+            # Recognize the segment
+            track_info = await self.recognize_segment(await encode(i), start_time)
+            if track_info:
+                results.append(track_info)
+                resolved[labels[i]] = track_info
+                self._on_track(track_info)
 
-        finally:
-            # Clean up temporary files even if an error occurs
-            logger.info("Cleaning up temporary files...")
-            for temp_file in temp_files:
-                Path(temp_file).unlink(missing_ok=True)
+            # Progress update
+            if (i + 1) % 10 == 0:
+                logger.info(f"Progress: {i + 1}/{len(start_times)} segments processed")
 
         return results
 
+def deduplicate_tracks(results: List[Dict]) -> List[Dict]:
+    """First occurrence of each artist/title, in order."""
+    seen_tracks = set()
+    deduplicated_results = []
+    for track in results:
+        track_key = f"{track['artist'].lower()}_{track['title'].lower()}"
+        if track_key not in seen_tracks:
+            seen_tracks.add(track_key)
+            deduplicated_results.append(track)
+    return deduplicated_results
+
+
+def save_tracklist(tracks: List[Dict], output_path: Path) -> str:
+    """Write the JSON tracklist and its TXT twin; returns the TXT path."""
+    # Create output directory if it doesn't exist
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Save results in JSON format
+    with open(output_path, 'w') as f:
+        json.dump(tracks, f, indent=2)
+
+    # Save results in TXT format
+    txt_output = str(output_path).replace('.json', '.txt')
+    with open(txt_output, 'w') as f:
+        for track in tracks:
+            confidence = f" [{track['match_count']} matches]" if 'match_count' in track else ""
+            f.write(f"{track['start_time']} - {track['title']} - {track['artist']}{confidence}\n")
+    return txt_output
+
+
 async def main():
     parser = argparse.ArgumentParser(description='Analyze DJ sets and identify tracks using Shazam')
     parser.add_argument('input_file', help='Path to the audio file (DJ set or playlist)')
@@ -246,6 +591,25 @@ async def main():
                        help='Peak detection threshold (0-1, default: auto-adjusted based on audio length)')
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug mode to see full Shazam responses')
+    parser.add_argument('--profile', action='store_true',
+                       help='Sample the run and write a flamegraph-compatible profile to tmp/profiles/')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Processes for feature extraction on long files (0 = all CPUs, default: 1)')
+    parser.add_argument('--cascade', choices=['auto', 'always', 'never'], default='auto',
+                       help='Coarse-to-fine boundary detection: auto = sets of '
+                            f'{CASCADE_MIN_SECONDS / 60:.0f}+ min (default: auto)')
+    parser.add_argument('--no-cluster', action='store_true',
+                       help='Recognize every segment, even near-duplicates of an identified one')
+    parser.add_argument('--recognizer', default=RECOGNIZER_BACKEND,
+                       help='Recognizer backend: shazam, null, record:<file.jsonl> or replay:<file.jsonl> '
+                            '(default: shazam)')
+    parser.add_argument('--resegment', action='store_true',
+                       help='Only segment (no recognition), from the cached transition curve when there '
+                            'is one, and print the boundaries as JSON')
+    parser.add_argument('--sweep-threshold', type=float, nargs='+', metavar='T',
+                       help='With --resegment: evaluate each of these thresholds')
+    parser.add_argument('--sweep-min-duration', type=int, nargs='+', metavar='S',
+                       help='With --resegment: evaluate each of these minimum song durations')
     
     args = parser.parse_args()
     
@@ -257,22 +621,27 @@ async def main():
         args.input_file,
         min_song_duration=args.min_song_duration,
         peak_threshold=args.threshold,
-        debug=args.debug
+        debug=args.debug,
+        feature_workers=args.workers or available_cpus(),
+        cluster_threshold=None if args.no_cluster else CLUSTER_SIMILARITY,
+        recognizer=create_backend(args.recognizer, debug=args.debug),
+        cascade_min_seconds={'auto': CASCADE_MIN_SECONDS, 'always': 0, 'never': None}[args.cascade],
     )
+
+    if args.resegment or args.sweep_threshold or args.sweep_min_duration:
+        results = analyzer.resegment(args.sweep_threshold, args.sweep_min_duration)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            Path(args.output).write_text(output)
+        print(output)
+        return
     
     try:
         logger.info("Starting analysis...")
-        results = await analyzer.analyze()
-        
-        # Deduplicate tracks based on title and artist
-        seen_tracks = set()
-        deduplicated_results = []
-        for track in results:
-            track_key = f"{track['artist'].lower()}_{track['title'].lower()}"
-            if track_key not in seen_tracks:
-                seen_tracks.add(track_key)
-                deduplicated_results.append(track)
+        with tracing.profile_job(Path(args.input_file).stem, tracing.profiling_enabled(args.profile)):
+            results = await analyzer.analyze()
         
+        deduplicated_results = deduplicate_tracks(results)
         logger.info(f"Deduplication: {len(results)} tracks reduced to {len(deduplicated_results)} unique tracks")
         
         # Determine output path
@@ -290,19 +659,7 @@ async def main():
                 output_path = Path(f"outputs/{input_basename}_tracklist({counter}).json")
                 counter += 1
         
-        # Create output directory if it doesn't exist
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Save results in JSON format
-        with open(output_path, 'w') as f:
-            json.dump(deduplicated_results, f, indent=2)
-        
-        # Save results in TXT format
-        txt_output = str(output_path).replace('.json', '.txt')
-        with open(txt_output, 'w') as f:
-            for track in deduplicated_results:
-                confidence = f" [{track['match_count']} matches]" if 'match_count' in track else ""
-                f.write(f"{track['start_time']} - {track['title']} - {track['artist']}{confidence}\n")
+        txt_output = save_tracklist(deduplicated_results, output_path)
         
         # Print summary
         print(f"\nAnalysis complete! Found {len(deduplicated_results)} unique tracks:")
@@ -0,0 +1,81 @@
+"""Single-flight keys: one in-flight job per canonical URL or upload hash.
+
+When a mix link is shared, many users submit it within minutes. Each
+submission used to start its own yt-dlp download and full analysis. The
+web app now keys running jobs by what they analyse. An identical submission
+attaches to the running job as a follower instead of starting another one.
+"""
+import hashlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a link was shared from.
+_TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid", "ref", "ref_src", "igshid", "in"}
+_YOUTUBE_HOSTS = {"youtube.com", "youtu.be", "music.youtube.com", "youtube-nocookie.com"}
+
+
+def _host(netloc: str) -> str:
+    host = netloc.lower().rsplit("@", 1)[-1].split(":", 1)[0]
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a submitted URL so links to the same media compare equal.
+
+    Scheme, host case, `www.`/`m.` prefixes, fragments, tracking parameters
+    and parameter order are ignored. YouTube links reduce to the video ID,
+    since downloads run with --no-playlist.
+    """
+    parts = urlsplit(url.strip())
+    host = _host(parts.netloc)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith("utm_")]
+
+    if host in _YOUTUBE_HOSTS:
+        video_id = dict(query).get("v")
+        if host == "youtu.be":
+            video_id = parts.path.strip("/").split("/")[0]
+        elif parts.path.startswith(("/shorts/", "/live/", "/embed/")):
+            video_id = parts.path.split("/")[2]
+        if video_id:
+            return f"https://youtube.com/watch?v={video_id}"
+    if host == "soundcloud.com":
+        query = []  # SoundCloud paths fully identify a track or set
+
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def url_key(url: str) -> str:
+    return f"url:{canonical_url(url)}"
+
+
+def upload_key(content: bytes) -> str:
+    return f"upload:{hashlib.sha256(content).hexdigest()}"
+
+
+class SingleFlight:
+    """Which task currently leads the job for each key."""
+
+    def __init__(self):
+        self._leaders: Dict[str, str] = {}
+
+    def leader(self, key: str) -> Optional[str]:
+        return self._leaders.get(key)
+
+    def lead(self, key: str, task_id: str) -> None:
+        self._leaders[key] = task_id
+
+    def release(self, key: Optional[str], task_id: str) -> None:
+        """Forget `key` if `task_id` still leads it."""
+        if key is not None and self._leaders.get(key) == task_id:
+            del self._leaders[key]
+
+    def clear(self) -> None:
+        self._leaders.clear()
+
+    def __len__(self) -> int:
+        return len(self._leaders)
@@ -0,0 +1,213 @@
+"""Disk budgets for everything the app writes: uploads, outputs, task
+records and caches.
+
+Each `StorageArea` is a directory with an optional byte budget and maximum
+age. A sweep first deletes entries older than the age limit, then the
+least recently used ones until the area fits its budget. Then, if a
+filesystem has less than `min_free_bytes` left, it deletes the least
+recently used entries of every area on that filesystem until it doesn't.
+The web app sweeps every STORAGE_SWEEP_SECONDS.
+
+Entries are never deleted while pinned (files of active tasks) or within
+`grace_seconds` of their last write (downloads and uploads in progress).
+Entries are files, or groups of files that only make sense together, like
+a tracklist's JSON and TXT. "Last used" is the later of mtime and atime,
+so caches that read their files (or touch them on a hit) keep them warm.
+
+Every area lives under the project root (src/paths.py), whatever the
+working directory. The fingerprint index is the one file the app writes that no area
+manages: deleting an SQLite database under its open connection loses it
+silently, and it only grows by MAX_EXCERPTS_PER_TRACK excerpts per
+identified track (src/fingerprint_index.py). Delete it with the server
+stopped, or set FINGERPRINT_INDEX_PATH empty to disable it.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Entries written this recently are still being written.
+GRACE_SECONDS = 600.0
+
+
+def _same_file(path: Path) -> Path:
+    return path
+
+
+def _env_number(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return float(value) if value.strip() else None
+
+
+@dataclass
+class StorageArea:
+    name: str
+    path: Path
+    max_bytes: Optional[int] = None
+    max_age_seconds: Optional[float] = None
+    # Glob (relative to `path`, recursive with "**/") of the files managed.
+    pattern: str = "*"
+    # Files mapping to the same key are evicted together.
+    group: Callable[[Path], Path] = _same_file
+
+    @classmethod
+    def from_env(cls, name: str, path, default_mb: Optional[float],
+                 default_age_hours: Optional[float] = None, **kwargs) -> "StorageArea":
+        """Area whose limits come from STORAGE_<NAME>_MB and
+        STORAGE_<NAME>_MAX_AGE_HOURS (set empty for no limit)."""
+        prefix = f"STORAGE_{name.upper()}"
+        mb = _env_number(f"{prefix}_MB", default_mb)
+        hours = _env_number(f"{prefix}_MAX_AGE_HOURS", default_age_hours)
+        return cls(
+            name=name, path=Path(path),
+            max_bytes=int(mb * 1024 * 1024) if mb is not None else None,
+            max_age_seconds=hours * 3600 if hours is not None else None,
+            **kwargs,
+        )
+
+
+@dataclass
+class _Entry:
+    area: StorageArea
+    paths: List[Path] = field(default_factory=list)
+    size: int = 0
+    last_used: float = 0.0
+    last_written: float = 0.0
+
+
+class StorageManager:
+    def __init__(self, areas: Iterable[StorageArea],
+                 pinned: Callable[[], Set[Path]] = set,
+                 min_free_bytes: int = 0, grace_seconds: float = GRACE_SECONDS):
+        self.areas = list(areas)
+        self.pinned = pinned
+        self.min_free_bytes = min_free_bytes
+        self.grace_seconds = grace_seconds
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def _scan(self, area: StorageArea) -> List[_Entry]:
+        entries: Dict[Path, _Entry] = {}
+        if not area.path.is_dir():
+            return []
+        for path in area.path.glob(area.pattern):
+            try:
+                st = path.stat()
+            except OSError:
+                continue  # deleted under us
+            if not path.is_file():
+                continue
+            entry = entries.setdefault(area.group(path), _Entry(area))
+            entry.paths.append(path)
+            entry.size += st.st_size
+            entry.last_used = max(entry.last_used, st.st_mtime, st.st_atime)
+            entry.last_written = max(entry.last_written, st.st_mtime)
+        return list(entries.values())
+
+    def _delete(self, entry: _Entry, reason: str) -> int:
+        freed = 0
+        for path in entry.paths:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                freed += size
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.warning("Could not evict %s: %s", path, exc)
+        metrics.STORAGE_EVICTED_BYTES.inc(freed, area=entry.area.name, reason=reason)
+        return freed
+
+    def sweep(self) -> Dict[str, dict]:
+        """One pass over every area; returns (and keeps) per-area stats. Blocking."""
+        with self._lock:
+            return self._sweep()
+
+    def _sweep(self) -> Dict[str, dict]:
+        now = time.time()
+        pinned = {Path(p).resolve() for p in self.pinned()}
+        stats: Dict[str, dict] = {}
+        evictable: Dict[int, List[_Entry]] = {}  # st_dev -> entries left after the budgets
+        devices: Dict[int, Path] = {}
+
+        for area in self.areas:
+            kept, used, evicted = [], 0, {"age": 0, "budget": 0, "disk_full": 0}
+            for entry in self._scan(area):
+                if (now - entry.last_written < self.grace_seconds
+                        or any(p.resolve() in pinned for p in entry.paths)):
+                    used += entry.size
+                    continue
+                if area.max_age_seconds is not None and now - entry.last_used > area.max_age_seconds:
+                    evicted["age"] += self._delete(entry, "age")
+                    continue
+                kept.append(entry)
+                used += entry.size
+            kept.sort(key=lambda e: e.last_used)
+            while area.max_bytes is not None and used > area.max_bytes and kept:
+                entry = kept.pop(0)
+                freed = self._delete(entry, "budget")
+                evicted["budget"] += freed
+                used -= freed
+            if area.path.is_dir():
+                dev = area.path.stat().st_dev
+                devices.setdefault(dev, area.path)
+                evictable.setdefault(dev, []).extend(kept)
+            stats[area.name] = {
+                "path": str(area.path), "bytes": used, "max_bytes": area.max_bytes,
+                "max_age_seconds": area.max_age_seconds, "evicted_bytes": evicted,
+            }
+
+        # Disk floor: least recently used first, whatever the area.
+        for dev, entries in evictable.items():
+            free = shutil.disk_usage(devices[dev]).free
+            entries.sort(key=lambda e: e.last_used)
+            while free < self.min_free_bytes and entries:
+                entry = entries.pop(0)
+                freed = self._delete(entry, "disk_full")
+                free += freed
+                area_stats = stats[entry.area.name]
+                area_stats["bytes"] -= freed
+                area_stats["evicted_bytes"]["disk_full"] += freed
+            if free < self.min_free_bytes:
+                logger.warning("Only %d MB free on %s with nothing left to evict",
+                               free // (1024 * 1024), devices[dev])
+
+        for area in self.areas:
+            area_stats = stats[area.name]
+            area_stats["disk_free_bytes"] = (
+                shutil.disk_usage(area.path).free if area.path.is_dir() else None
+            )
+            metrics.STORAGE_BYTES.set(area_stats["bytes"], area=area.name)
+            if area_stats["disk_free_bytes"] is not None:
+                metrics.DISK_FREE_BYTES.set(area_stats["disk_free_bytes"], area=area.name)
+            freed = sum(area_stats["evicted_bytes"].values())
+            if freed:
+                logger.info("Storage %s: evicted %d KB (%s), %d KB in use", area.name,
+                            freed // 1024, area_stats["evicted_bytes"], area_stats["bytes"] // 1024)
+        self._stats = stats
+        return stats
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-area stats of the last sweep."""
+        return self._stats
+
+    async def run(self, interval: float) -> None:
+        """Sweep every `interval` seconds until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception as exc:
+                logger.error("Storage sweep failed: %r", exc)
+            await asyncio.sleep(interval)
@@ -3,39 +3,117 @@
 Survives uvicorn restarts so the frontend sees a clean 'interrupted' error
 instead of 'Connection lost' when the process is killed mid-analysis (OOM,
 redeploy, etc.).
+
+Writes happen behind the caller: `save_later` only serializes the task and
+hands the text to a writer thread, which waits a short interval so a burst of
+updates to one task becomes a single write. `load` sees pending snapshots,
+and `flush` (called on shutdown) waits until everything is on disk.
 """
 import json
 import logging
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
 logger = logging.getLogger(__name__)
 
-NON_TERMINAL_STATUSES = {"pending", "downloading", "processing"}
-_VOLATILE_KEYS = {"filepath", "_analyzer"}
+# "preview": segmented, waiting for the user to confirm recognition.
+NON_TERMINAL_STATUSES = {"pending", "queued", "downloading", "processing", "preview"}
+# Handles to the running job, meaningless after a restart.
+_VOLATILE_KEYS = {"filepath", "_analyzer", "_job", "_process", "_flight_key", "_followers",
+                  "_confirm", "_download_ahead"}
+# How long the writer lets updates pile up before writing them.
+WRITE_INTERVAL = 0.25
 
 
 class TaskStore:
-    def __init__(self, directory: Path):
+    def __init__(self, directory: Path, write_interval: float = WRITE_INTERVAL):
         self.dir = directory
         self.dir.mkdir(parents=True, exist_ok=True)
+        self.write_interval = write_interval
+        self._cond = threading.Condition()
+        self._pending: Dict[str, str] = {}  # latest snapshot per task, not yet written
+        self._writing: Dict[str, str] = {}  # batch the writer is on right now
+        self._flushers = 0
+        self._writer: Optional[threading.Thread] = None
 
     def _path(self, task_id: str) -> Path:
         return self.dir / f"{task_id}.json"
 
-    def save(self, task_id: str, task: dict) -> None:
+    def _write(self, task_id: str, snapshot: str) -> None:
         path = self._path(task_id)
         tmp = path.with_suffix(".json.tmp")
-        serializable = {k: v for k, v in task.items() if k not in _VOLATILE_KEYS}
         try:
             with open(tmp, "w") as f:
-                json.dump(serializable, f, default=str)
+                f.write(snapshot)
             os.replace(tmp, path)
         except OSError as exc:
             logger.warning("Failed to persist task %s: %s", task_id, exc)
 
+    def save_later(self, task_id: str, task: dict) -> None:
+        """Queue a snapshot of `task`; replaces any not yet written. Never blocks on I/O."""
+        # Serialized here, not on the writer thread, which would race the
+        # event loop still appending to results and segments. dict() copies
+        # the top level atomically for executor threads reporting progress.
+        try:
+            snapshot = json.dumps(
+                {k: v for k, v in dict(task).items() if k not in _VOLATILE_KEYS}, default=str
+            )
+        except (TypeError, ValueError, RuntimeError) as exc:
+            # RuntimeError: a nested value changed under an executor thread;
+            # the task's next save catches up.
+            logger.warning("Failed to snapshot task %s: %s", task_id, exc)
+            return
+        with self._cond:
+            self._pending[task_id] = snapshot
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._run, name="task-store-writer", daemon=True
+                )
+                self._writer.start()
+            self._cond.notify_all()
+
+    def save(self, task_id: str, task: dict) -> None:
+        """Write `task` now (after anything already queued)."""
+        self.save_later(task_id, task)
+        self.flush()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued snapshot is on disk. False on timeout."""
+        with self._cond:
+            self._flushers += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: not self._pending and not self._writing, timeout
+                )
+            finally:
+                self._flushers -= 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # Let a burst of updates collapse into one write per task,
+                # unless someone is waiting on a flush.
+                self._cond.wait_for(lambda: self._flushers, self.write_interval)
+                self._writing, self._pending = self._pending, {}
+            for task_id, snapshot in self._writing.items():
+                # One bad record must not stop the writer for everyone else.
+                try:
+                    self._write(task_id, snapshot)
+                except Exception:
+                    logger.exception("Failed to persist task %s", task_id)
+            with self._cond:
+                self._writing = {}
+                self._cond.notify_all()
+
     def load(self, task_id: str) -> Optional[dict]:
+        with self._cond:
+            queued = self._pending.get(task_id) or self._writing.get(task_id)
+        if queued is not None:
+            return json.loads(queued)
         path = self._path(task_id)
         if not path.exists():
             return None
@@ -45,15 +123,25 @@ class TaskStore:
         except (json.JSONDecodeError, OSError):
             return None
 
-    def mark_interrupted(self) -> int:
-        """Mark any persisted task in a non-terminal state as interrupted.
+    def task_ids(self) -> List[str]:
+        """IDs of the tasks on disk (a directory listing, no reads)."""
+        return [path.stem for path in self.dir.glob("*.json")]
+
+    def mark_interrupted(self, task_ids: Optional[Iterable[str]] = None) -> int:
+        """Mark persisted tasks in a non-terminal state as interrupted.
 
-        Called at server startup. Returns the number of tasks marked.
+        Called at server startup with the `task_ids()` listed before it
+        started serving, so jobs submitted since are never touched; tasks
+        with a snapshot queued are skipped too. Writes go through the writer
+        thread. Returns the number of tasks marked.
         """
         count = 0
-        for path in self.dir.glob("*.json"):
+        for task_id in self.task_ids() if task_ids is None else task_ids:
+            with self._cond:
+                if task_id in self._pending or task_id in self._writing:
+                    continue
             try:
-                with open(path) as f:
+                with open(self._path(task_id)) as f:
                     task = json.load(f)
             except (json.JSONDecodeError, OSError):
                 continue
@@ -66,10 +154,6 @@ class TaskStore:
                     "restarted (likely an out-of-memory on a very long "
                     "audio). Please retry with a shorter file."
                 )
-                try:
-                    with open(path, "w") as f:
-                        json.dump(task, f, default=str)
-                    count += 1
-                except OSError:
-                    pass
+                self.save_later(task_id, task)
+                count += 1
         return count
@@ -0,0 +1,134 @@
+"""Tracing spans and an opt-in sampling profiler for analysis jobs.
+
+Spans go to Sentry when it is initialized (see `sentry_setup.init_sentry`)
+and are free no-ops otherwise. Background jobs run outside any request, so
+`transaction()` opens the root the pipeline spans hang off.
+
+The profiler is dependency-free: a daemon thread samples every thread's
+stack at a fixed interval and writes collapsed stacks ("folded" format,
+`frame;frame;frame count` per line), which flamegraph.pl, speedscope and
+inferno all read directly.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from src.paths import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = BASE_DIR / "tmp" / "profiles"
+
+
+def _sentry():
+    try:
+        import sentry_sdk
+    except ImportError:
+        return None
+    return sentry_sdk if sentry_sdk.get_client().is_active() else None
+
+
+def span(op: str, description: Optional[str] = None, **data):
+    """Child span of the current transaction; no-op without Sentry."""
+    sdk = _sentry()
+    if sdk is None:
+        return nullcontext()
+    ctx = sdk.start_span(op=op, name=description or op)
+    for key, value in data.items():
+        ctx.set_data(key, value)
+    return ctx
+
+
+def transaction(name: str, op: str = "task", **tags):
+    """Root transaction for work that doesn't run inside a request."""
+    sdk = _sentry()
+    if sdk is None:
+        return nullcontext()
+    txn = sdk.start_transaction(op=op, name=name)
+    for key, value in tags.items():
+        txn.set_tag(key, value)
+    return txn
+
+
+def profiling_enabled(requested: bool = False) -> bool:
+    """Per-job flag, or SHAZAMER_PROFILE=1 to profile every job."""
+    return requested or os.environ.get("SHAZAMER_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads (event loop + executor workers).
+
+    Stacks from concurrent jobs land in the same profile: filter on the frames
+    you care about, or profile on a quiet instance.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> Dict[str, int]:
+        return dict(self.samples)
+
+    def write(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+@contextmanager
+def profile_job(name: str, enabled: bool) -> Iterator[Optional[SamplingProfiler]]:
+    """Profile the enclosed block into tmp/profiles/<name>.folded when enabled."""
+    if not enabled:
+        yield None
+        return
+    profiler = SamplingProfiler().start()
+    start = time.perf_counter()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        path = profiler.write(PROFILE_DIR / f"{name}.folded")
+        logger.info("Profile for %s written to %s (%d samples over %.1fs)",
+                    name, path, sum(profiler.samples.values()), time.perf_counter() - start)
@@ -2,27 +2,39 @@
 import os
 import sys
 import json
+import hashlib
 import asyncio
 import uuid
+import signal
+import shlex
 import tempfile
 import subprocess
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
-import numpy as np
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
-import yt_dlp
-import numpy as np
 
-from src.shazamer import DJSetAnalyzer
+from src import http_cache, metrics, tracing
+from src.admission import AdmissionController, estimate_job_bytes, expected_duration
+from src.download_pool import DownloadPool
+from src.paths import BASE_DIR, FEATURE_CACHE_DIR
+from src.playlists import MAX_BATCH_ENTRIES, expand_urls
+from src.probe import duration_probe
+from src.recognition_gateway import get_gateway
+from src.scheduler import DEFAULT_CLIENT
 from src.sentry_setup import init_sentry
-from src.task_store import TaskStore
+from src.single_flight import SingleFlight, upload_key, url_key
+from src.storage_manager import StorageArea, StorageManager
+from src.task_store import NON_TERMINAL_STATUSES, TaskStore
 
 import logging
 
@@ -43,20 +55,58 @@ app.add_middleware(
 )
 
 # Configuration
-BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = BASE_DIR / "src" / "static"
 
 # Mount static files
 app.mount(
-    "/static", StaticFiles(directory=str(BASE_DIR / "src" / "static")), name="static"
+    "/static", StaticFiles(directory=str(STATIC_DIR)), name="static"
 )
 UPLOAD_FOLDER = BASE_DIR / "uploads"
 OUTPUT_FOLDER = BASE_DIR / "outputs"
 TMP_FOLDER = BASE_DIR / "tmp"
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
 ALLOWED_EXTENSIONS = {"mp3", "wav", "flac", "m4a", "ogg", "wma", "aac"}
-# Cap audio duration to keep us under the container memory limit. STFT memory
-# grows linearly with audio length; 7200s (2h) at 22050Hz fits in ~2GB peak.
-MAX_AUDIO_DURATION_SECONDS = int(os.environ.get("MAX_AUDIO_DURATION_SECONDS", "7200"))
+# Analysis sample rate. Also drives the per-job memory estimate used by the
+# admission controller (STFT memory grows linearly with samples analysed).
+TARGET_SR = 22050
+# Processes for detection feature extraction on long files (1 = in-thread).
+FEATURE_WORKERS = int(os.environ.get("FEATURE_WORKERS", "1"))
+
+# Downloader invocation; the load-test harness swaps in src/fake_ytdlp.py.
+YTDLP_COMMAND = shlex.split(os.environ.get("YTDLP_COMMAND", "")) or [sys.executable, "-m", "yt_dlp"]
+
+# How long DELETE /api/tasks/{id} waits for the job to unwind (release its
+# admission slot, delete its upload) before answering.
+CANCEL_GRACE_SECONDS = 5.0
+
+# Segmentation previews not confirmed within this long are dropped with
+# their upload.
+PREVIEW_TTL_SECONDS = float(os.environ.get("PREVIEW_TTL_SECONDS", "3600"))
+
+# Concurrent live stream analyses (src/live.py). Each holds a connection
+# and a reader thread for as long as the stream runs, and LIVE_STREAM_BYTES
+# of the admission budget: few MB of audio and features, plus a job's
+# share of decoder and recognition buffers.
+MAX_LIVE_STREAMS = int(os.environ.get("MAX_LIVE_STREAMS", "4"))
+LIVE_STREAM_BYTES = int(float(os.environ.get("LIVE_STREAM_MEMORY_MB", "64")) * 1024 * 1024)
+# Hosts /api/live may connect to, comma-separated; empty allows any.
+LIVE_STREAM_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get("LIVE_STREAM_HOSTS", "").split(",")
+    if host.strip()
+)
+
+# API keys that name a client of the fair-share queue (src/scheduler.py),
+# comma-separated. Other keys are ignored, so an invented key can't buy a
+# fresh share of the queue; those requests are queued by IP.
+API_KEYS = frozenset(key.strip() for key in os.environ.get("API_KEYS", "").split(",") if key.strip())
+
+# Entries of one batch that may be downloaded but not yet admitted to
+# analysis. Without it a 200-entry playlist downloads everything into
+# uploads/ while the analysis queue works through it.
+BATCH_DOWNLOAD_AHEAD = int(os.environ.get("BATCH_DOWNLOAD_AHEAD", "2"))
+
+# One in-flight job per canonical URL / upload hash (see src/single_flight.py)
+in_flight = SingleFlight()
 
 # Create necessary directories
 UPLOAD_FOLDER.mkdir(exist_ok=True)
@@ -64,12 +114,61 @@ OUTPUT_FOLDER.mkdir(exist_ok=True)
 TMP_FOLDER.mkdir(exist_ok=True)
 TASK_STORE_DIR = BASE_DIR / "tmp" / "tasks"
 
+# Disk budgets (see src/storage_manager.py); STORAGE_<AREA>_MB and
+# STORAGE_<AREA>_MAX_AGE_HOURS override the defaults below.
+STORAGE_SWEEP_SECONDS = float(os.environ.get("STORAGE_SWEEP_SECONDS", "300"))
+MIN_FREE_DISK_MB = float(os.environ.get("MIN_FREE_DISK_MB", "1024"))
+
+# Task message / progress for each DJSetAnalyzer detection stage.
+DETECTION_STAGES = {
+    "centroid": ("Computing spectral centroid...", 14),
+    "rms": ("Computing RMS energy...", 16),
+    "transitions": ("Analyzing frequency transitions...", 18),
+    "peaks": ("Detecting song boundaries...", 20),
+}
+
 # Store analysis tasks (in-memory hot cache; disk-backed via task_store)
 analysis_tasks: Dict[str, dict] = {}
+# Rendered /api/view and /api/recent bodies, valid until their files change.
+_view_cache = http_cache.MemoCache("view")
+_recent_cache = http_cache.MemoCache("recent", max_entries=1)
+# Jobs start only while their summed memory estimates fit the budget.
+admission = AdmissionController()
+# URL downloads run at most DOWNLOAD_CONCURRENCY at once.
+download_pool = DownloadPool()
 task_store = TaskStore(TASK_STORE_DIR)
-_interrupted = task_store.mark_interrupted()
-if _interrupted:
-    logger.info("Marked %d in-flight task(s) as interrupted after restart", _interrupted)
+
+
+def pinned_paths() -> set:
+    """Files the storage manager must keep: those of tasks still running."""
+    pinned = set()
+    for task_id, task in list(analysis_tasks.items()):
+        if task.get("status") in NON_TERMINAL_STATUSES:
+            pinned.add(TASK_STORE_DIR / f"{task_id}.json")
+            if task.get("filepath"):
+                pinned.add(Path(task["filepath"]))
+    return pinned
+
+
+storage = StorageManager(
+    [
+        StorageArea.from_env("uploads", UPLOAD_FOLDER, 10240, 24),
+        # A tracklist's JSON and TXT go together.
+        StorageArea.from_env("outputs", OUTPUT_FOLDER, 2048,
+                             group=lambda path: path.with_suffix("")),
+        StorageArea.from_env("tasks", TASK_STORE_DIR, 256, 30 * 24, pattern="*.json"),
+        StorageArea.from_env("http_cache", http_cache.COMPRESSED_DIR, 256),
+        StorageArea.from_env("profiles", tracing.PROFILE_DIR, 512, 7 * 24),
+    ] + ([StorageArea.from_env("feature_tracks", FEATURE_CACHE_DIR, 1024, 30 * 24)]
+         if FEATURE_CACHE_DIR else []),
+    pinned=pinned_paths,
+    min_free_bytes=int(MIN_FREE_DISK_MB * 1024 * 1024),
+)
+
+# Boot progress. The server binds and serves immediately; /api/ready reports
+# when housekeeping is done and the analysis stack (librosa, scipy, numpy,
+# shazamio) is imported, so the first job doesn't pay for it.
+boot_state = {"housekeeping": False, "analysis_imported": False}
 
 
 # Sweep stale uploads on boot. The runtime cleanup in analyze_file's `finally`
@@ -94,9 +193,85 @@ def sweep_stale_uploads(folder: Path, max_age_seconds: int = 24 * 3600) -> int:
     return removed
 
 
-_swept = sweep_stale_uploads(UPLOAD_FOLDER)
-if _swept:
-    logger.info("Swept %d stale upload(s) older than 24h", _swept)
+def run_boot_housekeeping(stale_task_ids: Optional[List[str]] = None) -> None:
+    """Disk cleanup after a restart. Blocking: run it off the event loop.
+
+    `stale_task_ids` are the tasks on disk before the server started
+    serving: only those can have been interrupted by the restart.
+    """
+    interrupted = task_store.mark_interrupted(stale_task_ids)
+    if interrupted:
+        logger.info("Marked %d in-flight task(s) as interrupted after restart", interrupted)
+    swept = sweep_stale_uploads(UPLOAD_FOLDER)
+    if swept:
+        logger.info("Swept %d stale upload(s) older than 24h", swept)
+    boot_state["housekeeping"] = True
+
+
+def import_analysis_stack() -> None:
+    """Import the heavy analysis modules (seconds of librosa/numba/scipy)."""
+    import src.shazamer  # noqa: F401
+    import shazamio  # noqa: F401
+    boot_state["analysis_imported"] = True
+
+
+async def boot(stale_task_ids: Optional[List[str]] = None) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, run_boot_housekeeping, stale_task_ids)
+        await loop.run_in_executor(None, import_analysis_stack)
+        logger.info("Boot complete, ready to analyze")
+        app.state.storage_task = asyncio.create_task(storage.run(STORAGE_SWEEP_SECONDS))
+    except Exception as exc:
+        logger.error("Boot housekeeping failed: %s", exc)
+        _report_exception(exc, stage="boot")
+
+
+@app.on_event("startup")
+async def start_boot() -> None:
+    # Don't await: uvicorn only binds once startup handlers return. The
+    # task files are listed here, before any request can create one.
+    app.state.boot_task = asyncio.create_task(boot(task_store.task_ids()))
+
+
+@app.get("/api/health")
+async def health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness: boot housekeeping done and analysis stack loaded."""
+    is_ready = all(boot_state.values())
+    return JSONResponse(
+        {"ready": is_ready, **boot_state}, status_code=200 if is_ready else 503
+    )
+
+
+@app.get("/api/storage")
+async def storage_stats():
+    """Usage, budgets and evictions of each storage area at the last sweep."""
+    return storage.stats()
+
+
+@app.on_event("shutdown")
+async def stop_storage_manager() -> None:
+    task = getattr(app.state, "storage_task", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("shutdown")
+async def close_recognition_gateway() -> None:
+    await get_gateway().close()
+
+
+@app.on_event("shutdown")
+async def flush_task_store() -> None:
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, task_store.flush, 10.0):
+        logger.warning("Task store still had unwritten tasks at shutdown")
 
 
 def _report_exception(exc: Exception, **tags) -> None:
@@ -121,26 +296,91 @@ def _report_exception(exc: Exception, **tags) -> None:
 
 
 def persist(task_id: str) -> None:
-    """Write the current in-memory state of a task to disk.
+    """Queue the current in-memory state of a task for writing to disk.
 
-    Call at phase transitions (status change, completion, error). Progress
-    updates between phases do not need to be persisted — their absence only
-    means a slightly stale bar after restart, not data loss.
+    Only snapshots the task: the store's writer thread does the I/O and
+    collapses repeated saves of one task, so this is cheap enough to call on
+    progress updates as well as phase transitions.
     """
     task = analysis_tasks.get(task_id)
     if task is not None:
-        task_store.save(task_id, task)
+        task_store.save_later(task_id, task)
+
+
+def client_of(request: Request) -> str:
+    """Who a submission is queued for: its API key if listed in API_KEYS,
+    or else its IP."""
+    api_key = request.headers.get("x-api-key")
+    if api_key in API_KEYS:
+        # Task records are persisted: keep a digest, not the key itself.
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return request.client.host if request.client else DEFAULT_CLIENT
+
+
+def _cancelled_record(task: dict) -> dict:
+    return {
+        "status": "cancelled",
+        "progress": task.get("progress", 0),
+        "message": "Cancelled",
+        "filename": task.get("filename"),
+        "end_time": datetime.now().isoformat(),
+    }
 
 
-def probe_duration(filepath: str) -> float:
-    """Return audio duration in seconds without loading the file into RAM."""
+def follow(leader_id: str, filename: str) -> str:
+    """Attach a new task to the in-flight job led by `leader_id`."""
+    task_id = str(uuid.uuid4())
+    analysis_tasks[task_id] = {
+        "follow": leader_id,
+        "filename": filename,
+        "start_time": datetime.now().isoformat(),
+    }
+    analysis_tasks[leader_id].setdefault("_followers", []).append(task_id)
+    persist(task_id)
+    metrics.cache_lookup("single_flight", True)
+    logger.info("Task %s follows in-flight task %s", task_id, leader_id)
+    return task_id
+
+
+def lead(task_id: str, key: str) -> None:
+    """Make `task_id` the job identical submissions coalesce onto."""
+    in_flight.lead(key, task_id)
+    analysis_tasks[task_id]["_flight_key"] = key
+    metrics.cache_lookup("single_flight", False)
+
+
+def finish_task(task_id: str, record: dict) -> None:
+    """Record a job's terminal state for its task and every follower."""
+    task = analysis_tasks.get(task_id, {})
+    in_flight.release(task.get("_flight_key"), task_id)
+    for follower_id in task.get("_followers", []):
+        analysis_tasks[follower_id] = {**record, "coalesced": True}
+        persist(follower_id)
+    if task.get("owner_cancelled"):
+        record = _cancelled_record(task)
+    analysis_tasks[task_id] = record
+    persist(task_id)
+
+
+def is_cancelled(task_id: str) -> bool:
+    return analysis_tasks.get(task_id, {}).get("status") == "cancelled"
+
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is not None:
+        return
     try:
-        from pydub.utils import mediainfo
-        info = mediainfo(filepath)
-        return float(info.get("duration", 0) or 0)
-    except Exception as exc:
-        logger.warning("Could not probe duration for %s: %s", filepath, exc)
-        return 0.0
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def probe_duration(filepath: str) -> float:
+    """Return audio duration in seconds without loading the file into RAM.
+
+    Blocking; async code should await `duration_probe.probe_async` instead.
+    """
+    return duration_probe.probe(filepath)
 
 
 class TaskStatus(BaseModel):
@@ -157,6 +397,16 @@ class TaskStatus(BaseModel):
     total_segments: Optional[int] = None
     unique_tracks: Optional[int] = None
     total_tracks_found: Optional[int] = None
+    failed_segments: Optional[int] = None
+    queue_position: Optional[int] = None
+    # Rough seconds until a queued job starts
+    eta_seconds: Optional[int] = None
+    # Attached to an identical in-flight submission instead of running its own job
+    coalesced: Optional[bool] = None
+    # Live stream analysis: results grow while status is "processing"
+    live: Optional[bool] = None
+    # Batch submissions: per-entry task id, url, title, status and progress
+    children: Optional[List[dict]] = None
 
 
 class AnalysisResult(BaseModel):
@@ -169,11 +419,43 @@ class AnalysisResult(BaseModel):
 
 class URLDownloadRequest(BaseModel):
     url: str
+    # Opt-in sampling profile of the job, written to tmp/profiles/<task_id>.folded
+    profile: bool = False
+    # Stop after segmentation until POST /api/tasks/<task_id>/confirm
+    preview: bool = False
+
+
+class ConfirmRequest(BaseModel):
+    # Detection parameters for the analysis; null keeps the preview's.
+    threshold: Optional[float] = None
+    min_song_duration: Optional[int] = None
+
+
+class BatchDownloadRequest(BaseModel):
+    # Single sets, playlists or channels; playlists expand to their entries.
+    urls: List[str]
+    profile: bool = False
+
+
+class LiveStreamRequest(BaseModel):
+    url: str
+    min_song_duration: Optional[int] = None
+    threshold: Optional[float] = None
+
+
+class ResegmentRequest(BaseModel):
+    # Every combination is evaluated; null means auto for the set's length.
+    thresholds: List[Optional[float]] = [None]
+    min_song_durations: List[Optional[float]] = [None]
+
+
+# Upper bound on threshold x min duration combinations per request.
+MAX_RESEGMENT_COMBINATIONS = 400
 
 
 @app.get("/")
-async def index():
-    return FileResponse("src/static/index.html")
+async def index(request: Request):
+    return http_cache.file_response(request, STATIC_DIR / "index.html", media_type="text/html")
 
 
 def allowed_file(filename: str) -> bool:
@@ -181,7 +463,8 @@ def allowed_file(filename: str) -> bool:
 
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request, file: UploadFile = File(...),
+                      profile: bool = Form(False), preview: bool = Form(False)):
     # Validate file
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file selected")
@@ -199,6 +482,17 @@ async def upload_file(file: UploadFile = File(...)):
             status_code=413, detail="File too large. Maximum size is 500MB"
         )
 
+    metrics.TRANSFER_BYTES.inc(len(content), direction="upload")
+
+    # Same bytes already being analysed: follow that job instead. Previews
+    # wait for their own user's confirmation, so they neither follow nor lead.
+    # Hashing up to MAX_FILE_SIZE bytes takes long enough to stall every
+    # other request, so it runs off the event loop.
+    flight_key = await asyncio.get_running_loop().run_in_executor(None, upload_key, content)
+    leader_id = in_flight.leader(flight_key)
+    if leader_id is not None and not preview:
+        return {"task_id": follow(leader_id, file.filename), "filename": file.filename}
+
     # Save uploaded file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_filename = f"{timestamp}_{file.filename}"
@@ -207,6 +501,17 @@ async def upload_file(file: UploadFile = File(...)):
     with open(filepath, "wb") as f:
         f.write(content)
 
+    # Header probe takes milliseconds: refuse files that could never be
+    # admitted now instead of after the client starts polling.
+    duration = await duration_probe.probe_async(str(filepath))
+    if not admission.fits_ever(estimate_job_bytes(duration, TARGET_SR, len(content))):
+        filepath.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=413,
+            detail=f"Audio too long for analysis ({int(duration // 60)} min). "
+            "Please trim the file and retry.",
+        )
+
     # Generate task ID
     task_id = str(uuid.uuid4())
 
@@ -217,21 +522,30 @@ async def upload_file(file: UploadFile = File(...)):
         "message": "Starting analysis...",
         "filename": file.filename,
         "filepath": str(filepath),
+        "client": client_of(request),
         "start_time": datetime.now().isoformat(),
     }
+    if not preview:
+        lead(task_id, flight_key)
     persist(task_id)
 
     # Start analysis in background
-    asyncio.create_task(analyze_file(task_id, str(filepath), file.filename))
+    analysis_tasks[task_id]["_job"] = asyncio.create_task(
+        (preview_then_analyze if preview else analyze_file)(
+            task_id, str(filepath), file.filename, profile)
+    )
 
     return {"task_id": task_id, "filename": file.filename}
 
 
-@app.post("/api/download-url")
-async def download_url(request: URLDownloadRequest):
-    # Validate URL
-    if not request.url:
-        raise HTTPException(status_code=400, detail="URL is required")
+def submit_url(url: str, profile: bool = False, filename: str = "Downloading from URL...",
+               preview: bool = False, client: str = DEFAULT_CLIENT,
+               batch_id: Optional[str] = None) -> str:
+    """Start downloading and analysing `url`, or attach to its in-flight job."""
+    flight_key = url_key(url)
+    leader_id = in_flight.leader(flight_key)
+    if leader_id is not None and not preview:
+        return follow(leader_id, filename)
 
     # Generate task ID
     task_id = str(uuid.uuid4())
@@ -241,34 +555,169 @@ async def download_url(request: URLDownloadRequest):
         "status": "downloading",
         "progress": 0,
         "message": "Starting download...",
-        "filename": "Downloading from URL...",
-        "url": request.url,
+        "filename": filename,
+        "url": url,
+        "client": client,
         "start_time": datetime.now().isoformat(),
     }
+    if batch_id is not None:
+        analysis_tasks[task_id]["batch_id"] = batch_id
+    if not preview:
+        lead(task_id, flight_key)
     persist(task_id)
 
     # Start download and analysis in background
-    asyncio.create_task(download_and_analyze(task_id, request.url))
+    analysis_tasks[task_id]["_job"] = asyncio.create_task(
+        download_and_analyze(task_id, url, profile, preview=preview)
+    )
+    return task_id
 
+
+@app.post("/api/download-url")
+async def download_url(request: URLDownloadRequest, http_request: Request):
+    # Validate URL
+    if not request.url:
+        raise HTTPException(status_code=400, detail="URL is required")
+
+    task_id = submit_url(request.url, request.profile, preview=request.preview,
+                         client=client_of(http_request))
     return {"task_id": task_id, "url": request.url}
 
 
-async def download_and_analyze(task_id: str, url: str):
+@app.post("/api/batch")
+async def download_batch(request: BatchDownloadRequest, http_request: Request):
+    """Analyse many sets under one parent task.
+
+    Playlists and channels expand to their entries; each entry becomes an
+    ordinary URL task (see the parent's `children`), downloaded through the
+    shared download pool and analysed under the usual memory admission.
+    """
+    urls = [url.strip() for url in request.urls if url.strip()]
+    if not urls:
+        raise HTTPException(status_code=400, detail="At least one URL is required")
+    if len(urls) > MAX_BATCH_ENTRIES:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_BATCH_ENTRIES} URLs per batch")
+
+    batch_id = str(uuid.uuid4())
+    analysis_tasks[batch_id] = {
+        "status": "processing",
+        "progress": 0,
+        "message": "Reading playlists...",
+        "filename": f"Batch of {len(urls)} URL{'s' if len(urls) > 1 else ''}",
+        "batch": True,
+        "children": [],
+        "client": client_of(http_request),
+        "start_time": datetime.now().isoformat(),
+    }
+    persist(batch_id)
+    analysis_tasks[batch_id]["_job"] = asyncio.create_task(
+        run_batch(batch_id, urls, request.profile)
+    )
+    return {"task_id": batch_id, "urls": len(urls)}
+
+
+def batch_view(batch: dict) -> dict:
+    """Aggregate status of a batch's entries, read from their own tasks."""
+    children, progress, counts = [], 0, {}
+    for child in batch.get("children", []):
+        task = _load_task(child["task_id"])
+        _, view = _job_view(child["task_id"], task) if task else (None, {"status": "unknown"})
+        status = view.get("status", "unknown")
+        done = status not in NON_TERMINAL_STATUSES
+        counts[status] = counts.get(status, 0) + 1
+        progress += 100 if done else view.get("progress", 0)
+        children.append({
+            **child,
+            "status": status,
+            "progress": 100 if done else view.get("progress", 0),
+            "unique_tracks": view.get("unique_tracks"),
+            "json_output": view.get("json_output"),
+            "error": view.get("error"),
+        })
+    total = len(children)
+    finished = sum(n for status, n in counts.items() if status not in NON_TERMINAL_STATUSES)
+    return {
+        "children": children,
+        "progress": progress // total if total else 0,
+        "finished": finished,
+        "completed": counts.get("completed", 0),
+        "message": f"{finished} of {total} sets done"
+                   + (f", {finished - counts.get('completed', 0)} failed"
+                      if finished > counts.get("completed", 0) else ""),
+    }
+
+
+async def run_batch(batch_id: str, urls: List[str], profile: bool = False):
+    try:
+        entries, errors = await expand_urls(YTDLP_COMMAND, urls)
+        batch = analysis_tasks[batch_id]
+        batch["_download_ahead"] = asyncio.Semaphore(BATCH_DOWNLOAD_AHEAD)
+        for entry in entries:
+            child_id = submit_url(entry["url"], profile, filename=entry["title"],
+                                  client=batch.get("client", DEFAULT_CLIENT), batch_id=batch_id)
+            batch["children"].append({"task_id": child_id, **entry})
+        batch["expand_errors"] = errors
+        batch["message"] = f"Queued {len(entries)} sets"
+        persist(batch_id)
+
+        # Each entry's job is its own, or the one it coalesced onto.
+        jobs = set()
+        for child in batch["children"]:
+            job_id, _ = _job_view(child["task_id"], analysis_tasks[child["task_id"]])
+            job = analysis_tasks.get(job_id, {}).get("_job")
+            if job is not None:
+                jobs.add(job)
+        if jobs:
+            await asyncio.wait(jobs)
+
+        view = batch_view(analysis_tasks[batch_id])
+        finish_task(batch_id, {
+            **{k: v for k, v in batch.items() if not k.startswith("_")},
+            "status": "completed" if view["completed"] or not entries else "error",
+            "progress": 100,
+            "message": view["message"],
+            "children": view["children"],
+            "unique_tracks": sum(c["unique_tracks"] or 0 for c in view["children"]),
+            "error": None if view["completed"] else "No set in the batch could be analysed",
+            "end_time": datetime.now().isoformat(),
+        })
+    except Exception as e:
+        if is_cancelled(batch_id):
+            return
+        _report_exception(e, task_id=batch_id, stage="run_batch")
+        finish_task(batch_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Batch failed",
+            "error": str(e),
+            "filename": analysis_tasks[batch_id].get("filename"),
+            "batch": True,
+            "children": analysis_tasks[batch_id].get("children"),
+        })
+
+
+async def download_and_analyze(task_id: str, url: str, profile: bool = False,
+                               preview: bool = False):
     filepath = None
+    timestamp = None
+    # This task's record, even once a cancel or finish_task replaces it.
+    task = analysis_tasks[task_id]
     try:
         # Update status
         analysis_tasks[task_id]["status"] = "downloading"
         analysis_tasks[task_id]["message"] = "Downloading audio from URL..."
         analysis_tasks[task_id]["progress"] = 5
 
-        # Configure yt-dlp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Configure yt-dlp. The task id keeps parallel downloads that start
+        # in the same second from finding each other's files.
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{task_id[:8]}"
         output_filename = f"{timestamp}_%(title)s.%(ext)s"
         output_path = UPLOAD_FOLDER / output_filename
 
         # Use subprocess to call yt-dlp with remote components enabled
         cmd = [
-            sys.executable, "-m", "yt_dlp",
+            *YTDLP_COMMAND,
             "--remote-components", "ejs:github",
             "-f", "bestaudio/best",
             "-x",  # Extract audio
@@ -277,45 +726,61 @@ async def download_and_analyze(task_id: str, url: str):
             "-o", str(output_path),
             "--no-playlist",
             "--force-ipv4",
+            *download_pool.ytdlp_args(),
             "--newline",  # Force progress on new lines for parsing
             url
         ]
 
-        # Run yt-dlp and parse progress from stderr in real-time
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        # Read stderr line by line for progress updates
-        stderr_lines = []
-        while True:
-            line = await process.stderr.readline()
-            if not line:
-                break
-            line_str = line.decode(errors="replace").strip()
-            stderr_lines.append(line_str)
-
-            # Parse yt-dlp progress: [download]  45.2% of 5.23MiB ...
-            if "[download]" in line_str and "%" in line_str:
-                try:
-                    pct_str = line_str.split("%")[0].split()[-1]
-                    dl_pct = float(pct_str)
-                    # Map download 0-100% to progress 2-7%
-                    progress = 2 + int(dl_pct * 0.05)
-                    analysis_tasks[task_id]["progress"] = progress
-                    analysis_tasks[task_id]["message"] = f"Downloading audio... {dl_pct:.0f}%"
-                except (ValueError, IndexError):
-                    pass
-            elif "[ExtractAudio]" in line_str or "Post-process" in line_str:
-                analysis_tasks[task_id]["progress"] = 8
-                analysis_tasks[task_id]["message"] = "Converting to MP3..."
-            elif "[download] Destination:" in line_str:
-                analysis_tasks[task_id]["progress"] = 3
-                analysis_tasks[task_id]["message"] = "Downloading audio..."
-
-        await process.wait()
+        def mark_queued(position: int) -> None:
+            analysis_tasks[task_id]["status"] = "queued"
+            analysis_tasks[task_id]["message"] = "Waiting for a download slot..."
+            persist(task_id)
+
+        await hold_batch_download(task_id)
+        async with download_pool.slot(task_id, on_queued=mark_queued,
+                                      client=analysis_tasks[task_id].get("client", DEFAULT_CLIENT)):
+            analysis_tasks[task_id]["status"] = "downloading"
+            analysis_tasks[task_id]["message"] = "Downloading audio from URL..."
+
+            # Run yt-dlp and parse progress from stderr in real-time
+            # Own process group, so cancelling also kills yt-dlp's ffmpeg child.
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            analysis_tasks[task_id]["_process"] = process
+
+            # Read stderr line by line for progress updates
+            stderr_lines = []
+            while True:
+                line = await process.stderr.readline()
+                if not line:
+                    break
+                line_str = line.decode(errors="replace").strip()
+                stderr_lines.append(line_str)
+
+                # Parse yt-dlp progress: [download]  45.2% of 5.23MiB ...
+                if "[download]" in line_str and "%" in line_str:
+                    try:
+                        pct_str = line_str.split("%")[0].split()[-1]
+                        dl_pct = float(pct_str)
+                        # Map download 0-100% to progress 2-7%
+                        progress = 2 + int(dl_pct * 0.05)
+                        analysis_tasks[task_id]["progress"] = progress
+                        analysis_tasks[task_id]["message"] = f"Downloading audio... {dl_pct:.0f}%"
+                    except (ValueError, IndexError):
+                        pass
+                elif "[ExtractAudio]" in line_str or "Post-process" in line_str:
+                    analysis_tasks[task_id]["progress"] = 8
+                    analysis_tasks[task_id]["message"] = "Converting to MP3..."
+                elif "[download] Destination:" in line_str:
+                    analysis_tasks[task_id]["progress"] = 3
+                    analysis_tasks[task_id]["message"] = "Downloading audio..."
+
+            await process.wait()
+            analysis_tasks[task_id].pop("_process", None)
 
         if process.returncode != 0:
             error_msg = "\n".join(stderr_lines[-5:]) if stderr_lines else "Unknown error"
@@ -329,6 +794,7 @@ async def download_and_analyze(task_id: str, url: str):
 
         filepath = str(possible_files[0])
         filename = possible_files[0].name
+        metrics.TRANSFER_BYTES.inc(possible_files[0].stat().st_size, direction="download")
 
         # Update task with filename
         analysis_tasks[task_id]["filename"] = filename
@@ -340,38 +806,222 @@ async def download_and_analyze(task_id: str, url: str):
         analysis_tasks[task_id]["progress"] = 10
         persist(task_id)
 
-        await analyze_file(task_id, filepath, filename)
+        await (preview_then_analyze if preview else analyze_file)(
+            task_id, filepath, filename, profile)
 
     except Exception as e:
+        if is_cancelled(task_id):
+            return
         _report_exception(e, task_id=task_id, stage="download_and_analyze")
-        analysis_tasks[task_id] = {
+        finish_task(task_id, {
             "status": "error",
             "progress": 0,
             "message": "Download failed",
             "error": str(e),
             "filename": "Download failed",
-        }
-        persist(task_id)
+        })
         # Clean up if download failed
         if filepath and os.path.exists(filepath):
             try:
                 os.remove(filepath)
             except:
                 pass
+    finally:
+        release_batch_download(task)
+        # A failed or cancelled download leaves yt-dlp's .part/.ytdl files.
+        if timestamp is not None and filepath is None:
+            remove_partial_downloads(timestamp)
+
+
+async def hold_batch_download(task_id: str) -> None:
+    """Wait until the task's batch has fewer than BATCH_DOWNLOAD_AHEAD
+    entries downloaded or downloading but not yet admitted."""
+    task = analysis_tasks[task_id]
+    ahead = analysis_tasks.get(task.get("batch_id"), {}).get("_download_ahead")
+    if ahead is None:
+        return
+    if ahead.locked():
+        task["status"] = "queued"
+        task["message"] = "Waiting for earlier sets of the batch..."
+        persist(task_id)
+    await ahead.acquire()
+    task["_download_ahead"] = ahead
+
+
+def release_batch_download(task: dict) -> None:
+    """Let the next batch entry download: this one was admitted or failed."""
+    ahead = task.pop("_download_ahead", None)
+    if ahead is not None:
+        ahead.release()
+
+
+def remove_partial_downloads(prefix: str) -> None:
+    """Delete the files an unfinished yt-dlp run left under `prefix`."""
+    for leftover in UPLOAD_FOLDER.glob(f"{prefix}_*"):
+        leftover.unlink(missing_ok=True)
+
+
+def write_tracklists(base_name: str, tracks: List[dict]) -> Tuple[Path, Path]:
+    """Write the JSON and TXT tracklists for a finished analysis."""
+    json_output = OUTPUT_FOLDER / f"{base_name}_tracklist.json"
+    txt_output = OUTPUT_FOLDER / f"{base_name}_tracklist.txt"
+
+    # Check if file exists and add suffix if needed
+    counter = 1
+    while json_output.exists():
+        json_output = OUTPUT_FOLDER / f"{base_name}_tracklist({counter}).json"
+        txt_output = OUTPUT_FOLDER / f"{base_name}_tracklist({counter}).txt"
+        counter += 1
+
+    # Save JSON
+    with open(json_output, "w") as f:
+        json.dump(tracks, f, indent=2)
+
+    # Save TXT
+    with open(txt_output, "w") as f:
+        for track in tracks:
+            confidence = (
+                f" [{track['match_count']} matches]"
+                if "match_count" in track
+                else ""
+            )
+            f.write(
+                f"{track['start_time']} - {track['title']} - {track['artist']}{confidence}\n"
+            )
+    return json_output, txt_output
+
 
+async def admit(task_id: str, filepath: str) -> None:
+    """Wait until decoding `filepath` fits the memory budget; the caller
+    must `admission.release(task_id)` afterwards.
 
-async def analyze_file(task_id: str, filepath: str, original_filename: str):
+    Waits until this job's estimated peak memory fits next to the jobs
+    already running; waiting jobs are ordered by client and expected length
+    (src/scheduler.py). Only a file that couldn't fit even on an idle server
+    is rejected (ValueError).
+    """
+    duration = await duration_probe.probe_async(filepath)
+    file_size = os.path.getsize(filepath)
+    estimate = estimate_job_bytes(duration, TARGET_SR, file_size)
+    if not admission.fits_ever(estimate):
+        actual_min = int(duration // 60)
+        raise ValueError(
+            f"Audio too long for analysis: {actual_min} min exceeds the "
+            f"server memory budget. Please trim the file and retry."
+        )
+
+    await admission.acquire(task_id, estimate, on_queued=partial(mark_queued, task_id),
+                            client=analysis_tasks[task_id].get("client", DEFAULT_CLIENT),
+                            cost=expected_duration(duration, file_size))
+    analysis_tasks[task_id].pop("queue_position", None)
+    release_batch_download(analysis_tasks[task_id])
+
+
+def mark_queued(task_id: str, position: int) -> None:
+    """`on_queued` callback of admission: show the task waiting in line."""
+    analysis_tasks[task_id]["status"] = "queued"
+    analysis_tasks[task_id]["message"] = "Waiting for server capacity..."
+    analysis_tasks[task_id]["queue_position"] = position
+    persist(task_id)
+
+
+async def release_admission(task_id: str, analyzer=None, observe: bool = True) -> None:
+    """Free a job's admission slot once its executor work has returned.
+
+    A cancelled job unwinds at once, but a thread in the middle of a decode
+    or STFT holds its memory until the analyzer's next check; admitting the
+    next job before then would defeat the memory budget.
+    """
     try:
-        # Guard: reject files that would blow the container's memory budget.
-        # STFT memory scales with audio length; past this cap we'd crash uvicorn.
-        duration = probe_duration(filepath)
-        if duration and duration > MAX_AUDIO_DURATION_SECONDS:
-            max_min = MAX_AUDIO_DURATION_SECONDS // 60
-            actual_min = int(duration // 60)
-            raise ValueError(
-                f"Audio too long for analysis: {actual_min} min (max "
-                f"{max_min} min). Please trim the file and retry."
-            )
+        if analyzer is not None:
+            await analyzer.idle()
+    finally:
+        admission.release(task_id, observe=observe)
+
+
+async def preview_then_analyze(task_id: str, filepath: str, original_filename: str,
+                               profile: bool = False):
+    """Segment the set and publish a preview (src/preview.py), then analyse
+    it once the user confirms, or drop it after PREVIEW_TTL_SECONDS."""
+    confirmed = analysis_tasks[task_id]["_confirm"] = asyncio.Event()
+    admitted, analyzer = False, None
+    try:
+        await admit(task_id, filepath)
+        admitted = True
+        analysis_tasks[task_id]["status"] = "processing"
+        analysis_tasks[task_id]["message"] = "Decoding audio for the preview..."
+        analysis_tasks[task_id]["progress"] = 5
+        persist(task_id)
+
+        from src.preview import build_preview
+        from src.shazamer import DJSetAnalyzer
+
+        class PreviewAnalyzer(DJSetAnalyzer):
+            def _on_stage(self, stage: str) -> None:
+                message, _ = DETECTION_STAGES[stage]
+                analysis_tasks[task_id]["message"] = message
+                persist(task_id)
+
+        # Full-resolution detection even for sets the cascade would take:
+        # its coarse curve could be re-segmented, but confirming would run
+        # the cascade again.
+        analyzer = PreviewAnalyzer(filepath, target_sr=TARGET_SR, client_id=task_id,
+                                   feature_workers=FEATURE_WORKERS, cascade_min_seconds=None)
+        analysis_tasks[task_id]["_analyzer"] = analyzer
+        with tracing.transaction("preview_file", task_id=task_id):
+            preview = await analyzer._run_in_executor(build_preview, analyzer)
+    except Exception as e:
+        Path(filepath).unlink(missing_ok=True)
+        if is_cancelled(task_id):
+            return
+        _report_exception(e, task_id=task_id, stage="preview_file")
+        finish_task(task_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Preview failed",
+            "error": str(e),
+            "filename": original_filename,
+        })
+        return
+    finally:
+        # The decoded audio is gone: don't hold memory while the user decides.
+        if admitted:
+            await release_admission(task_id, analyzer, observe=False)
+
+    task = analysis_tasks[task_id]
+    task.update({
+        "status": "preview",
+        "progress": 0,
+        "message": f"Found {preview['segments']} segments. Confirm to identify them",
+        "total_segments": preview["segments"],
+        "preview": preview,
+        "feature_key": analyzer.feature_track_key,
+    })
+    task.pop("_analyzer", None)
+    persist(task_id)
+
+    try:
+        await asyncio.wait_for(confirmed.wait(), PREVIEW_TTL_SECONDS)
+    except asyncio.TimeoutError:
+        Path(filepath).unlink(missing_ok=True)
+        finish_task(task_id, {**_cancelled_record(analysis_tasks[task_id]),
+                              "message": "Preview expired before it was confirmed"})
+        logger.info("Preview %s expired", task_id)
+        return
+
+    params = analysis_tasks[task_id].get("confirm_params", {})
+    await analyze_file(task_id, filepath, original_filename, profile,
+                       min_song_duration=params.get("min_song_duration"),
+                       peak_threshold=params.get("threshold"))
+
+
+async def analyze_file(task_id: str, filepath: str, original_filename: str,
+                       profile: bool = False, min_song_duration: Optional[int] = None,
+                       peak_threshold: Optional[float] = None):
+    admitted, analyzer, completed = False, None, False
+    try:
+        await admit(task_id, filepath)
+        admitted = True
 
         # Update status
         analysis_tasks[task_id]["status"] = "processing"
@@ -381,6 +1031,11 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
         analysis_tasks[task_id]["total_segments"] = 0
         persist(task_id)
 
+        # Heavy import (librosa, scipy): already loaded by boot() unless this
+        # job arrived within the first seconds after startup.
+        from src.shazamer import DJSetAnalyzer
+        from src.recognizer_backends import RECOGNIZER_BACKEND, create_backend
+
         # Create custom analyzer with progress callback
         class ProgressAnalyzer(DJSetAnalyzer):
             def __init__(self, *args, **kwargs):
@@ -399,11 +1054,10 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
                 analysis_tasks[self.task_id]["progress"] = 12
                 return result
 
-            async def recognize_segment(
-                self, audio_path: str, start_time: float
-            ) -> Optional[Dict]:
-                # Update progress for each segment
-                self.current_segment += 1
+            def _on_segment(self, index: int, total: int) -> None:
+                # Every segment counts, including those reusing a cluster's match
+                self.current_segment = index + 1
+                self.total_segments = total
                 progress = 25 + int(
                     (self.current_segment / self.total_segments) * 65
                 )  # 25-90% for recognition
@@ -414,57 +1068,16 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
                 ] = f"Identifying track {self.current_segment}/{self.total_segments}..."
                 analysis_tasks[self.task_id]["current_segment"] = self.current_segment
                 analysis_tasks[self.task_id]["total_segments"] = self.total_segments
+                persist(self.task_id)
 
-                return await super().recognize_segment(audio_path, start_time)
-
-            def detect_song_boundaries(
-                self, audio_data: np.ndarray, sample_rate: int
-            ) -> List[int]:
-                import librosa as _librosa
-                from scipy.ndimage import gaussian_filter1d
-                from scipy.signal import find_peaks as _find_peaks
-
-                # Step 1: Spectral centroid
-                analysis_tasks[self.task_id]["message"] = "Computing spectral centroid..."
-                analysis_tasks[self.task_id]["progress"] = 14
-                spectral_centroid = _librosa.feature.spectral_centroid(y=audio_data, sr=sample_rate)[0]
-
-                # Step 2: RMS energy
-                analysis_tasks[self.task_id]["message"] = "Computing RMS energy..."
-                analysis_tasks[self.task_id]["progress"] = 16
-                rms_energy = _librosa.feature.rms(y=audio_data)[0]
-
-                # Step 3: Normalization & gradient
-                analysis_tasks[self.task_id]["message"] = "Analyzing frequency transitions..."
-                analysis_tasks[self.task_id]["progress"] = 18
-                spectral_centroid_norm = (spectral_centroid - np.mean(spectral_centroid)) / np.std(spectral_centroid)
-                rms_energy_norm = (rms_energy - np.mean(rms_energy)) / np.std(rms_energy)
-                combined_feature = np.abs(np.gradient(spectral_centroid_norm)) + np.abs(np.gradient(rms_energy_norm))
-
-                # Step 4: Smoothing & peak detection
-                analysis_tasks[self.task_id]["message"] = "Detecting song boundaries..."
-                analysis_tasks[self.task_id]["progress"] = 20
-                combined_feature_smooth = gaussian_filter1d(combined_feature, sigma=10)
-                percentile_threshold = (1 - self.peak_threshold) * 100
-                peaks, _ = _find_peaks(
-                    combined_feature_smooth,
-                    height=np.percentile(combined_feature_smooth, percentile_threshold),
-                    distance=int(self.min_song_duration * sample_rate / 512),
-                )
-
-                # Build boundaries
-                hop_length = 512
-                boundaries = [0]
-                for peak in peaks:
-                    boundaries.append(peak * hop_length)
-                boundaries.append(len(audio_data))
+            def _on_stage(self, stage: str) -> None:
+                message, progress = DETECTION_STAGES[stage]
+                analysis_tasks[self.task_id]["message"] = message
+                analysis_tasks[self.task_id]["progress"] = progress
+                persist(self.task_id)
 
-                filtered_boundaries = [boundaries[0]]
-                for i in range(1, len(boundaries)):
-                    if (boundaries[i] - filtered_boundaries[-1]) / sample_rate >= self.min_song_duration:
-                        filtered_boundaries.append(boundaries[i])
-                if filtered_boundaries[-1] != boundaries[-1]:
-                    filtered_boundaries[-1] = boundaries[-1]
+            def detect_song_boundaries(self, audio_data, sample_rate: int) -> List[int]:
+                filtered_boundaries = super().detect_song_boundaries(audio_data, sample_rate)
 
                 self.total_segments = len(filtered_boundaries) - 1
                 analysis_tasks[self.task_id]["total_segments"] = self.total_segments
@@ -474,11 +1087,19 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
                 return filtered_boundaries
 
         # Create analyzer
-        analyzer = ProgressAnalyzer(filepath, debug=False)
+        analyzer = ProgressAnalyzer(
+            filepath, debug=False, target_sr=TARGET_SR, client_id=task_id,
+            feature_workers=FEATURE_WORKERS, recognizer=create_backend(RECOGNIZER_BACKEND),
+            min_song_duration=min_song_duration, peak_threshold=peak_threshold,
+        )
         analyzer.task_id = task_id
+        analysis_tasks[task_id]["_analyzer"] = analyzer
 
         # Run analysis
-        results = await analyzer.analyze()
+        with tracing.transaction("analyze_file", task_id=task_id), \
+                tracing.profile_job(task_id, tracing.profiling_enabled(profile)):
+            async with metrics.PeakRSSSampler():
+                results = await analyzer.analyze()
 
         # Update progress for deduplication
         analysis_tasks[task_id]["progress"] = 95
@@ -495,36 +1116,13 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
                 seen_tracks.add(track_key)
                 deduplicated_results.append(track)
 
-        # Save results
-        base_name = Path(original_filename).stem
-        json_output = OUTPUT_FOLDER / f"{base_name}_tracklist.json"
-        txt_output = OUTPUT_FOLDER / f"{base_name}_tracklist.txt"
-
-        # Check if file exists and add suffix if needed
-        counter = 1
-        while json_output.exists():
-            json_output = OUTPUT_FOLDER / f"{base_name}_tracklist({counter}).json"
-            txt_output = OUTPUT_FOLDER / f"{base_name}_tracklist({counter}).txt"
-            counter += 1
-
-        # Save JSON
-        with open(json_output, "w") as f:
-            json.dump(deduplicated_results, f, indent=2)
-
-        # Save TXT
-        with open(txt_output, "w") as f:
-            for track in deduplicated_results:
-                confidence = (
-                    f" [{track['match_count']} matches]"
-                    if "match_count" in track
-                    else ""
-                )
-                f.write(
-                    f"{track['start_time']} - {track['title']} - {track['artist']}{confidence}\n"
-                )
+        # Save results (file I/O off the event loop)
+        json_output, txt_output = await asyncio.get_running_loop().run_in_executor(
+            None, write_tracklists, Path(original_filename).stem, deduplicated_results
+        )
 
         # Update task status
-        analysis_tasks[task_id] = {
+        finish_task(task_id, {
             "status": "completed",
             "progress": 100,
             "message": f"Found {len(deduplicated_results)} unique tracks",
@@ -536,20 +1134,29 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
             "total_segments": analyzer.total_segments,
             "unique_tracks": len(deduplicated_results),
             "total_tracks_found": len(results),
-        }
-        persist(task_id)
+            "failed_segments": len(analyzer.failed_segments),
+            "feature_key": analyzer.feature_track_key,
+            "preview": analysis_tasks[task_id].get("preview"),
+        })
+        completed = True
 
     except Exception as e:
+        # A cancelled job unwinds with AnalysisCancelled (or whatever the
+        # interrupted stage raised); its status is already recorded.
+        if is_cancelled(task_id):
+            return
         _report_exception(e, task_id=task_id, stage="analyze_file")
-        analysis_tasks[task_id] = {
+        finish_task(task_id, {
             "status": "error",
             "progress": 0,
             "message": "Analysis failed",
             "error": str(e),
             "filename": original_filename,
-        }
-        persist(task_id)
+        })
     finally:
+        if admitted:
+            # Only a full run says how long a second of audio takes.
+            await release_admission(task_id, analyzer, observe=completed)
         # Clean up uploaded file
         try:
             os.remove(filepath)
@@ -557,17 +1164,172 @@ async def analyze_file(task_id: str, filepath: str, original_filename: str):
             pass
 
 
-@app.get("/api/status/{task_id}", response_model=TaskStatus)
-async def get_task_status(task_id: str):
+@app.post("/api/live")
+async def start_live(request: LiveStreamRequest, http_request: Request):
+    """Identify the tracks of an HTTP/Icecast stream as they play."""
+    url = request.url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise HTTPException(status_code=400, detail="Give an http(s) stream URL")
+    if LIVE_STREAM_HOSTS and (parts.hostname or "").lower() not in LIVE_STREAM_HOSTS:
+        raise HTTPException(status_code=403, detail="Streams from this host are not allowed")
+    running = sum(1 for task in analysis_tasks.values()
+                  if task.get("live") and task.get("status") in NON_TERMINAL_STATUSES)
+    if running >= MAX_LIVE_STREAMS:
+        raise HTTPException(status_code=429,
+                            detail=f"Already analyzing {running} live streams, try again later")
+
+    task_id = str(uuid.uuid4())
+    analysis_tasks[task_id] = {
+        "status": "processing",
+        "progress": 0,
+        "message": "Connecting to stream...",
+        "filename": url,
+        "live": True,
+        "results": [],
+        "client": client_of(http_request),
+        "start_time": datetime.now().isoformat(),
+    }
+    persist(task_id)
+    analysis_tasks[task_id]["_job"] = asyncio.create_task(
+        run_live(task_id, url, request.min_song_duration, request.threshold)
+    )
+    return {"task_id": task_id, "filename": url}
+
+
+@app.post("/api/live/{task_id}/stop", response_model=TaskStatus)
+async def stop_live(task_id: str):
+    """End a live analysis here: pending excerpts are still identified and
+    the tracklist is written, unlike DELETE /api/tasks/{task_id}."""
+    task = analysis_tasks.get(task_id)
+    if task is None or not task.get("live"):
+        raise HTTPException(status_code=404, detail="Live task not found")
+    analyzer = task.get("_analyzer")
+    if analyzer is not None:
+        analyzer.stop()
+        task["message"] = "Stopping: identifying the last excerpts..."
+    return await get_task_status(task_id)
+
+
+async def run_live(task_id: str, url: str, min_song_duration: Optional[int] = None,
+                   threshold: Optional[float] = None):
+    admitted = False
+    try:
+        # A stream holds its share of memory for as long as it plays, so it
+        # waits its turn like any other job.
+        await admission.acquire(task_id, LIVE_STREAM_BYTES, on_queued=partial(mark_queued, task_id),
+                                client=analysis_tasks[task_id].get("client", DEFAULT_CLIENT))
+        admitted = True
+        task = analysis_tasks[task_id]
+        task.pop("queue_position", None)
+        task.update(status="processing", message="Connecting to stream...")
+        persist(task_id)
+
+        from src.live import LiveAnalyzer
+        from src.recognizer_backends import RECOGNIZER_BACKEND, create_backend
+        from src.shazamer import format_timestamp
+
+        class TaskLiveAnalyzer(LiveAnalyzer):
+            def _on_track(self, track: Dict) -> None:
+                task = analysis_tasks[task_id]
+                task["results"] = [*task["results"], track]
+                task["unique_tracks"] = len(task["results"])
+                persist(task_id)
+
+            def _on_progress(self, analyzed_seconds: float) -> None:
+                task = analysis_tasks[task_id]
+                task["message"] = (f"Live: {format_timestamp(analyzed_seconds)} analyzed, "
+                                   f"{len(task['results'])} tracks identified")
+                persist(task_id)
+
+        analyzer = TaskLiveAnalyzer(
+            url, target_sr=TARGET_SR, client_id=task_id, min_song_duration=min_song_duration,
+            peak_threshold=threshold, recognizer=create_backend(RECOGNIZER_BACKEND),
+        )
+        analysis_tasks[task_id]["_analyzer"] = analyzer
+        with tracing.transaction("live_stream", task_id=task_id):
+            tracks = await analyzer.analyze()
+
+        parts = urlsplit(url)
+        base_name = "live_" + (Path(parts.path).stem or parts.netloc)
+        json_output, txt_output = await asyncio.get_running_loop().run_in_executor(
+            None, write_tracklists, base_name, tracks
+        )
+        finish_task(task_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": f"Stream ended after {format_timestamp(analyzer.analyzed_seconds)}: "
+                       f"{len(tracks)} tracks",
+            "results": tracks,
+            "json_output": str(json_output),
+            "txt_output": str(txt_output),
+            "filename": url,
+            "live": True,
+            "end_time": datetime.now().isoformat(),
+            "unique_tracks": len(tracks),
+            "total_tracks_found": len(tracks),
+            "failed_segments": len(analyzer.failed_segments),
+        })
+    except Exception as e:
+        if is_cancelled(task_id):
+            return
+        _report_exception(e, task_id=task_id, stage="run_live")
+        finish_task(task_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Live analysis failed",
+            "error": str(e),
+            "filename": url,
+            "live": True,
+            "results": analysis_tasks[task_id].get("results"),
+        })
+    finally:
+        if admitted:
+            # Its run time says nothing about how long a set takes to analyse.
+            admission.release(task_id, observe=False)
+
+
+def _load_task(task_id: str) -> Optional[dict]:
     task = analysis_tasks.get(task_id)
     if task is None:
         # Fallback to disk: the process may have restarted while analysis was in
         # flight (OOM, redeploy). The disk copy was marked 'interrupted' at
         # startup, so the frontend sees a clean error instead of a 404.
         task = task_store.load(task_id)
-        if task is None:
-            raise HTTPException(status_code=404, detail="Task not found")
-        analysis_tasks[task_id] = task
+        if task is not None:
+            analysis_tasks[task_id] = task
+    return task
+
+
+def _job_view(task_id: str, task: dict):
+    """(job id, state) a task reports: its leader's job for followers."""
+    if "follow" in task:
+        leader_id = task["follow"]
+        leader = _load_task(leader_id) or {
+            "status": "error", "progress": 0, "message": "Analysis failed",
+            "error": "Shared job was lost", "filename": task.get("filename"),
+        }
+        return leader_id, leader
+    if task.get("owner_cancelled"):
+        # Still running for followers, but not for this task's owner.
+        return task_id, _cancelled_record(task)
+    return task_id, task
+
+
+@app.get("/api/status/{task_id}", response_model=TaskStatus)
+async def get_task_status(task_id: str):
+    task = _load_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    job_id, task = _job_view(task_id, task)
+    if task.get("batch") and task.get("status") in NON_TERMINAL_STATUSES and task.get("children"):
+        task = {**task, **batch_view(task)}
+
+    queue_position = eta = None
+    if task.get("status") == "queued":
+        queue = admission if admission.position(job_id) else download_pool
+        queue_position = queue.position(job_id)
+        eta = queue.eta(job_id)
 
     return TaskStatus(
         task_id=task_id,
@@ -583,6 +1345,172 @@ async def get_task_status(task_id: str):
         total_segments=task.get("total_segments"),
         unique_tracks=task.get("unique_tracks"),
         total_tracks_found=task.get("total_tracks_found"),
+        failed_segments=task.get("failed_segments"),
+        queue_position=queue_position,
+        eta_seconds=round(eta) if eta is not None else None,
+        coalesced=True if job_id != task_id or task.get("coalesced") else None,
+        live=task.get("live"),
+        children=task.get("children"),
+    )
+
+
+@app.delete("/api/tasks/{task_id}", response_model=TaskStatus)
+async def cancel_task(task_id: str):
+    """Stop a task that hasn't finished and record it as cancelled.
+
+    Kills yt-dlp, cancels the job coroutine (which frees its admission slot
+    and deletes the upload) and tells the analyzer to stop executor work at
+    its next stage boundary. A job shared by coalesced submissions keeps
+    running until every one of them has cancelled. Cancelling a batch
+    cancels its unfinished entries.
+    """
+    task = _load_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    job_id, view = _job_view(task_id, task)
+    if view.get("status") not in NON_TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task already {view.get('status')}")
+
+    if job_id != task_id:
+        # A follower only detaches; the job stops once nobody is left on it.
+        analysis_tasks[task_id] = _cancelled_record(task)
+        persist(task_id)
+        leader = analysis_tasks.get(job_id, {})
+        followers = leader.get("_followers", [])
+        if task_id in followers:
+            followers.remove(task_id)
+        if leader.get("owner_cancelled") and not followers:
+            await _cancel_job(job_id, leader)
+    elif task.get("_followers"):
+        # Others coalesced onto this job: keep it running for them.
+        task["owner_cancelled"] = True
+        persist(task_id)
+    else:
+        await _cancel_job(task_id, task)
+
+    for child in task.get("children", []):
+        child_task = _load_task(child["task_id"])
+        if child_task is not None and _job_view(child["task_id"], child_task)[1].get(
+                "status") in NON_TERMINAL_STATUSES:
+            await cancel_task(child["task_id"])
+
+    logger.info("Task %s cancelled", task_id)
+    return await get_task_status(task_id)
+
+
+async def _cancel_job(task_id: str, task: dict) -> None:
+    # Record the terminal status first: everything below makes the job
+    # unwind through its error paths, which check for it.
+    in_flight.release(task.get("_flight_key"), task_id)
+    analysis_tasks[task_id] = _cancelled_record(task)
+    persist(task_id)
+
+    analyzer = task.get("_analyzer")
+    if analyzer is not None:
+        analyzer.cancel()
+    process = task.get("_process")
+    if process is not None:
+        _kill_process_group(process)
+    job = task.get("_job")
+    if job is not None and not job.done():
+        job.cancel()
+        await asyncio.wait({job}, timeout=CANCEL_GRACE_SECONDS)
+    # A job cancelled before it first ran never reaches its own cleanup.
+    if task.get("filepath"):
+        Path(task["filepath"]).unlink(missing_ok=True)
+
+
+@app.get("/api/tasks/{task_id}/preview")
+async def get_preview(task_id: str):
+    """Boundaries and waveform overview of a task submitted with preview."""
+    task = _load_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    preview = task.get("preview")
+    if preview is None:
+        raise HTTPException(status_code=409,
+                            detail=f"No preview for this task (status: {task.get('status')})")
+    return {"task_id": task_id, **preview}
+
+
+@app.post("/api/tasks/{task_id}/confirm", response_model=TaskStatus)
+async def confirm_preview(task_id: str, request: Optional[ConfirmRequest] = None):
+    """Start recognition of a previewed set, optionally with other detection
+    parameters (try them first with the resegment endpoint)."""
+    task = _load_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.get("status") != "preview" or "_confirm" not in task:
+        raise HTTPException(status_code=409,
+                            detail=f"Task is not awaiting confirmation (status: {task.get('status')})")
+    request = request or ConfirmRequest()
+    if request.threshold is not None and not 0 < request.threshold <= 1 or \
+            request.min_song_duration is not None and request.min_song_duration <= 0:
+        raise HTTPException(status_code=400,
+                            detail="Threshold must be in (0, 1], min duration positive")
+    task["confirm_params"] = request.model_dump()
+    task["status"] = "pending"
+    task["message"] = "Starting recognition..."
+    persist(task_id)
+    task["_confirm"].set()
+    return await get_task_status(task_id)
+
+
+@app.post("/api/tasks/{task_id}/resegment")
+async def resegment_task(task_id: str, request: ResegmentRequest):
+    """Boundaries of a completed or previewed task's set for other detection
+    parameters.
+
+    Works from the set's cached transition curve: no download, decode or
+    recognition, so a whole grid of parameters answers in milliseconds.
+    """
+    task = _load_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    _, task = _job_view(task_id, task)
+    if not request.thresholds or not request.min_song_durations:
+        raise HTTPException(status_code=400, detail="Give at least one threshold and min duration")
+    if len(request.thresholds) * len(request.min_song_durations) > MAX_RESEGMENT_COMBINATIONS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_RESEGMENT_COMBINATIONS} parameter combinations")
+    if any(t is not None and not 0 < t <= 1 for t in request.thresholds) or \
+            any(d is not None and d <= 0 for d in request.min_song_durations):
+        raise HTTPException(status_code=400,
+                            detail="Thresholds must be in (0, 1], min durations positive")
+    key = task.get("feature_key")
+    if not key:
+        raise HTTPException(status_code=409, detail="No transition curve was cached for this task")
+
+    from src.feature_tracks import get_feature_cache, sweep
+
+    def run():
+        cache = get_feature_cache()
+        track = cache.get(key) if cache is not None else None
+        if track is None:
+            return None
+        return track.duration, sweep(track, request.thresholds, request.min_song_durations)
+
+    outcome = await asyncio.get_running_loop().run_in_executor(None, run)
+    if outcome is None:
+        raise HTTPException(status_code=409, detail="The cached transition curve has expired")
+    duration, results = outcome
+    return {"task_id": task_id, "duration": duration, "results": results}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of pipeline, queue and transfer metrics."""
+    states = {"active": 0, "queued": 0}
+    for task in analysis_tasks.values():
+        status = task.get("status")
+        if status in ("downloading", "processing"):
+            states["active"] += 1
+        elif status in ("pending", "queued"):
+            states["queued"] += 1
+    for state, count in states.items():
+        metrics.TASKS.set(count, state=state)
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
     )
 
 
@@ -610,11 +1538,10 @@ async def download_result(task_id: str, format: str):
     return FileResponse(filepath, filename=os.path.basename(filepath))
 
 
-@app.get("/api/recent", response_model=List[AnalysisResult])
-async def get_recent_analyses():
+def _list_recent_analyses(json_files: List[Path]) -> List[dict]:
     output_files = []
 
-    for json_file in OUTPUT_FOLDER.glob("*_tracklist.json"):
+    for json_file in json_files:
         try:
             with open(json_file) as f:
                 data = json.load(f)
@@ -637,21 +1564,94 @@ async def get_recent_analyses():
     # Sort by creation time (newest first)
     output_files.sort(key=lambda x: x.created, reverse=True)
 
-    return output_files[:10]  # Return last 10
+    return jsonable_encoder(output_files[:10])  # Return last 10
+
+
+@app.get("/api/recent", response_model=List[AnalysisResult])
+async def get_recent_analyses(request: Request):
+    # Validated by the outputs listing itself: the JSON files are only parsed
+    # again when one is added, removed or rewritten.
+    json_files = sorted(OUTPUT_FOLDER.glob("*_tracklist.json"))
+    fp = http_cache.fingerprint(json_files + [f.with_suffix(".txt") for f in json_files])
+    return http_cache.cached_json(
+        request, _recent_cache, "recent", fp, lambda: _list_recent_analyses(json_files)
+    )
 
 
 @app.get("/outputs/{filename}")
-async def serve_output_file(filename: str):
+async def serve_output_file(filename: str, request: Request):
     """Serve files from the outputs directory"""
     filepath = OUTPUT_FOLDER / filename
     if not filepath.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(filepath, filename=filename)
+    return http_cache.file_response(request, filepath, filename=filename)
+
+
+def _render_view(filename: str, filepath: Path, json_filepath: Path) -> dict:
+    """Render a tracklist TXT as HTML lines, linking titles found in its JSON."""
+    # Try to load corresponding JSON file to get URLs
+    tracks_data = {}
+
+    if json_filepath.exists():
+        with open(json_filepath, "r", encoding="utf-8") as f:
+            tracks = json.load(f)
+            # Create a lookup by artist and title
+            for track in tracks:
+                key = f"{track.get('title', '')} - {track.get('artist', '')}"
+                tracks_data[key] = track.get("shazam_url", "")
+
+    # Read the text file and enhance it with links
+    with open(filepath, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+
+    enhanced_content = []
+    for line in lines:
+        line = line.strip()
+        if line and " - " in line:
+            # Extract time, title, and artist
+            parts = line.split(" - ", 2)
+            if len(parts) >= 3:
+                time_part = parts[0]
+                title = parts[1]
+                artist_and_confidence = parts[2]
+
+                # Remove confidence info from artist
+                artist = (
+                    artist_and_confidence.split(" [")[0]
+                    if " [" in artist_and_confidence
+                    else artist_and_confidence
+                )
+                confidence = (
+                    " [" + artist_and_confidence.split(" [")[1]
+                    if " [" in artist_and_confidence
+                    else ""
+                )
+
+                # Look for URL
+                key = f"{title} - {artist}"
+                url = tracks_data.get(key, "")
+
+                if url:
+                    enhanced_line = f"{time_part} - <a href='{url}' target='_blank' style='color: #667eea; text-decoration: none; border-bottom: 1px dotted #667eea;'>{title}</a> - {artist}{confidence}"
+                else:
+                    enhanced_line = line
+
+                enhanced_content.append(enhanced_line)
+            else:
+                enhanced_content.append(line)
+        else:
+            enhanced_content.append(line)
+
+    return {
+        "content": "\n".join(enhanced_content),
+        "filename": filename,
+        "is_html": True,
+    }
 
 
 @app.get("/api/view/{filename}")
-async def view_file_content(filename: str):
+async def view_file_content(filename: str, request: Request):
     """Return the content of a text file with enhanced HTML formatting"""
     filepath = OUTPUT_FOLDER / filename
     if not filepath.exists():
@@ -660,67 +1660,13 @@ async def view_file_content(filename: str):
     if not filename.endswith(".txt"):
         raise HTTPException(status_code=400, detail="Only .txt files can be viewed")
 
+    json_filepath = OUTPUT_FOLDER / filename.replace(".txt", ".json")
+    fp = http_cache.fingerprint([filepath, json_filepath])
     try:
-        # Try to load corresponding JSON file to get URLs
-        json_filename = filename.replace(".txt", ".json")
-        json_filepath = OUTPUT_FOLDER / json_filename
-        tracks_data = {}
-
-        if json_filepath.exists():
-            with open(json_filepath, "r", encoding="utf-8") as f:
-                tracks = json.load(f)
-                # Create a lookup by artist and title
-                for track in tracks:
-                    key = f"{track.get('title', '')} - {track.get('artist', '')}"
-                    tracks_data[key] = track.get("shazam_url", "")
-
-        # Read the text file and enhance it with links
-        with open(filepath, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        enhanced_content = []
-        for line in lines:
-            line = line.strip()
-            if line and " - " in line:
-                # Extract time, title, and artist
-                parts = line.split(" - ", 2)
-                if len(parts) >= 3:
-                    time_part = parts[0]
-                    title = parts[1]
-                    artist_and_confidence = parts[2]
-
-                    # Remove confidence info from artist
-                    artist = (
-                        artist_and_confidence.split(" [")[0]
-                        if " [" in artist_and_confidence
-                        else artist_and_confidence
-                    )
-                    confidence = (
-                        " [" + artist_and_confidence.split(" [")[1]
-                        if " [" in artist_and_confidence
-                        else ""
-                    )
-
-                    # Look for URL
-                    key = f"{title} - {artist}"
-                    url = tracks_data.get(key, "")
-
-                    if url:
-                        enhanced_line = f"{time_part} - <a href='{url}' target='_blank' style='color: #667eea; text-decoration: none; border-bottom: 1px dotted #667eea;'>{title}</a> - {artist}{confidence}"
-                    else:
-                        enhanced_line = line
-
-                    enhanced_content.append(enhanced_line)
-                else:
-                    enhanced_content.append(line)
-            else:
-                enhanced_content.append(line)
-
-        return {
-            "content": "\n".join(enhanced_content),
-            "filename": filename,
-            "is_html": True,
-        }
+        return http_cache.cached_json(
+            request, _view_cache, filename, fp,
+            lambda: _render_view(filename, filepath, json_filepath),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
 
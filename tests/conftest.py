@@ -3,7 +3,9 @@ from unittest.mock import patch, AsyncMock
 import pytest
 from httpx import AsyncClient, ASGITransport
 
-from src.web import app, analysis_tasks
+from src import feature_tracks, http_cache, web
+from src.task_store import TaskStore
+from src.web import app, analysis_tasks, in_flight
 
 
 @pytest.fixture
@@ -38,7 +40,47 @@ async def client():
 
 @pytest.fixture(autouse=True)
 def clear_tasks():
-    """Clear analysis tasks between tests."""
+    """Clear analysis tasks (and the jobs they lead) between tests."""
     analysis_tasks.clear()
+    in_flight.clear()
     yield
     analysis_tasks.clear()
+    in_flight.clear()
+
+
+@pytest.fixture(autouse=True)
+def _private_feature_cache(tmp_path, monkeypatch):
+    """Keep cached transition curves out of the repo's tmp/ and apart between tests."""
+    monkeypatch.setattr(feature_tracks, "_cache", feature_tracks.FeatureTrackCache(tmp_path / "feature_tracks"))
+
+
+@pytest.fixture(autouse=True)
+def _private_http_cache(tmp_path, monkeypatch):
+    """Precompressed responses go to the test's tmp_path, not the repo's tmp/."""
+    monkeypatch.setattr(http_cache, "COMPRESSED_DIR", tmp_path / "http_cache")
+
+
+@pytest.fixture(autouse=True)
+def _private_task_store(tmp_path_factory, monkeypatch):
+    """Task records go to a temporary directory, not the repo's tmp/tasks,
+    where the next startup would list them as history and sweep them."""
+    store = TaskStore(tmp_path_factory.mktemp("tasks"))
+    monkeypatch.setattr(web, "TASK_STORE_DIR", store.dir)
+    monkeypatch.setattr(web, "task_store", store)
+    yield
+    store.flush(timeout=5)
+
+
+@pytest.fixture
+def stub_analyzer(tmp_path):
+    """Factory of DJSetAnalyzers over given audio and boundaries: no decoding,
+    no boundary detection and no local fingerprint index."""
+    from src.shazamer import DJSetAnalyzer
+
+    def make(audio, boundaries, sample_rate=22050, **kwargs):
+        analyzer = DJSetAnalyzer(str(tmp_path / "set.wav"), fingerprint_index=None, **kwargs)
+        analyzer.load_audio = lambda: (audio, sample_rate)
+        analyzer.detect_song_boundaries = lambda y, sr: boundaries
+        return analyzer
+
+    return make
@@ -0,0 +1,79 @@
+"""Tests for memory-budget admission control."""
+import asyncio
+
+import pytest
+
+from src.admission import MB, AdmissionController, estimate_job_bytes
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_estimate_scales_with_duration_and_sample_rate():
+    one_hour = estimate_job_bytes(3600, 22050)
+    two_hours = estimate_job_bytes(7200, 22050)
+    low_sr = estimate_job_bytes(3600, 11025)
+
+    assert two_hours > one_hour > low_sr
+    # Documented calibration point: a 2h set at 22050 Hz peaks around 2 GB.
+    assert 1500 * MB < two_hours < 2600 * MB
+
+
+def test_estimate_falls_back_to_file_size_when_duration_unknown():
+    assert estimate_job_bytes(0, 22050, file_size=60 * MB) > estimate_job_bytes(0, 22050)
+
+
+async def test_jobs_wait_until_budget_frees_up():
+    controller = AdmissionController(budget_bytes=100)
+    await controller.acquire("a", 60)
+    positions = []
+
+    waiter = asyncio.create_task(controller.acquire("b", 60, on_queued=positions.append))
+    await asyncio.sleep(0)
+
+    assert positions == [1]
+    assert controller.position("b") == 1
+    assert not waiter.done()
+
+    controller.release("a")
+    await asyncio.wait_for(waiter, timeout=1)
+    assert controller.position("b") is None
+    assert controller.stats()["in_use_bytes"] == 60
+
+
+async def test_queue_is_fifo_so_big_jobs_are_not_starved():
+    controller = AdmissionController(budget_bytes=100)
+    await controller.acquire("running", 50)
+    big = asyncio.create_task(controller.acquire("big", 90))
+    await asyncio.sleep(0)
+    small = asyncio.create_task(controller.acquire("small", 20))
+    await asyncio.sleep(0)
+
+    # "small" would fit right now but must not jump ahead of "big".
+    assert not small.done()
+    assert controller.position("small") == 2
+
+    controller.release("running")
+    await asyncio.wait_for(big, timeout=1)
+    assert not small.done()
+    controller.release("big")
+    await asyncio.wait_for(small, timeout=1)
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    controller = AdmissionController(budget_bytes=100)
+    await controller.acquire("a", 100)
+    waiter = asyncio.create_task(controller.acquire("b", 50))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert controller.position("b") is None
+
+
+async def test_job_larger_than_budget_is_rejected():
+    controller = AdmissionController(budget_bytes=100)
+
+    with pytest.raises(ValueError):
+        await controller.acquire("huge", 101)
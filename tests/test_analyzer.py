@@ -79,9 +79,10 @@ def test_detect_song_boundaries_runs(synthetic_wav: Path):
 def test_probe_duration(synthetic_wav: Path):
     """probe_duration should read duration without loading the audio.
 
-    Regression guard: this is what powers the MAX_AUDIO_DURATION_SECONDS guard
-    in web.py. If pydub / ffprobe is missing or its API breaks, the guard
-    silently disables itself. We assert it returns a sensible value here.
+    Regression guard: this is what powers the memory admission estimate in
+    web.py. If pydub / ffprobe is missing or its API breaks, the estimate
+    silently falls back to a file-size guess. We assert it returns a sensible
+    value here.
     """
     from src.web import probe_duration
 
@@ -0,0 +1,193 @@
+"""Tests for batch/playlist submissions and the bounded download pool."""
+import asyncio
+import sys
+
+import pytest
+
+from src import web
+from src.admission import AdmissionController
+from src.download_pool import DownloadPool
+from src.playlists import entries_from_info, expand_urls
+from src.task_store import TaskStore
+from src.web import analysis_tasks, download_and_analyze  # the real one: conftest patches web's
+
+pytestmark = pytest.mark.anyio
+
+FAKE_YTDLP = [sys.executable, "-m", "src.fake_ytdlp"]
+PLAYLIST = "https://www.youtube.com/playlist?list=PLshow"
+SINGLE = "https://soundcloud.com/dj/set"
+
+
+async def test_pool_bounds_downloads_in_fifo_order():
+    pool = DownloadPool(concurrency=2, rate_limit_mb=4)
+    running, peak, order = 0, 0, []
+    release = asyncio.Event()
+
+    async def download(name):
+        nonlocal running, peak
+        async with pool.slot(name):
+            order.append(name)
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+
+    jobs = [asyncio.create_task(download(f"t{i}")) for i in range(5)]
+    await asyncio.sleep(0.01)
+    assert pool.stats() == {"concurrency": 2, "running": 2, "queued": 3}
+    assert pool.position("t4") == 3
+    release.set()
+    await asyncio.gather(*jobs)
+
+    assert peak == 2 and order == ["t0", "t1", "t2", "t3", "t4"]
+    assert pool.ytdlp_args() == ["--limit-rate", str(2 * 1024 * 1024)]
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    pool = DownloadPool(concurrency=1)
+    await pool.acquire("a")
+    waiter = asyncio.create_task(pool.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    pool.release("a")
+    assert pool.stats()["running"] == 0 and pool.stats()["queued"] == 0
+
+
+def test_nested_playlists_flatten_and_skip_unavailable_entries():
+    info = {"_type": "playlist", "entries": [
+        {"_type": "playlist", "entries": [{"url": "https://youtu.be/a", "title": "A"}]},
+        None,
+        {"url": "https://youtu.be/b"},
+    ]}
+
+    assert entries_from_info(info, "https://youtube.com/@show") == [
+        {"url": "https://youtu.be/a", "title": "A"},
+        {"url": "https://youtu.be/b", "title": "https://youtu.be/b"},
+    ]
+
+
+async def test_expand_dedupes_and_keeps_unreadable_urls(monkeypatch):
+    entries, errors = await expand_urls(FAKE_YTDLP, [PLAYLIST, SINGLE, PLAYLIST + "&si=x"])
+    assert len(entries) == 4 and not errors
+    assert entries[-1]["url"] == SINGLE
+
+    failing = [sys.executable, "-c", "import sys; print('ERROR: Private video', file=sys.stderr); sys.exit(1)"]
+    entries, errors = await expand_urls(failing, [SINGLE])
+    assert entries == [{"url": SINGLE, "title": SINGLE}]
+    assert errors == {SINGLE: "ERROR: Private video"}
+
+    entries, _ = await expand_urls(FAKE_YTDLP, [PLAYLIST], limit=2)
+    assert len(entries) == 2
+
+
+async def test_batch_rejects_empty_and_oversized(client, monkeypatch):
+    monkeypatch.setattr(web, "MAX_BATCH_ENTRIES", 2)
+
+    assert (await client.post("/api/batch", json={"urls": [" "]})).status_code == 400
+    assert (await client.post("/api/batch", json={"urls": ["a", "b", "c"]})).status_code == 400
+
+
+async def test_batch_reports_aggregate_progress(client, monkeypatch):
+    gate = asyncio.Event()
+
+    async def fake_download_and_analyze(task_id, url, profile=False, preview=False):
+        analysis_tasks[task_id]["progress"] = 50
+        await gate.wait()
+        if url == SINGLE:
+            raise_error = {"status": "error", "error": "Video unavailable"}
+            web.finish_task(task_id, {"progress": 0, **raise_error})
+        else:
+            web.finish_task(task_id, {"status": "completed", "progress": 100,
+                                      "unique_tracks": 5, "json_output": f"{task_id}.json"})
+
+    monkeypatch.setattr(web, "YTDLP_COMMAND", FAKE_YTDLP)
+    monkeypatch.setattr(web, "download_and_analyze", fake_download_and_analyze)
+
+    response = await client.post("/api/batch", json={"urls": [PLAYLIST, SINGLE]})
+    batch_id = response.json()["task_id"]
+    while not analysis_tasks[batch_id]["children"]:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.01)
+
+    status = (await client.get(f"/api/status/{batch_id}")).json()
+    assert status["status"] == "processing"
+    assert status["progress"] == 50
+    assert [c["status"] for c in status["children"]] == ["downloading"] * 4
+    assert all(analysis_tasks[c["task_id"]]["batch_id"] == batch_id for c in status["children"])
+
+    gate.set()
+    await analysis_tasks[batch_id]["_job"]
+
+    status = (await client.get(f"/api/status/{batch_id}")).json()
+    assert status["status"] == "completed"
+    assert status["message"] == "4 of 4 sets done, 1 failed"
+    assert status["unique_tracks"] == 15
+    assert [c["status"] for c in status["children"]] == ["completed"] * 3 + ["error"]
+
+
+async def test_batch_entries_coalesce_with_running_jobs(client, monkeypatch):
+    monkeypatch.setattr(web, "YTDLP_COMMAND", FAKE_YTDLP)
+    running = (await client.post("/api/download-url", json={"url": SINGLE})).json()["task_id"]
+
+    batch_id = (await client.post("/api/batch", json={"urls": [SINGLE]})).json()["task_id"]
+    await analysis_tasks[batch_id]["_job"]
+
+    (child,) = analysis_tasks[batch_id]["children"]
+    assert analysis_tasks[child["task_id"]]["follow"] == running
+
+
+async def test_cancelling_a_batch_cancels_its_entries(client, monkeypatch):
+    async def never_finishes(task_id, url, profile=False, preview=False):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(web, "YTDLP_COMMAND", FAKE_YTDLP)
+    monkeypatch.setattr(web, "download_and_analyze", never_finishes)
+    batch_id = (await client.post("/api/batch", json={"urls": [PLAYLIST]})).json()["task_id"]
+    while not analysis_tasks[batch_id]["children"]:
+        await asyncio.sleep(0.05)
+    children = [c["task_id"] for c in analysis_tasks[batch_id]["children"]]
+
+    response = await client.delete(f"/api/tasks/{batch_id}")
+
+    assert response.json()["status"] == "cancelled"
+    assert {analysis_tasks[c]["status"] for c in children} == {"cancelled"}
+
+
+async def test_batch_downloads_wait_until_earlier_entries_are_admitted(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_SECONDS", "0")
+    monkeypatch.setenv("FAKE_YTDLP_AUDIO_MINUTES", "0.1")
+    monkeypatch.setenv("FAKE_YTDLP_PLAYLIST_SIZE", "4")
+    monkeypatch.setattr(web, "YTDLP_COMMAND", FAKE_YTDLP)
+    monkeypatch.setattr(web, "download_and_analyze", download_and_analyze)
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    monkeypatch.setattr(web, "task_store", TaskStore(tmp_path / "tasks"))
+    monkeypatch.setattr(web, "BATCH_DOWNLOAD_AHEAD", 2)
+    admission = AdmissionController(budget_bytes=web.estimate_job_bytes(60, web.TARGET_SR))
+    monkeypatch.setattr(web, "admission", admission)
+    await admission.acquire("hog", admission.budget)  # nothing is admitted yet
+
+    async def admit_only(task_id, filepath, *args):
+        await web.admit(task_id, filepath)
+        admission.release(task_id)
+        web.finish_task(task_id, {"status": "completed", "progress": 100})
+
+    monkeypatch.setattr(web, "analyze_file", admit_only)
+    batch_id = (await client.post("/api/batch", json={"urls": [PLAYLIST]})).json()["task_id"]
+    for _ in range(600):
+        if len(list(tmp_path.glob("*.mp3"))) == 2 and admission.stats()["queued"] == 2:
+            break
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)
+
+    assert len(list(tmp_path.glob("*.mp3"))) == 2
+    waiting = [analysis_tasks[c["task_id"]] for c in analysis_tasks[batch_id]["children"]]
+    assert sorted(t["status"] for t in waiting) == ["queued"] * 4
+    assert sum("earlier sets" in t["message"] for t in waiting) == 2
+
+    admission.release("hog")
+    await asyncio.wait_for(analysis_tasks[batch_id]["_job"], timeout=60)
+
+    assert analysis_tasks[batch_id]["message"] == "4 of 4 sets done"
+    assert len(list(tmp_path.glob("*.mp3"))) == 4
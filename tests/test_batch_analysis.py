@@ -0,0 +1,142 @@
+"""Tests for the batch CLI mode: inputs, parallel preparation, NDJSON, skipping."""
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+import soundfile as sf
+
+from src.admission import estimate_job_bytes
+from src.batch_analysis import (
+    NDJSONWriter, find_inputs, memory_jobs, run_batch, tracklist_path,
+)
+from src.feature_tracks import FeatureTrackCache
+from src.loadtest import synthetic_set
+from src.recognizer_backends import Recognition, RecognizerBackend
+
+pytestmark = pytest.mark.anyio
+
+SR = 11025
+
+
+class SegmentBackend(RecognizerBackend):
+    """Names each payload after its segment; counts calls across files."""
+
+    name = "segment"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def recognize(self, audio, client_id="default"):
+        self.calls += 1
+        return Recognition(title=f"{client_id.rsplit('/', 1)[-1]} #{audio.index}",
+                           artist="DJ", match_count=10)
+
+
+def _events(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_find_inputs(tmp_path):
+    (tmp_path / "archive" / "2024").mkdir(parents=True)
+    for name in ("archive/a.mp3", "archive/2024/b.flac", "archive/notes.txt", "c.wav", "d.wav"):
+        (tmp_path / name).write_bytes(b"")
+
+    files = find_inputs([str(tmp_path / "archive"), str(tmp_path / "*.wav"),
+                         str(tmp_path / "c.wav")])
+
+    assert [f.relative_to(tmp_path).as_posix() for f in files] == [
+        "archive/2024/b.flac", "archive/a.mp3", "c.wav", "d.wav"]
+
+
+async def test_batch_streams_tracks_and_skips_up_to_date_sets(tmp_path):
+    sets = tmp_path / "sets"
+    sets.mkdir()
+    for i in range(2):
+        sf.write(str(sets / f"set{i}.wav"), synthetic_set(1.5, track_seconds=30, sr=SR, seed=i), SR)
+    files = find_inputs([str(sets)])
+    out_dir = tmp_path / "outputs"
+    # Spawned workers don't see conftest's private cache: pass one along.
+    settings = {"target_sr": SR, "min_song_duration": 20, "peak_threshold": 0.3,
+                "cluster_threshold": None,
+                "feature_cache": FeatureTrackCache(tmp_path / "feature_tracks")}
+    backend = SegmentBackend()
+    stream = io.StringIO()
+
+    counts = await run_batch(files, out_dir, NDJSONWriter(stream), jobs=2,
+                             settings=settings, recognizer=backend)
+
+    assert counts == {"done": 2, "skipped": 0, "error": 0}
+    events = _events(stream)
+    for f in files:
+        mine = [e for e in events if e["file"] == str(f)]
+        kinds = [e["event"] for e in mine]
+        # Tracks are streamed between segmentation and the file's summary.
+        assert kinds[0] == "segmented" and kinds[-1] == "done"
+        assert set(kinds[1:-1]) == {"track"}
+        tracklist = json.loads(tracklist_path(f, out_dir).read_text())
+        assert [e["title"] for e in mine[1:-1]] == [t["title"] for t in tracklist]
+        assert len(tracklist) == mine[0]["segments"] >= 2
+    assert backend.calls == sum(e["segments"] for e in events if e["event"] == "segmented")
+    assert len(list((tmp_path / "feature_tracks").glob("*.npz"))) == 2
+
+    # Second run: everything is up to date, except a set that changed since.
+    later = time.time() + 5
+    os.utime(files[1], (later, later))
+    stream = io.StringIO()
+
+    counts = await run_batch(files, out_dir, NDJSONWriter(stream), jobs=1,
+                             settings=settings, recognizer=backend)
+
+    assert counts == {"done": 1, "skipped": 1, "error": 0}
+    assert [(e["event"], e["file"]) for e in _events(stream)
+            if e["event"] in ("skipped", "done")] == [("skipped", str(files[0])), ("done", str(files[1]))]
+
+
+async def test_unreadable_set_is_reported_and_the_rest_continue(tmp_path):
+    broken = tmp_path / "broken.mp3"
+    broken.write_bytes(b"not audio")
+    stream = io.StringIO()
+
+    counts = await run_batch([broken], tmp_path / "outputs", NDJSONWriter(stream), jobs=1,
+                             recognizer=SegmentBackend())
+
+    assert counts["error"] == 1
+    (event,) = _events(stream)
+    assert event["event"] == "error" and event["file"] == str(broken)
+    assert not tracklist_path(broken, tmp_path / "outputs").exists()
+
+
+async def test_sets_are_retried_when_a_worker_dies(tmp_path):
+    files = []
+    for i in range(2):
+        files.append(tmp_path / f"set{i}.wav")
+        sf.write(str(files[-1]), synthetic_set(1.5, track_seconds=30, sr=SR, seed=i), SR)
+    settings = {"target_sr": SR, "min_song_duration": 20, "peak_threshold": 0.3,
+                "feature_cache": FeatureTrackCache(tmp_path / "feature_tracks")}
+    batch = asyncio.create_task(run_batch(files, tmp_path / "outputs", NDJSONWriter(io.StringIO()),
+                                          jobs=1, settings=settings, recognizer=SegmentBackend()))
+    for _ in range(1000):
+        if multiprocessing.active_children():
+            break
+        await asyncio.sleep(0.01)
+    for worker in multiprocessing.active_children():
+        os.kill(worker.pid, signal.SIGKILL)  # as the OOM killer would
+
+    counts = await asyncio.wait_for(batch, timeout=120)
+
+    assert counts == {"done": 2, "skipped": 0, "error": 0}
+
+
+def test_workers_are_capped_by_the_memory_budget(tmp_path):
+    sf.write(str(tmp_path / "long.wav"), synthetic_set(2, track_seconds=30, sr=SR), SR)
+    sf.write(str(tmp_path / "short.wav"), synthetic_set(1, track_seconds=30, sr=SR), SR)
+    files = find_inputs([str(tmp_path)])
+    per_job = estimate_job_bytes(120, 22050)
+
+    assert memory_jobs(files, 22050, budget_bytes=3 * per_job + 1) == 3
+    assert memory_jobs(files, 22050, budget_bytes=per_job // 2) == 1
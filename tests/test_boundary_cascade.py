@@ -0,0 +1,70 @@
+"""Tests for coarse-to-fine boundary detection."""
+import numpy as np
+import pytest
+
+from src.boundary_cascade import COARSE_STRIDE, cascade_peaks, coarse_features
+from src.parallel_features import HOP_LENGTH, frame_features, frame_range_features
+from src.shazamer import DJSetAnalyzer
+
+SR = 11025
+
+
+@pytest.fixture(scope="module")
+def hard_cut_set():
+    """Eight 30 s sections, each a steady tone of its own pitch and level."""
+    rng = np.random.default_rng(0)
+    t = np.arange(30 * SR) / SR
+    parts = [
+        (rng.uniform(0.2, 0.9) * np.sin(2 * np.pi * 110 * 2 ** (rng.integers(0, 36) / 12) * t)
+         + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+        for _ in range(8)
+    ]
+    return np.concatenate(parts)
+
+
+def _analyzer(cascade_min_seconds):
+    analyzer = DJSetAnalyzer("set.wav", fingerprint_index=None,
+                             cascade_min_seconds=cascade_min_seconds)
+    analyzer.min_song_duration = 20
+    analyzer.peak_threshold = 0.3
+    return analyzer
+
+
+def test_coarse_frames_are_exactly_strided_fine_frames(hard_cut_set):
+    y = hard_cut_set[: 20 * SR]
+    centroid, rms = frame_features(y, SR)
+
+    coarse_centroid, coarse_rms = coarse_features(y, SR)
+
+    assert np.array_equal(coarse_centroid, centroid[::COARSE_STRIDE])
+    assert np.array_equal(coarse_rms, rms[::COARSE_STRIDE])
+
+
+def test_frame_range_matches_full_pass(hard_cut_set):
+    y = hard_cut_set[: 20 * SR]
+    centroid, rms = frame_features(y, SR)
+
+    for f0, f1 in [(0, 50), (123, 400), (len(centroid) - 30, len(centroid))]:
+        part_centroid, part_rms = frame_range_features(y, SR, f0, f1)
+        assert np.array_equal(part_centroid, centroid[f0:f1])
+        assert np.array_equal(part_rms, rms[f0:f1])
+
+
+def test_cascade_finds_the_same_boundaries_with_far_less_work(hard_cut_set):
+    full = _analyzer(None).detect_song_boundaries(hard_cut_set, SR)
+    cascade = _analyzer(0).detect_song_boundaries(hard_cut_set, SR)
+
+    assert len(cascade) == len(full) == 9
+    assert np.max(np.abs(np.array(cascade) - np.array(full))) <= 2 * HOP_LENGTH
+    _, frames, _ = cascade_peaks(hard_cut_set, SR, 0.3, 20)
+    # A transition every 30 s is the worst case; real sets gain far more.
+    assert frames < (1 + len(hard_cut_set) // HOP_LENGTH) / 2
+
+
+def test_cascade_only_for_long_sets():
+    analyzer = DJSetAnalyzer("set.wav", fingerprint_index=None, cascade_min_seconds=3600)
+
+    assert not analyzer.use_cascade(3599)
+    assert analyzer.use_cascade(3600)
+    assert not DJSetAnalyzer("set.wav", fingerprint_index=None,
+                             cascade_min_seconds=None).use_cascade(10 ** 6)
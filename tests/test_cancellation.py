@@ -0,0 +1,189 @@
+"""Tests for DELETE /api/tasks/{task_id} and analyzer cancellation."""
+import asyncio
+import multiprocessing
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import web
+from src.admission import AdmissionController
+from src.parallel_features import parallel_frame_features
+from src.shazamer import AnalysisCancelled, DJSetAnalyzer
+from src.task_store import TaskStore
+from src.web import download_and_analyze  # the real one: conftest patches web's
+
+# Writes a .part file like yt-dlp mid-download, then hangs.
+HANGING_YTDLP = [sys.executable, "-c", (
+    "import sys, time\n"
+    "out = sys.argv[sys.argv.index('-o') + 1]\n"
+    "open(out.replace('%(title)s.%(ext)s', 'Mix.webm.part'), 'w').write('x')\n"
+    "print('[download]   1.0% of 9.00MiB', file=sys.stderr, flush=True)\n"
+    "time.sleep(30)\n"
+)]
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path / "tasks")
+    monkeypatch.setattr(web, "task_store", store)
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    return store
+
+
+async def test_cancel_unknown_task_is_404(client, isolated):
+    response = await client.delete("/api/tasks/nope")
+    assert response.status_code == 404
+
+
+async def test_cancel_finished_task_is_409(client, isolated):
+    web.analysis_tasks["done"] = {"status": "completed", "progress": 100, "message": ""}
+
+    response = await client.delete("/api/tasks/done")
+
+    assert response.status_code == 409
+    assert web.analysis_tasks["done"]["status"] == "completed"
+
+
+async def test_cancel_queued_upload_frees_queue_slot_and_file(client, isolated, tmp_path, monkeypatch):
+    admission = AdmissionController(budget_bytes=web.estimate_job_bytes(60, web.TARGET_SR))
+    monkeypatch.setattr(web, "admission", admission)
+    await admission.acquire("hog", admission.budget)  # everything else queues
+
+    wav = tmp_path / "set.wav"
+    sf.write(str(wav), np.zeros(22050, dtype=np.float32), 22050)
+    with open(wav, "rb") as f:
+        response = await client.post("/api/upload", files={"file": ("set.wav", f, "audio/wav")})
+    task_id = response.json()["task_id"]
+    for _ in range(100):
+        if web.analysis_tasks[task_id]["status"] == "queued":
+            break
+        await asyncio.sleep(0.01)
+    upload = web.analysis_tasks[task_id]["filepath"]
+
+    response = await client.delete(f"/api/tasks/{task_id}")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert admission.stats()["queued"] == 0
+    assert isolated.load(task_id)["status"] == "cancelled"
+    assert not (tmp_path / upload).exists()
+
+
+async def test_cancel_kills_download_process_group(client, isolated):
+    process = await asyncio.create_subprocess_exec(
+        "sh", "-c", "sleep 30 & wait", start_new_session=True,
+    )
+    web.analysis_tasks["dl"] = {"status": "downloading", "progress": 3, "message": "",
+                                "_process": process}
+
+    start = time.monotonic()
+    response = await client.delete("/api/tasks/dl")
+    await asyncio.wait_for(process.wait(), timeout=5)
+
+    assert response.json()["status"] == "cancelled"
+    assert process.returncode != 0
+    assert time.monotonic() - start < 5
+
+
+async def test_cancelled_download_removes_partial_files(client, isolated, tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "YTDLP_COMMAND", HANGING_YTDLP)
+    web.analysis_tasks["dl"] = {"status": "pending", "progress": 0, "message": ""}
+    web.analysis_tasks["dl"]["_job"] = asyncio.create_task(
+        download_and_analyze("dl", "https://soundcloud.com/dj/set"))
+    for _ in range(500):
+        if web.analysis_tasks["dl"].get("progress") == 2 and list(tmp_path.glob("*.part")):
+            break
+        await asyncio.sleep(0.01)
+    assert list(tmp_path.glob("*.part"))
+
+    response = await client.delete("/api/tasks/dl")
+
+    assert response.json()["status"] == "cancelled"
+    assert not list(tmp_path.glob("*_*"))
+
+
+async def test_cancel_keeps_admission_slot_until_the_worker_returns(client, isolated, tmp_path,
+                                                                    monkeypatch):
+    admission = AdmissionController(budget_bytes=web.estimate_job_bytes(60, web.TARGET_SR))
+    monkeypatch.setattr(web, "admission", admission)
+    monkeypatch.setattr(web, "CANCEL_GRACE_SECONDS", 0.1)
+    decoding, unblock = threading.Event(), threading.Event()
+
+    def slow_load_audio(self):
+        decoding.set()
+        unblock.wait(10)
+        return np.zeros(22050, dtype=np.float32), 22050
+
+    monkeypatch.setattr(DJSetAnalyzer, "load_audio", slow_load_audio)
+    wav = tmp_path / "set.wav"
+    sf.write(str(wav), np.zeros(22050, dtype=np.float32), 22050)
+    with open(wav, "rb") as f:
+        response = await client.post("/api/upload", files={"file": ("set.wav", f, "audio/wav")})
+    task_id = response.json()["task_id"]
+    await asyncio.get_running_loop().run_in_executor(None, decoding.wait, 10)
+
+    response = await client.delete(f"/api/tasks/{task_id}")
+
+    assert response.json()["status"] == "cancelled"
+    # The decode thread still holds its audio, so the slot stays taken.
+    assert admission.stats()["running"] == 1
+    unblock.set()
+    for _ in range(200):
+        if admission.stats()["running"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert admission.stats()["running"] == 0
+
+
+def test_cancelled_analyzer_stops_at_next_stage(tmp_path):
+    analyzer = DJSetAnalyzer(str(tmp_path / "x.wav"))
+    audio = np.random.default_rng(0).standard_normal(22050 * 5).astype(np.float32)
+    stages = []
+    analyzer._on_stage = stages.append
+
+    analyzer.cancel()
+
+    with pytest.raises(AnalysisCancelled):
+        analyzer.detect_song_boundaries(audio, 22050)
+    assert stages == []
+
+
+async def test_cancel_between_segments_skips_recognition(stub_analyzer):
+    class Gateway:
+        calls = 0
+
+        async def recognize(self, data, client_id="default"):
+            self.calls += 1
+            analyzer.cancel()
+            return {"matches": []}
+
+    gateway = Gateway()
+    audio = np.zeros(22050 * 30, dtype=np.float32)
+    analyzer = stub_analyzer(audio, [0, 22050 * 10, 22050 * 20, len(audio)], gateway=gateway,
+                             cluster_threshold=None)
+
+    with pytest.raises(AnalysisCancelled):
+        await analyzer.analyze()
+    assert gateway.calls == 1
+
+
+def test_parallel_features_kill_workers_when_check_raises():
+    audio = np.zeros(22050 * 60, dtype=np.float32)
+
+    def check():
+        raise AnalysisCancelled("stop")
+
+    with pytest.raises(AnalysisCancelled):
+        parallel_frame_features(audio, 22050, workers=2, chunk_seconds=5, check=check)
+    # Workers still starting exit on their own instead of computing chunks.
+    deadline = time.monotonic() + 10
+    while multiprocessing.active_children() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not multiprocessing.active_children()
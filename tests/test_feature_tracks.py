@@ -0,0 +1,153 @@
+"""Tests for cached transition curves and re-segmentation."""
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import feature_tracks, recognizer_backends, web
+from src.feature_tracks import FeatureTrack, FeatureTrackCache, content_hash, sweep, track_key
+from src.shazamer import DJSetAnalyzer
+from src.task_store import TaskStore
+from src.web import analysis_tasks
+
+pytestmark = pytest.mark.anyio
+
+SR = 11025
+
+
+@pytest.fixture
+def set_file(tmp_path):
+    """Six 30 s sections, each a steady tone of its own pitch and level."""
+    rng = np.random.default_rng(1)
+    t = np.arange(30 * SR) / SR
+    audio = np.concatenate([
+        rng.uniform(0.2, 0.9) * np.sin(2 * np.pi * 110 * 2 ** (rng.integers(0, 36) / 12) * t)
+        + 0.01 * rng.standard_normal(len(t))
+        for _ in range(6)
+    ]).astype(np.float32)
+    path = tmp_path / "set.wav"
+    sf.write(str(path), audio, SR)
+    return path
+
+
+def _analyzer(path, cache, **kwargs):
+    return DJSetAnalyzer(str(path), fingerprint_index=None, target_sr=SR,
+                         cascade_min_seconds=None, feature_cache=cache,
+                         peak_threshold=0.3, min_song_duration=20, **kwargs)
+
+
+def test_second_run_reuses_the_curve(set_file, tmp_path):
+    cache = FeatureTrackCache(tmp_path / "tracks")
+    first = _analyzer(set_file, cache)
+    audio, sr = first.load_audio()
+    boundaries = first.detect_song_boundaries(audio, sr)
+
+    second = _analyzer(set_file, cache)
+    second.load_audio()
+    second.extract_features = lambda *a: pytest.fail("spectral pass repeated")
+
+    assert second.detect_song_boundaries(audio, sr) == boundaries
+    assert second.feature_track_key == first.feature_track_key is not None
+    assert len(boundaries) == 7
+
+
+def test_resegment_matches_a_full_run_without_decoding(set_file, tmp_path):
+    cache = FeatureTrackCache(tmp_path / "tracks")
+    analyzer = _analyzer(set_file, cache)
+    audio, sr = analyzer.load_audio()
+    boundaries = analyzer.detect_song_boundaries(audio, sr)
+
+    again = _analyzer(set_file, cache)
+    again.load_audio = lambda: pytest.fail("audio decoded again")
+    [result] = again.resegment()
+
+    assert result["boundaries"] == [round(b / SR, 3) for b in boundaries]
+    assert (result["threshold"], result["min_song_duration"]) == (0.3, 20)
+
+
+def test_resegment_computes_and_stores_a_missing_curve(set_file, tmp_path):
+    cache = FeatureTrackCache(tmp_path / "tracks")
+
+    results = _analyzer(set_file, cache).resegment([0.1, 0.3], [20, 100])
+
+    assert [(r["threshold"], r["min_song_duration"]) for r in results] == [
+        (0.1, 20), (0.1, 100), (0.3, 20), (0.3, 100)]
+    assert results[2]["segments"] == 6
+    assert results[3]["segments"] < results[2]["segments"]
+    assert len(list((tmp_path / "tracks").glob("*.npz"))) == 1
+
+
+def test_key_covers_content_and_settings(set_file, tmp_path):
+    digest = content_hash(set_file)
+    other = tmp_path / "other.wav"
+    other.write_bytes(set_file.read_bytes() + b"\0")
+
+    assert track_key(digest, 22050) != track_key(digest, 11025)
+    assert track_key(content_hash(other), 11025) != track_key(digest, 11025)
+    assert _analyzer(tmp_path / "missing.wav", FeatureTrackCache(tmp_path)).feature_key() is None
+
+
+def test_sweep_auto_parameters_follow_duration():
+    track = FeatureTrack(np.zeros(10, dtype=np.float32), n_samples=2 * 3600 * 100, sample_rate=100)
+
+    [result] = sweep(track)
+
+    assert (result["threshold"], result["min_song_duration"]) == (0.20, 60)
+    assert result["boundaries"] == [0.0, 7200.0]
+
+
+@pytest.fixture
+def cached_task(tmp_path, monkeypatch):
+    cache = FeatureTrackCache(tmp_path / "tracks")
+    monkeypatch.setattr(feature_tracks, "_cache", cache)
+    curve = np.zeros(4000, dtype=np.float32)
+    curve[[1000, 2500]] = 1.0
+    cache.put("k1", FeatureTrack(curve, n_samples=4000 * 512, sample_rate=22050))
+    analysis_tasks["done"] = {"status": "completed", "progress": 100, "message": "",
+                              "feature_key": "k1"}
+    return cache
+
+
+async def test_resegment_endpoint(client, cached_task):
+    response = await client.post("/api/tasks/done/resegment",
+                                 json={"thresholds": [0.01], "min_song_durations": [10, 30]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["segments"] for r in results] == [3, 2]
+    assert results[0]["boundaries"][1] == round(1000 * 512 / 22050, 3)
+
+
+async def test_resegment_endpoint_errors(client, cached_task):
+    analysis_tasks["running"] = {"status": "processing", "progress": 40, "message": ""}
+
+    assert (await client.post("/api/tasks/nope/resegment", json={})).status_code == 404
+    assert (await client.post("/api/tasks/running/resegment", json={})).status_code == 409
+    too_many = {"thresholds": [0.1] * 50, "min_song_durations": [30] * 50}
+    assert (await client.post("/api/tasks/done/resegment", json=too_many)).status_code == 400
+    assert (await client.post("/api/tasks/done/resegment",
+                              json={"thresholds": [1.5]})).status_code == 400
+    (cached_task.directory / "k1.npz").unlink()
+    assert (await client.post("/api/tasks/done/resegment", json={})).status_code == 409
+
+
+async def test_cascade_tasks_resegment_from_the_coarse_curve(client, set_file, tmp_path, monkeypatch):
+    # cascade_min_seconds=0: every set takes the coarse-to-fine detector.
+    monkeypatch.setattr(DJSetAnalyzer, "use_cascade", lambda self, duration: True)
+    monkeypatch.setattr(web, "task_store", TaskStore(tmp_path / "tasks"))
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    monkeypatch.setattr(web, "OUTPUT_FOLDER", tmp_path)
+    monkeypatch.setattr(recognizer_backends, "RECOGNIZER_BACKEND", "null")
+    with open(set_file, "rb") as f:
+        task_id = (await client.post("/api/upload", files={"file": ("set.wav", f, "audio/wav")})).json()["task_id"]
+    await analysis_tasks[task_id]["_job"]
+    task = analysis_tasks[task_id]
+    assert task["status"] == "completed" and task["feature_key"]
+
+    response = await client.post(f"/api/tasks/{task_id}/resegment",
+                                 json={"thresholds": [0.3], "min_song_durations": [20]})
+
+    assert response.status_code == 200
+    [result] = response.json()["results"]
+    # Every cut, to within a coarse frame (~0.7 s).
+    assert result["segments"] == 6
+    assert np.abs(np.array(result["boundaries"]) - 30 * np.arange(7)).max() < 1.0
@@ -0,0 +1,114 @@
+"""Tests for the local landmark-fingerprint index."""
+import numpy as np
+import pytest
+
+from src import fingerprint_index
+from src.fingerprint_index import FingerprintIndex, fingerprint
+from src.segment_encoder import RECOGNITION_SR, to_pcm16
+from src.shazamer import DJSetAnalyzer
+
+
+pytestmark = pytest.mark.anyio
+
+SR = RECOGNITION_SR
+
+
+def _track(seed: int, seconds: float = 60) -> np.ndarray:
+    """Sequence of random notes with harmonics: peaky, track-specific spectra."""
+    rng = np.random.default_rng(seed)
+    note_len = int(0.25 * SR)
+    t = np.arange(note_len) / SR
+    envelope = np.exp(-4 * t)
+    notes = []
+    for _ in range(int(seconds / 0.25)):
+        f0 = rng.uniform(100, 1500)
+        notes.append(envelope * sum(np.sin(2 * np.pi * f0 * k * t) / k for k in (1, 2, 3)))
+    return 0.3 * np.concatenate(notes).astype(np.float32)
+
+
+def _pcm(audio: np.ndarray, start: float, end: float) -> np.ndarray:
+    return to_pcm16(audio[int(start * SR):int(end * SR)], SR)
+
+
+TRACK = {"title": "Song", "artist": "Artist", "shazam_url": "https://x", "match_count": 2}
+
+
+def test_fingerprint_is_deterministic():
+    pcm = _pcm(_track(1), 0, 10)
+    assert fingerprint(pcm, SR) == fingerprint(pcm, SR)
+    assert len(fingerprint(pcm, SR)) > 100
+
+
+def test_query_without_index_file_creates_nothing(tmp_path):
+    index = FingerprintIndex(str(tmp_path / "fp.sqlite"))
+
+    assert index.query(_pcm(_track(1), 0, 10), SR) is None
+    assert not (tmp_path / "fp.sqlite").exists()
+
+
+def test_overlapping_noisy_excerpt_matches(tmp_path):
+    index = FingerprintIndex(str(tmp_path / "fp.sqlite"))
+    audio = _track(1)
+    assert index.add(_pcm(audio, 10, 40), SR, TRACK)
+    index.add(_pcm(_track(2), 0, 30), SR, {**TRACK, "title": "Other"})
+
+    rng = np.random.default_rng(9)
+    noisy = audio + 0.02 * rng.standard_normal(len(audio)).astype(np.float32)
+    match = index.query(_pcm(noisy, 25, 50), SR)
+
+    assert match is not None
+    assert match["title"] == "Song" and match["match_count"] == 2
+    assert match["aligned_hashes"] >= index.min_aligned
+
+
+def test_unrelated_audio_does_not_match(tmp_path):
+    index = FingerprintIndex(str(tmp_path / "fp.sqlite"))
+    index.add(_pcm(_track(1), 0, 30), SR, TRACK)
+
+    assert index.query(_pcm(_track(3), 0, 30), SR) is None
+
+
+def test_excerpts_per_track_are_capped(tmp_path):
+    index = FingerprintIndex(str(tmp_path / "fp.sqlite"), max_excerpts=2)
+    audio = _track(1)
+
+    added = [index.add(_pcm(audio, s, s + 10), SR, TRACK) for s in (0, 15, 30)]
+
+    assert added == [True, True, False]
+    assert index.stats()["tracks"] == 1
+
+
+def test_analyzer_uses_the_process_index_unless_given_none(tmp_path, monkeypatch):
+    index = FingerprintIndex(tmp_path / "fp.sqlite")
+    monkeypatch.setattr(fingerprint_index, "_index", index)
+
+    assert DJSetAnalyzer("set.wav").fingerprint_index is index
+    assert DJSetAnalyzer("set.wav", fingerprint_index=None).fingerprint_index is None
+
+
+async def test_confident_match_is_resolved_locally_next_time(tmp_path):
+    class FakeGateway:
+        calls = 0
+
+        async def recognize(self, data, client_id="default"):
+            self.calls += 1
+            return {"track": {"title": "Song", "subtitle": "Artist", "url": "u"},
+                    "matches": [{"id": "1"}]}
+
+    audio = _track(1, seconds=50)
+    gateway = FakeGateway()
+    index = FingerprintIndex(str(tmp_path / "fp.sqlite"))
+
+    def analyzer():
+        a = DJSetAnalyzer(str(tmp_path / "x.wav"), gateway=gateway, fingerprint_index=index)
+        a.load_audio = lambda: (audio, SR)
+        a.detect_song_boundaries = lambda y, sr: [0, len(y)]
+        return a
+
+    first = await analyzer().analyze()
+    second = await analyzer().analyze()
+
+    assert gateway.calls == 1
+    assert "source" not in first[0]
+    assert second[0]["source"] == "local"
+    assert second[0]["title"] == "Song" and second[0]["start_time"] == "00:00:00"
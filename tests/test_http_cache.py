@@ -0,0 +1,141 @@
+"""Tests for ETag / 304 handling, memoized views and precompressed bodies."""
+import asyncio
+import gzip
+import json
+import os
+
+import pytest
+
+from src import http_cache, metrics
+from src import web
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    folder = tmp_path / "outputs"
+    folder.mkdir()
+    monkeypatch.setattr(web, "OUTPUT_FOLDER", folder)
+    web._view_cache.clear()
+    web._recent_cache.clear()
+
+    tracks = [
+        {"title": f"Track {i}", "artist": f"Artist {i}", "start_time": "00:00:00",
+         "shazam_url": f"https://shazam.example/{i}", "match_count": 2}
+        for i in range(200)
+    ]
+    (folder / "set_tracklist.json").write_text(json.dumps(tracks, indent=2))
+    (folder / "set_tracklist.txt").write_text(
+        "".join(f"00:00:00 - {t['title']} - {t['artist']} [2 matches]\n" for t in tracks)
+    )
+    return folder
+
+
+async def _get_compressed(client, url, encoding="gzip"):
+    """GET `url` once its precompressed copy, built in the background, is ready."""
+    for _ in range(200):
+        response = await client.get(url, headers={"Accept-Encoding": encoding})
+        if "content-encoding" in response.headers:
+            return response
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"no {encoding} copy of {url}")
+
+
+async def test_output_file_revalidates_with_304(client, outputs):
+    first = await _get_compressed(client, "/outputs/set_tracklist.txt")
+    etag = first.headers["etag"]
+
+    second = await client.get("/outputs/set_tracklist.txt", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.content == b""
+
+
+async def test_etag_changes_when_file_is_rewritten(client, outputs):
+    path = outputs / "set_tracklist.txt"
+    etag = (await client.get("/outputs/set_tracklist.txt")).headers["etag"]
+    path.write_text("00:00:01 - New - Artist\n")
+    os.utime(path, ns=(1, 1))
+
+    response = await client.get("/outputs/set_tracklist.txt", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+async def test_large_tracklist_served_precompressed(client, outputs):
+    first = await client.get("/outputs/set_tracklist.json", headers={"Accept-Encoding": "gzip"})
+    # The first request doesn't wait for compression.
+    assert "content-encoding" not in first.headers
+
+    response = await _get_compressed(client, "/outputs/set_tracklist.json")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("application/json")
+    # httpx transparently decodes: the body matches the original file.
+    assert response.content == (outputs / "set_tracklist.json").read_bytes()
+    assert list(http_cache.COMPRESSED_DIR.glob("set_tracklist.json.*.gz"))
+
+
+async def test_each_encoding_has_its_own_etag(client, outputs):
+    gzipped = await _get_compressed(client, "/outputs/set_tracklist.json")
+    identity = await client.get("/outputs/set_tracklist.json",
+                                headers={"Accept-Encoding": "identity"})
+
+    assert gzipped.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+    # A cached gzip body doesn't validate an identity request, or vice versa.
+    revalidated = await client.get("/outputs/set_tracklist.json", headers={
+        "Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]})
+    assert revalidated.status_code == 200 and "content-encoding" not in revalidated.headers
+    revalidated = await client.get("/outputs/set_tracklist.json", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+async def test_view_is_memoized_until_files_change(client, outputs):
+    hits = metrics.CACHE_REQUESTS.value(cache="view", result="hit")
+
+    first = await client.get("/api/view/set_tracklist.txt")
+    second = await client.get("/api/view/set_tracklist.txt")
+    assert first.json() == second.json()
+    assert "https://shazam.example/0" in first.json()["content"]
+    assert metrics.CACHE_REQUESTS.value(cache="view", result="hit") == hits + 1
+
+    revalidated = await client.get(
+        "/api/view/set_tracklist.txt", headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+async def test_recent_revalidates_until_outputs_change(client, outputs):
+    first = await client.get("/api/recent")
+    assert first.json()[0]["track_count"] == 200
+
+    unchanged = await client.get("/api/recent", headers={"If-None-Match": first.headers["etag"]})
+    assert unchanged.status_code == 304
+
+    (outputs / "other_tracklist.json").write_text("[]")
+    changed = await client.get("/api/recent", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+async def test_index_has_etag_and_gzip(client):
+    response = await _get_compressed(client, "/")
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert b"<html" in response.content.lower()
+
+
+def test_gzip_copy_round_trips(tmp_path):
+    source = tmp_path / "big.txt"
+    source.write_text("line\n" * 1000)
+    etag = http_cache.make_etag(http_cache.fingerprint([source]))
+
+    copy = http_cache.compressed_copy(source, "gzip", etag)
+
+    assert gzip.decompress(copy.read_bytes()) == source.read_bytes()
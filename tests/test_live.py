@@ -0,0 +1,291 @@
+"""Tests for live analysis of growing files and HTTP streams."""
+import asyncio
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+from aiohttp import web as aioweb
+
+from src import live, web
+from src.admission import AdmissionController
+from src.live import AUDIO_KEEP_SECONDS, LiveAnalyzer, LiveSegmenter
+from src.parallel_features import HOP_LENGTH, frame_features
+from src.recognizer_backends import Recognition, RecognizerBackend
+from src.web import analysis_tasks
+
+pytestmark = pytest.mark.anyio
+
+SR = 11025
+SECTION = 40
+STEPS = (0, 7, 3, 10, 5, 12)  # semitones above 110 Hz, one per section
+
+
+@pytest.fixture(scope="module")
+def tone_set():
+    """Six 40 s sections, each a steady tone of its own pitch and level."""
+    rng = np.random.default_rng(0)
+    t = np.arange(SECTION * SR) / SR
+    return np.concatenate([
+        (rng.uniform(0.3, 0.9) * np.sin(2 * np.pi * 110 * 2 ** (k / 12) * t)
+         + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+        for k in STEPS
+    ])
+
+
+@pytest.fixture(scope="module")
+def tone_mp3(tone_set):
+    buf = io.BytesIO()
+    sf.write(buf, tone_set, SR, format="MP3")
+    return buf.getvalue()
+
+
+class PitchBackend(RecognizerBackend):
+    """Names an excerpt after its dominant pitch (semitones above 110 Hz)."""
+
+    name = "pitch"
+
+    async def recognize(self, audio, client_id="default"):
+        spectrum = np.abs(np.fft.rfft(audio.pcm.astype(np.float32)))
+        freq = np.argmax(spectrum) * audio.sample_rate / len(audio.pcm)
+        return Recognition(title=f"k{round(12 * np.log2(freq / 110))}", artist="tone")
+
+
+class RecordingAnalyzer(LiveAnalyzer):
+    def __init__(self, source, **kwargs):
+        super().__init__(source, target_sr=SR, recognizer=PitchBackend(), fingerprint_index=None,
+                         min_song_duration=20, peak_threshold=0.3, **kwargs)
+        self.emitted_at = []
+        self.max_buffered = 0
+
+    def _on_track(self, track):
+        self.emitted_at.append(self.analyzed_seconds)
+
+    def _on_progress(self, analyzed_seconds):
+        self.max_buffered = max(self.max_buffered, len(self._audio))
+
+
+def _check_tracks(analyzer, tracks):
+    assert [t["title"] for t in tracks] == [f"k{k}" for k in STEPS]
+    starts = np.array([t["start_time_seconds"] for t in tracks])
+    assert np.abs(starts - SECTION * np.arange(len(STEPS))).max() < 1.0
+    # Each track is out well before the next one starts.
+    assert (np.array(analyzer.emitted_at) - starts).max() < 25
+
+
+def test_segmenter_follows_hard_cuts_in_bounded_memory(tone_set):
+    centroid, rms = frame_features(tone_set, SR)
+    segmenter = LiveSegmenter(SR, 0.3, 20, window_seconds=60)
+    fps = SR / HOP_LENGTH
+
+    boundaries, longest = [], 0
+    for i in range(0, len(centroid), int(fps)):
+        boundaries += segmenter.push(centroid[i:i + int(fps)], rms[i:i + int(fps)],
+                                     final=i + int(fps) >= len(centroid))
+        longest = max(longest, len(segmenter._centroid))
+
+    cuts = [round(b / fps) for b in boundaries]
+    assert {40, 80, 120, 200} <= set(cuts)
+    assert longest <= segmenter.window
+    assert segmenter.frames == len(centroid)
+
+
+async def test_growing_file_emits_tracks_as_they_arrive(tmp_path, tone_mp3):
+    path = tmp_path / "recording.mp3"
+    path.write_bytes(b"")
+
+    def record():
+        step = len(tone_mp3) // 40
+        with open(path, "ab") as f:
+            for i in range(0, len(tone_mp3), step):
+                f.write(tone_mp3[i:i + step])
+                f.flush()
+                time.sleep(0.02)
+
+    threading.Thread(target=record, daemon=True).start()
+    analyzer = RecordingAnalyzer(str(path), idle_timeout=1.0)
+
+    tracks = await analyzer.analyze()
+
+    _check_tracks(analyzer, tracks)
+    assert analyzer.analyzed_seconds == pytest.approx(len(STEPS) * SECTION, abs=0.1)
+    assert analyzer.max_buffered <= (AUDIO_KEEP_SECONDS + 2) * SR
+
+
+@pytest.mark.parametrize("header", ["updated", "streaming"])
+async def test_growing_wav_is_followed_past_its_header(tmp_path, tone_set, header):
+    path = tmp_path / "recording.wav"
+    step = len(tone_set) // 40
+    if header == "updated":
+        # libsndfile rewrites the sizes as the recording grows; the reader
+        # must not stop at the size it saw when it opened the file.
+        recording = sf.SoundFile(str(path), "w", SR, 1, format="WAV", subtype="PCM_16")
+        recording.write(tone_set[:step])
+        recording.flush()
+
+        def record():
+            with recording:
+                for i in range(step, len(tone_set), step):
+                    recording.write(tone_set[i:i + step])
+                    recording.flush()
+                    time.sleep(0.02)
+    else:
+        buf = io.BytesIO()
+        sf.write(buf, tone_set[:1], SR, format="WAV", subtype="PCM_16")
+        wav_header = bytearray(buf.getvalue()[:-2])
+        wav_header[4:8] = wav_header[-4:] = b"\xff\xff\xff\xff"
+        path.write_bytes(bytes(wav_header))
+        pcm = (tone_set * 32767).astype("<i2").tobytes()
+
+        def record():
+            with open(path, "ab") as f:
+                for i in range(0, len(pcm), 2 * step):
+                    f.write(pcm[i:i + 2 * step])
+                    f.flush()
+                    time.sleep(0.02)
+
+    threading.Thread(target=record, daemon=True).start()
+    analyzer = RecordingAnalyzer(str(path), idle_timeout=1.0)
+
+    tracks = await analyzer.analyze()
+
+    # The clean tones (unlike the MP3) put one cut a few seconds early, as
+    # in the segmenter test above, so only the tracks themselves are checked.
+    assert [t["title"] for t in tracks] == [f"k{k}" for k in STEPS]
+    assert analyzer.analyzed_seconds == pytest.approx(len(STEPS) * SECTION, abs=0.1)
+
+
+async def test_http_stream(tone_mp3):
+    async def stream(request):
+        response = aioweb.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        for i in range(0, len(tone_mp3), 8192):
+            await response.write(tone_mp3[i:i + 8192])
+        return response
+
+    app = aioweb.Application()
+    app.router.add_get("/radio", stream)
+    runner = aioweb.AppRunner(app)
+    await runner.setup()
+    site = aioweb.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        analyzer = RecordingAnalyzer(f"http://127.0.0.1:{port}/radio")
+        tracks = await analyzer.analyze()
+    finally:
+        await runner.cleanup()
+
+    _check_tracks(analyzer, tracks)
+
+
+async def test_stop_ends_a_stream_that_never_goes_idle(tmp_path, tone_mp3):
+    path = tmp_path / "endless.mp3"
+    path.write_bytes(tone_mp3[: len(tone_mp3) // 3])
+    analyzer = RecordingAnalyzer(str(path), idle_timeout=3600)
+
+    async def stop_when_caught_up():
+        while analyzer.analyzed_seconds < 70:
+            await asyncio.sleep(0.05)
+        analyzer.stop()
+
+    stopper = asyncio.create_task(stop_when_caught_up())
+    tracks = await asyncio.wait_for(analyzer.analyze(), timeout=60)
+    await stopper
+
+    assert [t["title"] for t in tracks] == ["k0", "k7"]
+
+
+async def test_live_endpoint_validates(client, monkeypatch):
+    monkeypatch.setattr(web, "run_live", lambda *args: asyncio.sleep(0))
+    monkeypatch.setattr(web, "MAX_LIVE_STREAMS", 1)
+
+    assert (await client.post("/api/live", json={"url": "file:///etc/passwd"})).status_code == 400
+    first = await client.post("/api/live", json={"url": "http://radio.example/stream"})
+    second = await client.post("/api/live", json={"url": "http://radio.example/other"})
+
+    assert first.status_code == 200 and second.status_code == 429
+    status = (await client.get(f"/api/status/{first.json()['task_id']}")).json()
+    assert status["live"] is True and status["status"] == "processing"
+
+
+async def test_live_endpoint_honours_the_host_allow_list(client, monkeypatch):
+    monkeypatch.setattr(web, "run_live", lambda *args: asyncio.sleep(0))
+    monkeypatch.setattr(web, "LIVE_STREAM_HOSTS", frozenset({"radio.example"}))
+
+    allowed = await client.post("/api/live", json={"url": "https://RADIO.example/stream"})
+    internal = await client.post("/api/live", json={"url": "http://169.254.169.254/latest"})
+
+    assert allowed.status_code == 200 and internal.status_code == 403
+
+
+async def test_live_stream_holds_admission_capacity(client, monkeypatch):
+    stopped = asyncio.Event()
+
+    class FakeLive:
+        def __init__(self, source, **kwargs):
+            self.analyzed_seconds = 0.0
+            self.failed_segments = []
+
+        def stop(self):
+            stopped.set()
+
+        async def analyze(self):
+            await stopped.wait()
+            return []
+
+    monkeypatch.setattr(live, "LiveAnalyzer", FakeLive)
+    monkeypatch.setattr(web, "write_tracklists", lambda *args: ("a.json", "a.txt"))
+    admission = AdmissionController(budget_bytes=web.LIVE_STREAM_BYTES)
+    monkeypatch.setattr(web, "admission", admission)
+    await admission.acquire("hog", admission.budget)
+
+    task_id = (await client.post("/api/live", json={"url": "http://radio.example/a"})).json()["task_id"]
+    await asyncio.sleep(0.05)
+    assert (await client.get(f"/api/status/{task_id}")).json()["status"] == "queued"
+
+    admission.release("hog")
+    for _ in range(100):
+        if analysis_tasks[task_id].get("_analyzer") is not None:
+            break
+        await asyncio.sleep(0.01)
+    # While it plays, the stream's share of the budget is taken.
+    assert admission.stats()["in_use_bytes"] == web.LIVE_STREAM_BYTES
+    assert (await client.get(f"/api/status/{task_id}")).json()["status"] == "processing"
+
+    await client.post(f"/api/live/{task_id}/stop")
+    await analysis_tasks[task_id]["_job"]
+    assert analysis_tasks[task_id]["status"] == "completed"
+    assert admission.stats()["in_use_bytes"] == 0
+
+
+async def test_run_live_publishes_tracks_then_completes(client, monkeypatch, tmp_path):
+    class FakeLive:
+        def __init__(self, source, **kwargs):
+            self.analyzed_seconds = 95.0
+            self.failed_segments = []
+
+        def stop(self):
+            pass
+
+        async def analyze(self):
+            track = {"title": "Song", "artist": "DJ", "start_time": "00:00:00",
+                     "start_time_seconds": 0.0}
+            self._on_track(track)
+            mid = (await client.get(f"/api/status/{task_id}")).json()
+            assert mid["status"] == "processing" and mid["results"] == [track]
+            return [track]
+
+    monkeypatch.setattr(live, "LiveAnalyzer", FakeLive)
+    monkeypatch.setattr(web, "OUTPUT_FOLDER", tmp_path)
+    task_id = "live-1"
+    analysis_tasks[task_id] = {"status": "processing", "progress": 0, "message": "",
+                               "live": True, "results": []}
+
+    await web.run_live(task_id, "http://radio.example/mix.mp3")
+
+    status = (await client.get(f"/api/status/{task_id}")).json()
+    assert status["status"] == "completed" and status["unique_tracks"] == 1
+    assert (tmp_path / "live_mix_tracklist.json").exists()
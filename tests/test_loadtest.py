@@ -0,0 +1,97 @@
+"""Tests for the load-test fakes (Shazam stand-in, fake yt-dlp) and report math."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+import soundfile as sf
+
+from src.fake_shazam import FakeShazamConfig, fake_track, start
+from src.loadtest import summarize, synthetic_set
+from src.recognition_gateway import PooledHTTPClient
+from src.recognition_policy import RateLimitedError
+
+pytestmark = pytest.mark.anyio
+
+TAG_PATH = "/discovery/v5/en-US/US/iphone/-/tag/A/B?sync=true"
+BODY = {"signature": {"uri": "data:audio/vnd.shazam.sig;base64,AAAA", "samplems": 10000}}
+
+
+@pytest.fixture
+async def fake_shazam():
+    servers = []
+
+    async def _start(**overrides):
+        runner, url = await start(FakeShazamConfig(latency_ms=0, jitter_ms=0, seed=1, **overrides))
+        servers.append(runner)
+        return runner, url
+
+    yield _start
+    for runner in servers:
+        await runner.cleanup()
+
+
+async def test_fake_shazam_answers_like_shazam_through_gateway_client(fake_shazam):
+    runner, url = await fake_shazam(no_match_rate=0)
+    client = PooledHTTPClient(base_url=url)
+    try:
+        result = await client.request(
+            "POST", "https://amp.shazam.com" + TAG_PATH, json=BODY
+        )
+    finally:
+        await client.close()
+
+    assert result == fake_track(BODY["signature"]["uri"], FakeShazamConfig(no_match_rate=0))
+    assert result["track"]["title"].startswith("Track ")
+    assert runner.app["stats"]["matched"] == 1
+
+
+async def test_fake_shazam_rate_limit_surfaces_as_429(fake_shazam):
+    runner, url = await fake_shazam(rate_limit=0.1, burst=1, retry_after=3)
+    client = PooledHTTPClient(base_url=url)
+    try:
+        await client.request("POST", "https://amp.shazam.com" + TAG_PATH, json=BODY)
+        with pytest.raises(RateLimitedError) as excinfo:
+            await client.request("POST", "https://amp.shazam.com" + TAG_PATH, json=BODY)
+    finally:
+        await client.close()
+
+    assert excinfo.value.retry_after == 3
+    assert runner.app["stats"]["429"] == 1
+
+
+async def test_fake_shazam_errors(fake_shazam):
+    _, url = await fake_shazam(error_rate=1.0)
+    async with httpx.AsyncClient() as client:
+        response = await client.post(url + TAG_PATH, json=BODY)
+    assert response.status_code == 503
+
+
+def test_fake_ytdlp_writes_set_and_progress(tmp_path):
+    env = {**os.environ, "FAKE_YTDLP_SECONDS": "0", "FAKE_YTDLP_AUDIO_MINUTES": "0.25",
+           "PYTHONPATH": str(Path(__file__).resolve().parent.parent)}
+    proc = subprocess.run(
+        [sys.executable, "-m", "src.fake_ytdlp", "-f", "bestaudio/best", "-x", "--newline",
+         "-o", str(tmp_path / "20260101_000000_%(title)s.%(ext)s"), "https://youtu.be/abc"],
+        env=env, capture_output=True, text=True, timeout=120,
+    )
+
+    assert proc.returncode == 0, proc.stderr
+    assert "[download] 100.0% of" in proc.stderr
+    assert "[ExtractAudio]" in proc.stderr
+    (output,) = tmp_path.glob("20260101_000000_*.mp3")
+    assert abs(sf.info(str(output)).duration - 15) < 0.5
+
+
+def test_synthetic_set_and_summary():
+    audio = synthetic_set(0.5, track_seconds=10, sr=8000, seed=3)
+    assert len(audio) == 30 * 8000
+    assert abs(audio).max() <= 0.8 + 1e-6
+
+    stats = summarize([float(i) for i in range(1, 101)])
+    assert stats["count"] == 100
+    assert stats["p50"] == pytest.approx(50.5)
+    assert stats["p99"] == pytest.approx(99.01)
+    assert summarize([])["p95"] is None
@@ -0,0 +1,69 @@
+"""Tests for the Prometheus-style metrics registry and /metrics endpoint."""
+import pytest
+
+from src import metrics
+from src.web import analysis_tasks
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("t_seconds", "test", ["stage"], buckets=(1, 5))
+    hist.observe(0.5, stage="a")
+    hist.observe(3, stage="a")
+    hist.observe(10, stage="a")
+
+    lines = hist.render()
+
+    assert 't_seconds_bucket{stage="a",le="1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="5"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_sum{stage="a"} 13.5' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+
+
+def test_counter_rejects_unknown_labels():
+    counter = metrics.Counter("t_total", "test", ["result"])
+    counter.inc(result="match")
+
+    assert counter.value(result="match") == 1
+    with pytest.raises(ValueError):
+        counter.inc(stage="oops")
+
+
+def test_cache_lookup_counts_hits_and_misses():
+    before = metrics.CACHE_REQUESTS.value(cache="unit", result="hit")
+    metrics.cache_lookup("unit", hit=True)
+    metrics.cache_lookup("unit", hit=False)
+
+    assert metrics.CACHE_REQUESTS.value(cache="unit", result="hit") == before + 1
+    assert metrics.CACHE_REQUESTS.value(cache="unit", result="miss") >= 1
+
+
+def test_current_rss_is_positive():
+    assert metrics.current_rss_bytes() > 0
+
+
+async def test_peak_rss_sampler_records_a_job():
+    before = metrics.JOB_PEAK_RSS.count()
+    async with metrics.PeakRSSSampler(interval=0.01) as sampler:
+        pass
+
+    assert sampler.peak > 0
+    assert metrics.JOB_PEAK_RSS.count() == before + 1
+
+
+async def test_metrics_endpoint_exposes_task_gauges(client):
+    analysis_tasks["a"] = {"status": "processing"}
+    analysis_tasks["b"] = {"status": "pending"}
+    analysis_tasks["c"] = {"status": "completed"}
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'shazamer_tasks{state="active"} 1' in body
+    assert 'shazamer_tasks{state="queued"} 1' in body
+    assert "# TYPE shazamer_stage_seconds histogram" in body
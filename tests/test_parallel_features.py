@@ -0,0 +1,60 @@
+"""Tests for chunked multi-process feature extraction."""
+import numpy as np
+import pytest
+
+from src import parallel_features
+from src.parallel_features import HOP_LENGTH, frame_features, parallel_frame_features, plan_chunks
+from src.shazamer import DJSetAnalyzer
+
+
+SR = 22050
+
+
+@pytest.fixture
+def audio() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    n = SR * 40 + 123  # not a multiple of the hop
+    t = np.arange(n) / SR
+    freq = np.where(t < 20, 440.0, 1800.0)
+    return (0.3 * np.sin(2 * np.pi * freq * t) + 0.05 * rng.standard_normal(n)).astype(np.float32)
+
+
+def test_plan_covers_every_frame_once():
+    n_samples = SR * 40 + 123
+    plan = plan_chunks(n_samples, chunk_frames=300)
+
+    assert sum(count for *_, count in plan) == 1 + n_samples // HOP_LENGTH
+    assert plan[0][0] == 0 and plan[-1][1] == n_samples
+    for start, end, skip, count in plan:
+        assert start % HOP_LENGTH == 0
+        assert skip >= 0 and 0 < count
+
+
+def test_parallel_matches_serial(audio):
+    serial_centroid, serial_rms = frame_features(audio, SR)
+
+    centroid, rms = parallel_frame_features(audio, SR, workers=2, chunk_seconds=7)
+
+    assert centroid.shape == serial_centroid.shape
+    assert rms.shape == serial_rms.shape
+    np.testing.assert_allclose(centroid, serial_centroid, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(rms, serial_rms, rtol=1e-6, atol=1e-9)
+
+
+def test_analyzer_uses_pool_only_for_long_audio(audio, tmp_path, monkeypatch):
+    calls = []
+
+    def fake_parallel(y, sr, workers, **kwargs):
+        calls.append(workers)
+        return frame_features(y, sr)
+
+    monkeypatch.setattr("src.shazamer.parallel_frame_features", fake_parallel)
+    analyzer = DJSetAnalyzer(str(tmp_path / "x.wav"), feature_workers=4)
+
+    analyzer.extract_features(audio, SR)
+    assert calls == []
+
+    monkeypatch.setattr("src.shazamer.CHUNK_SECONDS", 10)
+    centroid, rms = analyzer.extract_features(audio, SR)
+    assert calls == [4]
+    assert len(centroid) == len(rms) == 1 + len(audio) // HOP_LENGTH
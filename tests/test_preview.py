@@ -0,0 +1,124 @@
+"""Tests for segmentation previews: waveform overview, confirm and expiry."""
+import asyncio
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import recognizer_backends, web
+from src.loadtest import synthetic_set
+from src.preview import waveform_overview
+from src.shazamer import DJSetAnalyzer
+from src.task_store import TaskStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "task_store", TaskStore(tmp_path / "tasks"))
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    monkeypatch.setattr(web, "OUTPUT_FOLDER", tmp_path)
+    monkeypatch.setattr(recognizer_backends, "RECOGNIZER_BACKEND", "null")
+    return tmp_path
+
+
+async def _upload_preview(client, tmp_path):
+    wav = tmp_path / "set.wav"
+    sf.write(str(wav), synthetic_set(1.5, track_seconds=30, sr=web.TARGET_SR, seed=1), web.TARGET_SR)
+    with open(wav, "rb") as f:
+        response = await client.post("/api/upload", data={"preview": "true"},
+                                     files={"file": ("set.wav", f, "audio/wav")})
+    return response.json()["task_id"]
+
+
+async def _wait_for(client, task_id, statuses, timeout=60):
+    for _ in range(int(timeout / 0.05)):
+        status = (await client.get(f"/api/status/{task_id}")).json()
+        if status["status"] in statuses:
+            return status
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"still {status['status']}")
+
+
+def test_waveform_overview_keeps_extremes():
+    audio = np.zeros(10_000, dtype=np.float32)
+    audio[4_321] = 0.75
+    audio[9_999] = -0.5
+
+    overview = waveform_overview(audio, 1000, buckets=100)
+
+    assert overview["buckets"] == 100 and overview["seconds_per_bucket"] == pytest.approx(0.1)
+    assert overview["max"][43] == 0.75 and max(overview["max"]) == 0.75
+    assert overview["min"][99] == -0.5 and min(overview["min"]) == -0.5
+    assert waveform_overview(audio[:10], 1000)["buckets"] == 10
+
+
+async def test_preview_then_confirm_runs_recognition(client, isolated):
+    task_id = await _upload_preview(client, isolated)
+
+    status = await _wait_for(client, task_id, {"preview", "error"})
+    assert status["status"] == "preview"
+    preview = (await client.get(f"/api/tasks/{task_id}/preview")).json()
+    assert preview["waveform"]["buckets"] == 2000
+    assert len(preview["waveform"]["min"]) == len(preview["waveform"]["max"]) == 2000
+    assert preview["boundaries"][0] == 0 and preview["boundaries"][-1] == pytest.approx(90, abs=0.1)
+    assert status["total_segments"] == preview["segments"] >= 2
+    # Nothing holds memory while the user decides.
+    assert web.admission.stats()["running"] == 0
+
+    # Other parameters can be tried on the cached curve before confirming.
+    resegmented = await client.post(f"/api/tasks/{task_id}/resegment",
+                                    json={"thresholds": [preview["threshold"]],
+                                          "min_song_durations": [20]})
+    chosen = resegmented.json()["results"][0]["boundaries"]
+
+    response = await client.post(f"/api/tasks/{task_id}/confirm", json={"min_song_duration": 20})
+    assert response.json()["status"] == "pending"
+    status = await _wait_for(client, task_id, {"completed", "error"})
+
+    assert status["status"] == "completed", status.get("error")
+    assert status["total_segments"] == len(chosen) - 1
+    assert (await client.get(f"/api/tasks/{task_id}/preview")).json()["boundaries"] == preview["boundaries"]
+    assert not list(isolated.glob("*set.wav"))[1:]  # only the test's own source file is left
+
+
+async def test_confirm_reuses_the_preview_curve_of_long_sets(client, isolated, monkeypatch):
+    # Treat the short test set like a set long enough for the cascade.
+    monkeypatch.setattr(DJSetAnalyzer, "use_cascade",
+                        lambda self, duration: self.cascade_min_seconds is not None)
+    computed = []
+    compute_track = DJSetAnalyzer.compute_track
+    monkeypatch.setattr(DJSetAnalyzer, "compute_track",
+                        lambda self, *args: computed.append(1) or compute_track(self, *args))
+    cascade = DJSetAnalyzer.detect_boundaries_cascade
+    monkeypatch.setattr(DJSetAnalyzer, "detect_boundaries_cascade",
+                        lambda self, *args: computed.append(1) or cascade(self, *args))
+
+    task_id = await _upload_preview(client, isolated)
+    await _wait_for(client, task_id, {"preview"})
+    await client.post(f"/api/tasks/{task_id}/confirm")
+    status = await _wait_for(client, task_id, {"completed", "error"})
+
+    assert status["status"] == "completed", status.get("error")
+    assert computed == [1]
+
+
+async def test_confirm_and_preview_errors(client, isolated):
+    web.analysis_tasks["running"] = {"status": "processing", "progress": 20, "message": ""}
+
+    assert (await client.post("/api/tasks/nope/confirm")).status_code == 404
+    assert (await client.post("/api/tasks/running/confirm")).status_code == 409
+    assert (await client.get("/api/tasks/running/preview")).status_code == 409
+
+
+async def test_unconfirmed_preview_expires_with_its_upload(client, isolated, monkeypatch):
+    monkeypatch.setattr(web, "PREVIEW_TTL_SECONDS", 0.2)
+    task_id = await _upload_preview(client, isolated)
+    await _wait_for(client, task_id, {"preview"})
+    upload = web.analysis_tasks[task_id]["filepath"]
+
+    status = await _wait_for(client, task_id, {"cancelled"}, timeout=5)
+
+    assert "expired" in status["message"]
+    assert not (isolated / upload).exists()
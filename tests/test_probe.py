@@ -0,0 +1,112 @@
+"""Tests for header-based duration probing and its cache."""
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import metrics, probe as probe_module
+from src.probe import DurationProbe, read_header_duration
+
+
+pytestmark = pytest.mark.anyio
+
+SR = 44100
+SECONDS = 3
+
+
+@pytest.fixture
+def tone() -> np.ndarray:
+    t = np.arange(SR * SECONDS) / SR
+    return (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def test_wav_header(tmp_path: Path, tone):
+    path = tmp_path / "a.wav"
+    sf.write(str(path), tone, SR)
+
+    assert read_header_duration(str(path)) == pytest.approx(SECONDS, abs=1e-3)
+
+
+def test_flac_header(tmp_path: Path, tone):
+    path = tmp_path / "a.flac"
+    sf.write(str(path), tone, SR)
+
+    assert read_header_duration(str(path)) == pytest.approx(SECONDS, abs=1e-3)
+
+
+def test_mp3_xing_header(tmp_path: Path, tone):
+    path = tmp_path / "a.mp3"
+    sf.write(str(path), tone, SR)
+
+    # Xing frame count includes encoder delay/padding: within a few frames.
+    assert read_header_duration(str(path)) == pytest.approx(SECONDS, abs=0.1)
+
+
+def test_mp3_behind_id3_tag(tmp_path: Path, tone):
+    plain = tmp_path / "plain.mp3"
+    sf.write(str(plain), tone, SR)
+    tag_body = b"\x00" * 300
+    size = len(tag_body)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    tagged = tmp_path / "tagged.mp3"
+    tagged.write_bytes(b"ID3\x04\x00\x00" + syncsafe + tag_body + plain.read_bytes())
+
+    assert read_header_duration(str(tagged)) == pytest.approx(read_header_duration(str(plain)))
+
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def test_m4a_mvhd_with_moov_at_end(tmp_path: Path):
+    mvhd = _box(b"mvhd", b"\x00\x00\x00\x00" + struct.pack(">IIII", 0, 0, 1000, 125_500) + b"\x00" * 80)
+    data = _box(b"ftyp", b"M4A \x00\x00\x00\x00") + _box(b"mdat", b"\x00" * 1024) + _box(b"moov", mvhd)
+    path = tmp_path / "a.m4a"
+    path.write_bytes(data)
+
+    assert read_header_duration(str(path)) == pytest.approx(125.5)
+
+
+def test_unknown_format_returns_none(tmp_path: Path):
+    path = tmp_path / "a.ogg"
+    path.write_bytes(b"OggS" + b"\x00" * 100)
+
+    assert read_header_duration(str(path)) is None
+
+
+async def test_probe_caches_by_file_identity(tmp_path: Path, tone):
+    path = tmp_path / "a.wav"
+    sf.write(str(path), tone, SR)
+    probe = DurationProbe()
+    hits = metrics.CACHE_REQUESTS.value(cache="probe", result="hit")
+
+    assert await probe.probe_async(str(path)) == pytest.approx(SECONDS, abs=1e-3)
+    assert probe.probe(str(path)) == pytest.approx(SECONDS, abs=1e-3)
+    assert metrics.CACHE_REQUESTS.value(cache="probe", result="hit") == hits + 1
+
+    # Rewriting the file changes its identity: no stale duration.
+    sf.write(str(path), tone[: SR], SR)
+    assert await probe.probe_async(str(path)) == pytest.approx(1, abs=1e-3)
+
+
+async def test_probe_without_header_or_ffprobe_returns_zero(tmp_path: Path):
+    path = tmp_path / "a.ogg"
+    path.write_bytes(b"not audio")
+    probe = DurationProbe(ffprobe=str(tmp_path / "missing-ffprobe"))
+
+    assert await probe.probe_async(str(path)) == 0.0
+    assert probe.probe(str(path)) == 0.0
+
+
+async def test_async_probe_reads_the_header_off_the_event_loop(tmp_path: Path, tone, monkeypatch):
+    path = tmp_path / "a.wav"
+    sf.write(str(path), tone, SR)
+    threads = []
+    monkeypatch.setattr(probe_module, "read_header_duration",
+                        lambda p: threads.append(threading.current_thread()) or read_header_duration(p))
+
+    assert await DurationProbe().probe_async(str(path)) == pytest.approx(SECONDS, abs=1e-3)
+    assert threads and threads[0] is not threading.main_thread()
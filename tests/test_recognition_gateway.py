@@ -0,0 +1,96 @@
+"""Tests for the process-wide recognition gateway (shared rate limit, fair share)."""
+import asyncio
+
+import pytest
+
+from src.recognition_gateway import RecognitionGateway, TokenBucket, get_gateway
+from src.shazamer import DJSetAnalyzer
+
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=1, clock=clock)
+
+    assert bucket.take()
+    assert not bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert bucket.take()
+
+
+def test_token_bucket_caps_banked_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=clock)
+    clock.now = 100.0
+
+    assert bucket.take()
+    assert bucket.take()
+    assert not bucket.take()
+
+
+async def test_gateway_serves_clients_round_robin():
+    """A client with a deep backlog must not delay another client's first call."""
+    gateway = RecognitionGateway(rate=200.0, burst=1)
+    order = []
+
+    async def call(client_id: str):
+        await gateway.acquire(client_id)
+        order.append(client_id)
+
+    long_job = [asyncio.create_task(call("long")) for _ in range(5)]
+    await asyncio.sleep(0)
+    short_job = asyncio.create_task(call("short"))
+    await asyncio.gather(*long_job, short_job)
+
+    assert order.index("short") <= 2
+    assert order.count("long") == 5
+
+
+async def test_gateway_enforces_global_rate():
+    gateway = RecognitionGateway(rate=50.0, burst=1)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    await asyncio.gather(*(gateway.acquire(f"task-{i % 3}") for i in range(6)))
+
+    # First token is free, the other five wait 1/50s each.
+    assert loop.time() - start >= 5 / 50 * 0.9
+
+
+async def test_cancelled_waiter_does_not_consume_a_token():
+    gateway = RecognitionGateway(rate=20.0, burst=1)
+    await gateway.acquire("a")  # drain the burst
+
+    waiter = asyncio.create_task(gateway.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.wait_for(gateway.acquire("c"), timeout=1)
+
+    assert gateway.stats()["waiting"] == {}
+
+
+def test_analyzers_share_process_gateway(tmp_path):
+    a = DJSetAnalyzer(str(tmp_path / "a.wav"))
+    b = DJSetAnalyzer(str(tmp_path / "b.wav"), client_id="task-b")
+
+    assert a.gateway is b.gateway is get_gateway()
+    assert b.client_id == "task-b"
+
+
+def test_explicit_throttle_rate_uses_private_gateway(tmp_path):
+    analyzer = DJSetAnalyzer(str(tmp_path / "a.wav"), throttle_rate=2.0)
+
+    assert analyzer.gateway is not get_gateway()
+    assert analyzer.gateway.bucket.rate == 2.0
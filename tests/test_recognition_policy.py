@@ -0,0 +1,107 @@
+"""Tests for the recognition timeout / retry / hedging policy."""
+import asyncio
+
+import pytest
+
+from src.recognition_gateway import RecognitionGateway
+from src.recognition_policy import RateLimitedError, RecognitionPolicy
+
+
+pytestmark = pytest.mark.anyio
+
+
+def fast_policy(**kwargs) -> RecognitionPolicy:
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("backoff_max", 0.01)
+    return RecognitionPolicy(**kwargs)
+
+
+async def test_retries_transient_errors_until_success():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise asyncio.TimeoutError()
+        return {"track": {}}
+
+    result = await fast_policy(max_attempts=4).execute(attempt)
+
+    assert result == {"track": {}}
+    assert len(calls) == 3
+
+
+async def test_gives_up_after_max_attempts():
+    async def attempt():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        await fast_policy(max_attempts=2).execute(attempt)
+
+
+async def test_non_retryable_errors_are_raised_immediately():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise ValueError("bad audio")
+
+    with pytest.raises(ValueError):
+        await fast_policy(max_attempts=5).execute(attempt)
+    assert len(calls) == 1
+
+
+async def test_timeout_bounds_a_single_attempt():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return "ok"
+
+    assert await fast_policy(timeout=0.05).execute(attempt) == "ok"
+
+
+def test_backoff_honours_retry_after():
+    policy = RecognitionPolicy(backoff_base=0.1, backoff_max=1.0)
+
+    assert 0 <= policy.backoff(3) <= 0.8
+    assert policy.backoff(0, RateLimitedError(retry_after=5)) == 5
+
+
+async def test_hedged_request_wins_over_slow_primary():
+    policy = fast_policy(hedge_percentile=50, hedge_min_samples=3)
+    for _ in range(3):
+        policy.latency.observe(0.01)
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+            return "slow"
+        return "fast"
+
+    result = await asyncio.wait_for(policy.execute(attempt), timeout=1)
+
+    assert result == "fast"
+    assert len(calls) == 2
+
+
+async def test_gateway_slows_down_on_429():
+    gateway = RecognitionGateway(rate=100.0, policy=fast_policy(max_attempts=3))
+    responses = [RateLimitedError(), {"track": {"title": "x"}}]
+
+    class FakeShazam:
+        async def recognize(self, data):
+            item = responses.pop(0)
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+    gateway._shazam = FakeShazam()
+    result = await gateway.recognize(b"audio", client_id="t")
+
+    assert result["track"]["title"] == "x"
+    assert gateway.bucket.rate < 100.0
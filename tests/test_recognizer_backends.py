@@ -0,0 +1,126 @@
+"""Tests for the pluggable recognizer backends (shazamio, record, replay, null)."""
+import numpy as np
+import pytest
+
+from src.recognizer_backends import (
+    NullBackend, Recognition, RecognizerBackend, RecordingBackend, ReplayBackend,
+    ReplayMiss, ShazamioBackend, create_backend, parse_shazam_response,
+)
+
+
+pytestmark = pytest.mark.anyio
+
+SR = 22050
+
+
+class ScriptedBackend(RecognizerBackend):
+    """Names each payload after the order it was first seen in."""
+
+    name = "scripted"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def recognize(self, audio, client_id="default"):
+        self.calls += 1
+        if self.calls == 2:
+            return None
+        if self.calls == 4:
+            raise ConnectionError("upstream down")
+        return Recognition(title=f"T{self.calls}", artist="DJ", url="u", match_count=2)
+
+
+@pytest.fixture
+def set_audio():
+    rng = np.random.default_rng(0)
+    parts = [rng.standard_normal(SR * 12).astype(np.float32) * 0.1 for _ in range(5)]
+    boundaries = [SR * 12 * i for i in range(6)]
+    return np.concatenate(parts), boundaries
+
+
+def test_parse_shazam_response_counts_unique_candidates():
+    result = {"track": {"title": "Song", "subtitle": "Artist", "url": "https://x"},
+              "matches": [{"id": "1"}, {"id": "1"}, {"id": "2"}]}
+
+    assert parse_shazam_response(result) == Recognition("Song", "Artist", "https://x", 2)
+    assert parse_shazam_response({"matches": []}) is None
+    assert parse_shazam_response(None) is None
+
+
+async def test_shazamio_backend_sends_wav_through_gateway():
+    class Gateway:
+        async def recognize(self, data, client_id="default"):
+            self.data, self.client_id = data, client_id
+            return {"track": {"title": "Song", "subtitle": "Artist"}, "matches": [{"id": "9"}]}
+
+    from src.segment_encoder import encode_segment
+    gateway = Gateway()
+    segment = encode_segment(np.zeros(SR, dtype=np.float32), SR, 0, SR)
+
+    recognition = await ShazamioBackend(gateway).recognize(segment, client_id="job")
+
+    assert gateway.data[:4] == b"RIFF" and gateway.client_id == "job"
+    assert recognition.title == "Song" and recognition.match_count == 1
+
+
+async def test_record_then_replay_reproduces_analysis(tmp_path, stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    recording = tmp_path / "answers.jsonl"
+    live = ScriptedBackend()
+
+    recorded = stub_analyzer(audio, boundaries, recognizer=RecordingBackend(live, recording),
+                             cluster_threshold=None)
+    first = await recorded.analyze()
+    replay = ReplayBackend(recording)
+    replayed = await stub_analyzer(audio, boundaries, recognizer=replay,
+                                   cluster_threshold=None).analyze()
+
+    assert live.calls == 5
+    assert [t["title"] for t in first] == ["T1", "T3", "T5"]
+    assert recorded.failed_segments == [36.0]
+    # The failure wasn't recorded, so replay treats it as a miss (no match).
+    assert len(replay) == 4 and replay.misses == 1
+    assert replayed == first
+
+
+async def test_strict_replay_miss_is_a_failed_segment(tmp_path, stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    recording = tmp_path / "empty.jsonl"
+    recording.write_text("")
+    analyzer = stub_analyzer(audio, boundaries, recognizer=ReplayBackend(recording, strict=True),
+                             cluster_threshold=None)
+
+    assert await analyzer.analyze() == []
+    assert len(analyzer.failed_segments) == 5
+    with pytest.raises(ReplayMiss):
+        await ReplayBackend(recording, strict=True).recognize(b"x")
+
+
+async def test_batch_keeps_order_and_returns_errors():
+    results = await ScriptedBackend().recognize_batch([b"a", b"b", b"c", b"d"])
+
+    assert results[0].title == "T1"
+    assert results[1] is None
+    assert isinstance(results[3], ConnectionError)
+
+
+async def test_null_backend_never_matches(stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    null = NullBackend()
+
+    assert await stub_analyzer(audio, boundaries, recognizer=null, cluster_threshold=None).analyze() == []
+    assert null.calls == 5
+
+
+def test_create_backend_specs(tmp_path):
+    recording = tmp_path / "r.jsonl"
+    recording.write_text('{"key": "k", "recognition": null}\n')
+
+    assert isinstance(create_backend("shazam", gateway=object()), ShazamioBackend)
+    assert isinstance(create_backend("null"), NullBackend)
+    assert isinstance(create_backend(f"record:{tmp_path / 'out.jsonl'}", gateway=object()), RecordingBackend)
+    assert len(create_backend(f"replay:{recording}")) == 1
+    with pytest.raises(ValueError):
+        create_backend("replay")
+    with pytest.raises(ValueError):
+        create_backend("acrcloud")
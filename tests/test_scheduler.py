@@ -0,0 +1,152 @@
+"""Tests for fair-share, shortest-job-first ordering of waiting jobs."""
+import asyncio
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import web
+from src.admission import AdmissionController
+from src.scheduler import FairScheduler
+from src.task_store import TaskStore
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _queue(scheduler, *jobs):
+    for task_id, client, cost in jobs:
+        scheduler.add(task_id, client, cost)
+
+
+def _order(scheduler):
+    return [w.task_id for w in scheduler.order()]
+
+
+async def test_short_jobs_first_within_a_client():
+    scheduler = FairScheduler(seconds_per_unit=0.1, clock=Clock())
+    _queue(scheduler, ("2h", "a", 7200), ("20m", "a", 1200), ("1h", "a", 3600))
+
+    assert _order(scheduler) == ["20m", "1h", "2h"]
+    assert scheduler.position("2h") == 3
+
+
+async def test_clients_share_slots_fairly():
+    scheduler = FairScheduler(seconds_per_unit=0.1, clock=Clock())
+    scheduler.start("a-running", "a", 600)
+    _queue(scheduler, ("a1", "a", 60), ("a2", "a", 60), ("a3", "a", 60), ("b1", "b", 3600))
+
+    # "a" already has a job running, so "b" goes first despite its length,
+    # then the clients alternate.
+    assert _order(scheduler) == ["b1", "a1", "a2", "a3"]
+    _queue(scheduler, ("c1", "c", 60))
+    assert _order(scheduler) == ["c1", "b1", "a1", "a2", "a3"]
+
+
+async def test_waiting_ages_long_jobs_to_the_front():
+    clock = Clock()
+    scheduler = FairScheduler(seconds_per_unit=0.1, aging=1.0, clock=clock)
+    _queue(scheduler, ("long", "a", 7200))
+    clock.now = 100
+    _queue(scheduler, ("short", "a", 600))
+    assert _order(scheduler) == ["short", "long"]
+
+    # Once it has waited out its extra length, newer short jobs queue behind it.
+    clock.now = 800
+    _queue(scheduler, ("newer", "a", 600))
+    assert _order(scheduler) == ["short", "long", "newer"]
+
+
+async def test_eta_learns_from_finished_jobs():
+    clock = Clock()
+    scheduler = FairScheduler(seconds_per_unit=0.1, clock=clock)
+    scheduler.start("running", "a", 1000)
+    _queue(scheduler, ("next", "b", 500), ("last", "c", 2000))
+
+    assert scheduler.eta("next", slots=1) == pytest.approx(100)
+    assert scheduler.eta("last", slots=1) == pytest.approx(150)
+    assert scheduler.eta("running", slots=1) is None
+
+    clock.now = 300  # took 0.3 s per unit instead of 0.1
+    scheduler.finish("running")
+    assert scheduler.seconds_per_unit == pytest.approx(0.14)
+
+
+async def test_admission_admits_the_schedulers_pick():
+    controller = AdmissionController(budget_bytes=100)
+    await controller.acquire("hog", 100, client="a")
+    long = asyncio.create_task(controller.acquire("long", 50, client="a", cost=7200))
+    await asyncio.sleep(0)
+    short = asyncio.create_task(controller.acquire("short", 50, client="b", cost=1200))
+    await asyncio.sleep(0)
+
+    assert controller.position("short") == 1 and controller.position("long") == 2
+    controller.release("hog")
+    await asyncio.wait_for(asyncio.gather(short, long), timeout=1)
+
+
+async def test_failed_and_cancelled_jobs_do_not_teach_the_eta():
+    clock = Clock()
+    controller = AdmissionController(budget_bytes=100,
+                                     scheduler=FairScheduler(seconds_per_unit=0.1, clock=clock))
+
+    with pytest.raises(RuntimeError):
+        async with controller.slot("failed", 10, cost=100):
+            clock.now = 1000
+            raise RuntimeError("decode failed")
+    await controller.acquire("done", 10, cost=100)
+    clock.now = 1020
+    controller.release("done")
+
+    assert controller.scheduler.seconds_per_unit == pytest.approx(0.12)
+
+
+def test_only_listed_api_keys_name_a_client(monkeypatch):
+    monkeypatch.setattr(web, "API_KEYS", frozenset({"team-a"}))
+
+    def request(key=None):
+        headers = [(b"x-api-key", key.encode())] if key else []
+        return web.Request({"type": "http", "headers": headers, "client": ("10.0.0.7", 1234)})
+
+    assert web.client_of(request("team-a")).startswith("key:")
+    assert web.client_of(request("made-up")) == web.client_of(request()) == "10.0.0.7"
+
+
+async def test_status_reports_position_and_eta_per_client(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "API_KEYS", frozenset({"long", "short"}))
+    monkeypatch.setattr(web, "task_store", TaskStore(tmp_path / "tasks"))
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    admission = AdmissionController(budget_bytes=web.estimate_job_bytes(60, web.TARGET_SR))
+    monkeypatch.setattr(web, "admission", admission)
+    await admission.acquire("hog", admission.budget)
+
+    task_ids = {}
+    for name, seconds in (("long", 60), ("short", 5)):
+        wav = tmp_path / f"{name}.wav"
+        sf.write(str(wav), np.zeros(seconds * 8000, dtype=np.float32), 8000)
+        with open(wav, "rb") as f:
+            response = await client.post("/api/upload", headers={"X-API-Key": name},
+                                         files={"file": (wav.name, f, "audio/wav")})
+        task_ids[name] = response.json()["task_id"]
+    for _ in range(200):
+        if all(admission.position(t) for t in task_ids.values()):
+            break
+        await asyncio.sleep(0.01)
+
+    short = (await client.get(f"/api/status/{task_ids['short']}")).json()
+    long = (await client.get(f"/api/status/{task_ids['long']}")).json()
+    assert short["status"] == long["status"] == "queued"
+    assert (short["queue_position"], long["queue_position"]) == (1, 2)
+    assert long["eta_seconds"] >= short["eta_seconds"] >= 0
+    assert web.analysis_tasks[task_ids["short"]]["client"].startswith("key:")
+
+    for task_id in task_ids.values():
+        await client.delete(f"/api/tasks/{task_id}")
+    assert admission.stats()["queued"] == 0
@@ -0,0 +1,117 @@
+"""Tests for within-set clustering of repeated segments."""
+import numpy as np
+import pytest
+
+from src.segment_clustering import cluster_embeddings, embed_segments
+
+
+pytestmark = pytest.mark.anyio
+
+SR = 22050
+
+
+def _loop_track(seed: int, seconds: float = 20) -> np.ndarray:
+    """A one-bar loop with its own notes and timbre, plus a kick, repeated."""
+    rng = np.random.default_rng(seed)
+    notes = rng.choice(np.arange(36, 72), size=8)
+    harmonics = rng.uniform(0, 1, 6)
+    step = int(0.25 * SR)
+    t = np.arange(step) / SR
+    envelope = np.exp(-rng.uniform(2, 10) * t)
+    bar = np.concatenate([
+        envelope * sum(h * np.sin(2 * np.pi * 440 * 2 ** ((n - 69) / 12) * (k + 1) * t)
+                       for k, h in enumerate(harmonics))
+        for n in notes
+    ])
+    kick = np.zeros(len(bar))
+    hit = np.sin(2 * np.pi * 55 * np.arange(2000) / SR) * np.exp(-np.arange(2000) / 400)
+    for beat in range(0, len(bar), SR // 2):
+        kick[beat:beat + 2000] += hit[:len(bar) - beat]
+    bar = 0.3 * bar / np.abs(bar).max() + 0.3 * kick
+    return np.tile(bar, int(seconds * SR / len(bar)) + 1)[:int(seconds * SR)].astype(np.float32)
+
+
+@pytest.fixture
+def set_audio():
+    """A, B, A again (quieter, different phase), C, B again."""
+    a, b, c = _loop_track(1), _loop_track(2), _loop_track(3)
+    parts = [a, b, 0.7 * np.roll(a, 7777), c, np.roll(b, 3333)]
+    boundaries = [0]
+    for part in parts:
+        boundaries.append(boundaries[-1] + len(part))
+    return np.concatenate(parts), boundaries
+
+
+def test_repeated_sections_share_a_cluster(set_audio):
+    audio, boundaries = set_audio
+
+    embeddings = embed_segments(audio, SR, boundaries)
+    labels = cluster_embeddings(embeddings)
+
+    assert labels == [0, 1, 0, 2, 1]
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+
+
+def test_threshold_above_one_keeps_segments_apart(set_audio):
+    audio, boundaries = set_audio
+
+    labels = cluster_embeddings(embed_segments(audio, SR, boundaries), threshold=1.01)
+
+    assert labels == [0, 1, 2, 3, 4]
+
+
+class FakeGateway:
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.calls = 0
+
+    async def recognize(self, data, client_id="default"):
+        self.calls += 1
+        title = self.titles.pop(0)
+        if title is None:
+            return {"matches": []}
+        return {"track": {"title": title, "subtitle": "DJ", "url": ""}, "matches": [{"id": "1"}]}
+
+
+async def test_one_recognition_per_cluster(stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    gateway = FakeGateway(["A", "B", "C"])
+
+    results = await stub_analyzer(audio, boundaries, gateway=gateway).analyze()
+
+    assert gateway.calls == 3
+    assert [r["title"] for r in results] == ["A", "B", "A", "C", "B"]
+    assert results[2]["source"] == "cluster"
+    assert results[2]["start_time_seconds"] == boundaries[2] / SR
+    assert results[2]["start_time"] == "00:00:40"
+
+
+async def test_every_segment_reports_progress(stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    analyzer = stub_analyzer(audio, boundaries, gateway=FakeGateway(["A", "B", "C"]))
+    seen = []
+    analyzer._on_segment = lambda index, total: seen.append((index, total))
+
+    await analyzer.analyze()
+
+    # Segments 2 and 4 reuse a match without a recognition, but still count.
+    assert seen == [(i, 5) for i in range(5)]
+
+
+async def test_unmatched_representative_lets_next_member_try(stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    gateway = FakeGateway([None, "B", "A", "C"])
+
+    results = await stub_analyzer(audio, boundaries, gateway=gateway).analyze()
+
+    assert gateway.calls == 4
+    assert [r["title"] for r in results] == ["B", "A", "C", "B"]
+
+
+async def test_clustering_can_be_disabled(stub_analyzer, set_audio):
+    audio, boundaries = set_audio
+    gateway = FakeGateway(["A", "B", "A", "C", "B"])
+
+    await stub_analyzer(audio, boundaries, gateway=gateway, cluster_threshold=None).analyze()
+
+    assert gateway.calls == 5
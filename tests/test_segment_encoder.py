@@ -0,0 +1,84 @@
+"""Tests for the compact 16 kHz int16 recognition payloads."""
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.segment_encoder import (
+    RECOGNITION_SR, centered_window, encode_segment, to_pcm16,
+)
+from src.shazamer import DJSetAnalyzer
+
+
+pytestmark = pytest.mark.anyio
+
+SR = 22050
+
+
+def _sine(freq: float, seconds: float, sr: int = SR) -> np.ndarray:
+    return (0.5 * np.sin(2 * np.pi * freq * np.arange(int(sr * seconds)) / sr)).astype(np.float32)
+
+
+def test_centered_window_keeps_short_segments_whole():
+    assert centered_window(100, 100 + 5 * SR, SR, 30) == (100, 100 + 5 * SR)
+    assert centered_window(0, 100 * SR, SR, None) == (0, 100 * SR)
+
+
+def test_centered_window_crops_around_the_middle():
+    start, end = centered_window(0, 100 * SR, SR, 30)
+    assert end - start == 30 * SR
+    assert start == 35 * SR
+
+
+def test_to_pcm16_resamples_and_preserves_pitch():
+    pcm = to_pcm16(_sine(1000, 2), SR)
+
+    assert pcm.dtype == np.int16
+    assert len(pcm) == 2 * RECOGNITION_SR
+    spectrum = np.abs(np.fft.rfft(pcm.astype(np.float64)))
+    peak_hz = np.argmax(spectrum) * RECOGNITION_SR / len(pcm)
+    assert abs(peak_hz - 1000) < 2
+
+
+def test_to_pcm16_clips_instead_of_wrapping():
+    pcm = to_pcm16(np.array([2.0, -2.0, 0.0], dtype=np.float32), RECOGNITION_SR)
+    assert pcm.tolist() == [32767, -32767, 0]
+
+
+def test_encoded_wav_is_compact_and_built_once():
+    audio = _sine(440, 60)
+    encoded = encode_segment(audio, SR, 10 * SR, 20 * SR, index=3)
+
+    wav = encoded.wav
+    assert encoded.wav is wav
+    assert encoded.start_time == 10.0
+    data, sr = sf.read(io.BytesIO(wav), dtype="int16")
+    assert sr == RECOGNITION_SR
+    assert len(data) == 10 * RECOGNITION_SR
+
+    float_wav = io.BytesIO()
+    sf.write(float_wav, audio[10 * SR:20 * SR], SR, format="WAV", subtype="FLOAT")
+    assert len(float_wav.getvalue()) / len(wav) > 2.5
+
+
+async def test_analyze_sends_the_same_payload_to_recognition(tmp_path):
+    class FakeGateway:
+        def __init__(self):
+            self.payloads = []
+
+        async def recognize(self, data, client_id="default"):
+            self.payloads.append(data)
+            return {"matches": []}
+
+    gateway = FakeGateway()
+    analyzer = DJSetAnalyzer(str(tmp_path / "x.wav"), gateway=gateway)
+    audio = np.concatenate([_sine(440, 40), _sine(2000, 40)])
+    analyzer.load_audio = lambda: (audio, SR)
+    analyzer.detect_song_boundaries = lambda a, sr: [0, 40 * SR, len(a)]
+
+    await analyzer.analyze()
+
+    assert len(gateway.payloads) == 2
+    assert all(isinstance(p, bytes) and p[:4] == b"RIFF" for p in gateway.payloads)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,141 @@
+"""Tests for coalescing identical submissions onto one in-flight job."""
+import threading
+
+import pytest
+
+from src import web
+from src.single_flight import SingleFlight, canonical_url, upload_key
+from src.task_store import TaskStore
+
+
+pytestmark = pytest.mark.anyio
+
+MIX = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path / "tasks")
+    monkeypatch.setattr(web, "task_store", store)
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path)
+    return store
+
+
+@pytest.mark.parametrize("url", [
+    "https://youtube.com/watch?v=dQw4w9WgXcQ",
+    "http://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ#t=30",
+    "https://youtu.be/dQw4w9WgXcQ?si=abc123",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=twitter",
+])
+def test_canonical_url_youtube_variants(url):
+    assert canonical_url(url) == "https://youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def test_canonical_url_keeps_meaningful_params_and_distinct_media():
+    assert canonical_url("https://soundcloud.com/dj/set/?si=x&utm_medium=y") == "https://soundcloud.com/dj/set"
+    assert canonical_url("https://example.com/a?b=2&a=1") == canonical_url("https://example.com/a?a=1&b=2")
+    assert canonical_url("https://example.com/a?id=1") != canonical_url("https://example.com/a?id=2")
+    assert canonical_url(MIX) != canonical_url("https://youtube.com/watch?v=other")
+
+
+def test_single_flight_release_only_by_leader():
+    flight = SingleFlight()
+    flight.lead("k", "a")
+    flight.release("k", "b")
+    assert flight.leader("k") == "a"
+    flight.release("k", "a")
+    assert flight.leader("k") is None
+    assert upload_key(b"x") == upload_key(b"x") != upload_key(b"y")
+
+
+async def test_identical_urls_share_one_job(client, isolated):
+    first = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    second = (await client.post(
+        "/api/download-url", json={"url": "https://youtu.be/dQw4w9WgXcQ?si=share"}
+    )).json()["task_id"]
+
+    assert second != first
+    assert web.download_and_analyze.call_count == 1
+    assert web.analysis_tasks[second]["follow"] == first
+
+    web.analysis_tasks[first].update(status="analyzing", progress=40, message="Detecting")
+    status = (await client.get(f"/api/status/{second}")).json()
+    assert status["status"] == "analyzing"
+    assert status["progress"] == 40
+    assert status["coalesced"] is True
+    assert (await client.get(f"/api/status/{first}")).json()["coalesced"] is None
+
+
+async def test_identical_uploads_share_one_job(client, isolated, tmp_path):
+    responses = [
+        await client.post("/api/upload", files={"file": (name, b"RIFF same bytes", "audio/wav")})
+        for name in ("a.wav", "b.wav")
+    ]
+    first, second = (r.json()["task_id"] for r in responses)
+
+    assert web.analysis_tasks[second]["follow"] == first
+    # Only the leader's copy is kept.
+    assert len(list(tmp_path.glob("*.wav"))) == 1
+
+
+async def test_upload_is_hashed_off_the_event_loop(client, isolated, monkeypatch):
+    threads = []
+    monkeypatch.setattr(web, "upload_key",
+                        lambda content: threads.append(threading.current_thread()) or upload_key(content))
+
+    await client.post("/api/upload", files={"file": ("a.wav", b"RIFF bytes", "audio/wav")})
+
+    assert threads and threads[0] is not threading.main_thread()
+
+
+async def test_followers_get_the_result_and_key_is_released(client, isolated):
+    first = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    second = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+
+    web.finish_task(first, {"status": "completed", "progress": 100, "message": "Done",
+                            "filename": "mix.mp3", "unique_tracks": 12})
+
+    status = (await client.get(f"/api/status/{second}")).json()
+    assert status["status"] == "completed"
+    assert status["unique_tracks"] == 12
+    assert isolated.load(second)["status"] == "completed"
+    # A new submission after the job finished starts a fresh one.
+    third = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    assert "follow" not in web.analysis_tasks[third]
+    assert web.download_and_analyze.call_count == 2
+
+
+async def test_cancelling_follower_detaches_only_it(client, isolated):
+    first = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    second = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+
+    response = await client.delete(f"/api/tasks/{second}")
+
+    assert response.json()["status"] == "cancelled"
+    assert web.analysis_tasks[first]["status"] == "downloading"
+    assert web.analysis_tasks[first]["_followers"] == []
+
+
+async def test_cancelling_leader_keeps_job_for_followers(client, isolated):
+    first = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    second = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+
+    assert (await client.delete(f"/api/tasks/{first}")).json()["status"] == "cancelled"
+    assert (await client.get(f"/api/status/{second}")).json()["status"] == "downloading"
+
+    web.finish_task(first, {"status": "completed", "progress": 100, "message": "Done"})
+    assert web.analysis_tasks[first]["status"] == "cancelled"
+    assert web.analysis_tasks[second]["status"] == "completed"
+
+
+async def test_job_stops_when_last_follower_leaves_cancelled_leader(client, isolated):
+    first = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+    second = (await client.post("/api/download-url", json={"url": MIX})).json()["task_id"]
+
+    await client.delete(f"/api/tasks/{first}")
+    await client.delete(f"/api/tasks/{second}")
+
+    assert web.analysis_tasks[first]["status"] == "cancelled"
+    assert "owner_cancelled" not in web.analysis_tasks[first]
+    assert web.in_flight.leader(f"url:{canonical_url(MIX)}") is None
@@ -0,0 +1,70 @@
+"""Tests for fast startup: lazy analysis imports and background boot."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src import web
+
+
+pytestmark = pytest.mark.anyio
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_web_does_not_load_analysis_stack():
+    """The heavy modules must only load on boot/first job, not before uvicorn binds."""
+    code = (
+        "import json, sys; import src.web; "
+        "print(json.dumps([m for m in ('librosa', 'scipy', 'numpy', 'shazamio', 'yt_dlp') "
+        "if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+async def test_health_is_served_before_boot_completes(client, monkeypatch):
+    monkeypatch.setitem(web.boot_state, "housekeeping", False)
+
+    health = await client.get("/api/health")
+    ready = await client.get("/api/ready")
+
+    assert health.status_code == 200
+    assert ready.status_code == 503
+    assert ready.json()["ready"] is False
+
+
+async def test_boot_marks_interrupted_tasks_and_becomes_ready(client, tmp_path, monkeypatch):
+    store = web.TaskStore(tmp_path / "tasks")
+    store.save("t1", {"status": "processing", "progress": 40})
+    monkeypatch.setattr(web, "task_store", store)
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path / "uploads")
+    monkeypatch.setattr(web, "boot_state", {"housekeeping": False, "analysis_imported": False})
+
+    await web.boot()
+
+    assert store.load("t1")["status"] == "error"
+    response = await client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "housekeeping": True, "analysis_imported": True}
+
+
+async def test_boot_leaves_tasks_created_after_startup_alone(tmp_path, monkeypatch):
+    store = web.TaskStore(tmp_path / "tasks")
+    store.save("old", {"status": "processing", "progress": 40})
+    monkeypatch.setattr(web, "task_store", store)
+    monkeypatch.setattr(web, "UPLOAD_FOLDER", tmp_path / "uploads")
+    monkeypatch.setattr(web, "boot_state", {"housekeeping": False, "analysis_imported": False})
+    stale = store.task_ids()
+    # Submitted while boot was still importing the analysis stack.
+    store.save("new", {"status": "processing", "progress": 10})
+
+    await web.boot(stale)
+
+    assert store.load("old")["status"] == "error"
+    assert store.load("new")["status"] == "processing"
@@ -0,0 +1,117 @@
+"""Tests for the storage manager's budgets, eviction and pinning."""
+import os
+import time
+
+import pytest
+
+from src import feature_tracks, fingerprint_index, web
+from src.paths import BASE_DIR
+from src.storage_manager import StorageArea, StorageManager
+from src.web import analysis_tasks
+
+pytestmark = pytest.mark.anyio
+
+DAY = 24 * 3600
+
+
+def _file(folder, name, size, age_seconds):
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / name
+    path.write_bytes(b"x" * size)
+    then = time.time() - age_seconds
+    os.utime(path, (then, then))
+    return path
+
+
+def test_age_limit_spares_pinned_and_recent_files(tmp_path):
+    old = _file(tmp_path, "old.mp3", 10, 2 * DAY)
+    pinned = _file(tmp_path, "running.mp3", 10, 2 * DAY)
+    fresh = _file(tmp_path, "uploading.mp3.part", 10, 60)
+    manager = StorageManager([StorageArea("uploads", tmp_path, max_age_seconds=DAY)],
+                             pinned=lambda: {pinned})
+
+    stats = manager.sweep()
+
+    assert not old.exists() and pinned.exists() and fresh.exists()
+    assert stats["uploads"]["bytes"] == 20
+    assert stats["uploads"]["evicted_bytes"]["age"] == 10
+
+
+def test_budget_evicts_least_recently_used_first(tmp_path):
+    oldest = _file(tmp_path, "a.npz", 100, 3 * DAY)
+    middle = _file(tmp_path, "b.npz", 100, 2 * DAY)
+    newest = _file(tmp_path, "c.npz", 100, 1 * DAY)
+    # Read (or touched) since: counts as recently used.
+    os.utime(oldest, (time.time() - 3600, time.time() - 3 * DAY))
+    manager = StorageManager([StorageArea("cache", tmp_path, max_bytes=200)])
+
+    stats = manager.sweep()
+
+    assert oldest.exists() and not middle.exists() and newest.exists()
+    assert stats["cache"]["bytes"] == 200
+
+
+def test_grouped_files_are_evicted_together(tmp_path):
+    json_file = _file(tmp_path, "set_tracklist.json", 50, 2 * DAY)
+    txt_file = _file(tmp_path, "set_tracklist.txt", 50, 2 * DAY)
+    kept = _file(tmp_path, "other_tracklist.json", 50, DAY)
+    area = StorageArea("outputs", tmp_path, max_bytes=60, group=lambda p: p.with_suffix(""))
+
+    StorageManager([area]).sweep()
+
+    assert not json_file.exists() and not txt_file.exists() and kept.exists()
+
+
+def test_disk_floor_evicts_across_areas(tmp_path):
+    uploads = _file(tmp_path / "uploads", "a.mp3", 10, 3 * DAY)
+    cache = _file(tmp_path / "cache", "b.npz", 10, 2 * DAY)
+    areas = [StorageArea("uploads", tmp_path / "uploads"), StorageArea("cache", tmp_path / "cache")]
+    manager = StorageManager(areas, pinned=lambda: {cache}, min_free_bytes=2 ** 62)
+
+    stats = manager.sweep()
+
+    assert not uploads.exists() and cache.exists()
+    assert stats["uploads"]["evicted_bytes"]["disk_full"] == 10
+    assert stats["cache"]["disk_free_bytes"] > 0
+
+
+def test_limits_from_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_OUTPUTS_MB", "2")
+    monkeypatch.setenv("STORAGE_OUTPUTS_MAX_AGE_HOURS", "")
+
+    area = StorageArea.from_env("outputs", tmp_path, 1024, 24)
+
+    assert area.max_bytes == 2 * 1024 * 1024
+    assert area.max_age_seconds is None
+    assert StorageArea.from_env("uploads", tmp_path, None, 1).max_age_seconds == 3600
+
+
+def test_running_tasks_are_pinned():
+    analysis_tasks["run"] = {"status": "processing", "filepath": "/data/uploads/set.mp3"}
+    analysis_tasks["done"] = {"status": "completed", "filepath": "/data/uploads/old.mp3"}
+
+    pinned = web.pinned_paths()
+
+    assert web.TASK_STORE_DIR / "run.json" in pinned
+    assert {p.name for p in pinned} == {"run.json", "set.mp3"}
+
+
+async def test_storage_stats_endpoint(client, monkeypatch, tmp_path):
+    _file(tmp_path, "a.mp3", 10, 2 * DAY)
+    manager = StorageManager([StorageArea("uploads", tmp_path, max_bytes=1000)])
+    manager.sweep()
+    monkeypatch.setattr(web, "storage", manager)
+
+    response = await client.get("/api/storage")
+
+    assert response.status_code == 200
+    assert response.json()["uploads"]["bytes"] == 10
+    assert (await client.get("/metrics")).text.count('shazamer_storage_bytes{area="uploads"} 10') == 1
+
+
+def test_areas_are_where_the_app_writes_whatever_the_working_directory():
+    areas = {area.name: area.path for area in web.storage.areas}
+
+    assert all(path.is_absolute() and BASE_DIR in path.parents for path in areas.values())
+    assert areas["feature_tracks"] == feature_tracks.CACHE_DIR
+    assert fingerprint_index.INDEX_PATH.parent == BASE_DIR / "tmp"
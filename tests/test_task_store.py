@@ -0,0 +1,73 @@
+"""Tests for the task store's background writer."""
+import json
+import threading
+
+from src.task_store import TaskStore
+
+
+def test_save_later_coalesces_bursts_into_one_write(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path, write_interval=0.2)
+    writes = []
+    write = store._write
+    monkeypatch.setattr(store, "_write", lambda tid, snap: (writes.append(tid), write(tid, snap)))
+
+    for progress in range(50):
+        store.save_later("t1", {"status": "processing", "progress": progress})
+    assert store.flush(timeout=5)
+
+    assert writes == ["t1"]
+    assert json.loads((tmp_path / "t1.json").read_text())["progress"] == 49
+
+
+def test_load_sees_unwritten_snapshot(tmp_path):
+    store = TaskStore(tmp_path, write_interval=60)
+    task = {"status": "processing", "progress": 10, "_job": object(), "filepath": "/x"}
+
+    store.save_later("t1", task)
+    task["progress"] = 20  # later mutations don't leak into the snapshot
+
+    assert store.load("t1") == {"status": "processing", "progress": 10}
+    assert not (tmp_path / "t1.json").exists()
+    assert store.flush(timeout=5)
+    assert (tmp_path / "t1.json").exists()
+
+
+def test_save_later_does_not_block_on_slow_disk(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path, write_interval=0)
+    release = threading.Event()
+    monkeypatch.setattr(store, "_write", lambda tid, snap: release.wait(5))
+
+    store.save_later("t1", {"status": "processing"})
+    store.save_later("t2", {"status": "processing"})  # returns while t1 is stuck
+    assert not store.flush(timeout=0.1)
+
+    release.set()
+    assert store.flush(timeout=5)
+
+
+def test_writer_survives_a_failing_write(tmp_path, monkeypatch):
+    store = TaskStore(tmp_path, write_interval=0)
+    write = store._write
+
+    def flaky(task_id, snapshot):
+        if task_id == "bad":
+            raise RuntimeError("dictionary changed size during iteration")
+        write(task_id, snapshot)
+
+    monkeypatch.setattr(store, "_write", flaky)
+    store.save_later("bad", {"status": "processing"})
+    assert store.flush(timeout=5)
+    store.save_later("good", {"status": "completed", "results": [{"title": "a"}]})
+    assert store.flush(timeout=5)
+
+    assert json.loads((tmp_path / "good.json").read_text())["results"] == [{"title": "a"}]
+
+
+def test_snapshot_is_taken_before_nested_values_change(tmp_path):
+    store = TaskStore(tmp_path, write_interval=60)
+    task = {"status": "processing", "results": [{"title": "a"}]}
+
+    store.save_later("t1", task)
+    task["results"].append({"title": "b"})
+
+    assert store.load("t1")["results"] == [{"title": "a"}]
@@ -0,0 +1,76 @@
+"""Tests for tracing spans and the opt-in sampling profiler."""
+import time
+
+import numpy as np
+
+from src import tracing
+from src.shazamer import DJSetAnalyzer
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_span_is_noop_without_sentry():
+    with tracing.span("audio.decode", "x", samples=1):
+        pass
+    with tracing.transaction("analyze_file", task_id="t"):
+        pass
+
+
+def test_profiling_enabled_by_flag_or_env(monkeypatch):
+    monkeypatch.delenv("SHAZAMER_PROFILE", raising=False)
+    assert not tracing.profiling_enabled()
+    assert tracing.profiling_enabled(True)
+
+    monkeypatch.setenv("SHAZAMER_PROFILE", "1")
+    assert tracing.profiling_enabled()
+
+
+def test_profile_job_writes_collapsed_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_DIR", tmp_path)
+
+    with tracing.profile_job("job-1", enabled=True) as profiler:
+        _busy(0.1)
+
+    path = tmp_path / "job-1.folded"
+    assert path.exists()
+    lines = path.read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1
+    assert any("_busy" in stack for stack in profiler.collapsed())
+
+
+def test_profile_job_disabled_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_DIR", tmp_path)
+
+    with tracing.profile_job("job-2", enabled=False) as profiler:
+        pass
+
+    assert profiler is None
+    assert not any(tmp_path.iterdir())
+
+
+def test_detection_reports_stages_in_order(tmp_path):
+    stages = []
+
+    class Recording(DJSetAnalyzer):
+        def _on_stage(self, stage):
+            stages.append(stage)
+
+    analyzer = Recording(str(tmp_path / "x.wav"), min_song_duration=5, peak_threshold=0.3)
+    sr = 22050
+    audio = np.concatenate([
+        0.3 * np.sin(2 * np.pi * 440 * np.arange(sr * 10) / sr),
+        0.1 * np.sin(2 * np.pi * 2000 * np.arange(sr * 10) / sr),
+    ]).astype(np.float32)
+    analyzer.min_song_duration = 5
+    analyzer.peak_threshold = 0.3
+
+    boundaries = analyzer.detect_song_boundaries(audio, sr)
+
+    assert stages == ["centroid", "rms", "transitions", "peaks"]
+    assert boundaries[0] == 0 and boundaries[-1] == len(audio)